@@ -0,0 +1,95 @@
+"""
+Single-call vs chunked, concurrent LLM extraction against a fake LLM server.
+
+    python -m benchmarks.bench_chunked_llm --repeat 4 --seconds-per-page 0.3
+
+The fake server answers with one test per page it was sent (tag PAGE_<n>)
+plus a HEMOGLOBIN test that every chunk repeats, and sleeps in proportion to
+the number of pages to mimic generation time. The script prints the
+wall-clock speedup; the merge itself is checked by check_chunk_merge.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import time
+
+import llmcall
+from benchmarks.llm_stub import StubServer, create_stub_app
+from extract_pdf import extract_document_structure
+from main import run_llm_stage, run_chunked_llm_stage
+import chunking
+
+SAMPLE_PDF = os.path.join("uploads", "MR_DORAB_PATEL_08_06_2025_12_10_55_PM.pdf")
+
+
+def pages_in(body):
+    # Page numbers in the prompt, whichever PROMPT_FORMAT produced it
+    content = body["messages"][-1]["content"]
+    if content.lstrip().startswith("{"):
+        return [page["page_number"] for page in json.loads(content)["pages"]]
+    return [int(n) for n in re.findall(r"^\[page (\d+)\]$", content, re.M)]
+
+
+def fake_answer(body):
+    pages = pages_in(body)
+    tests = [{"parameter_name": "Hemoglobin", "parameter_tag": "HEMOGLOBIN", "value": "13.5"}]
+    tests += [{"parameter_name": f"Page {n}", "parameter_tag": f"PAGE_{n}", "value": str(n)} for n in pages]
+    result = {
+        "patient_details": {"patient_name": "Test Patient", "patient_id": ""},
+        "report_metadata": {"report_name": "Bundle", "report_date": "01/01/2025"},
+        "test_categories": {"Hematology": {"report_name": "Bundle", "tests": tests}}
+    }
+    return "```json\n" + json.dumps(result) + "\n```"
+
+
+async def run(doc, seconds_per_page):
+    app = create_stub_app(fake_answer, delay=lambda body: seconds_per_page * len(pages_in(body)))
+    with StubServer(app) as stub:
+        llmcall.LLM_API_URL = stub.url
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            single = await run_llm_stage(json.dumps(doc, indent=2))
+            single_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            chunked = await run_chunked_llm_stage(doc)
+            chunked_time = time.perf_counter() - start
+        await llmcall.close_llm_client()
+    return single, single_time, chunked, chunked_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=4, help="copies of the sample pages")
+    parser.add_argument("--seconds-per-page", type=float, default=0.3)
+    args = parser.parse_args()
+
+    sample = extract_document_structure(SAMPLE_PDF)
+    pages = []
+    for copy in range(args.repeat):
+        for page in sample["pages"]:
+            # Mark each copy so repeated lines are not dropped as running headers
+            lines = [f"{line} (copy {copy})" for line in page["text_blocks"]]
+            pages.append({**page, "text_blocks": lines, "page_number": len(pages) + 1})
+    doc = {"pages": pages}
+
+    single, single_time, chunked, chunked_time = asyncio.run(run(doc, args.seconds_per_page))
+
+    if "error" in single or "error" in chunked:
+        print(f"LLM stage failed: {single.get('error') or chunked.get('error')}")
+        return 1
+
+    chunks = len(chunking.split_document(doc))
+    print(f"pages={len(pages)} chunks={chunks} concurrency={chunking.LLM_CHUNK_CONCURRENCY}")
+    print(f"single call {single_time:7.2f} s")
+    print(f"chunked     {chunked_time:7.2f} s  speedup {single_time / chunked_time:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
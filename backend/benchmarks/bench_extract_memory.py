@@ -0,0 +1,103 @@
+"""
+Peak memory of extract_pdf as the page count grows: the old extractor (one
+pdfplumber context building the whole document dict, then an indented JSON
+copy of it) vs the page-at-a-time one (iter_pages + write_document).
+
+    python -m benchmarks.bench_extract_memory --pages 10 50 150 300
+
+PDFs of each size are made by repeating the pages of the sample report.
+Every extraction runs in a fresh process and reports its peak RSS
+(ru_maxrss). Exits with status 1 if the streaming extractor's peak grows by
+more than --max-growth-mib between the smallest and the largest PDF, so it
+can gate a change to the extractor.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+import pypdfium2 as pdfium
+
+SAMPLE_PDF = os.path.join("uploads", "MR_DORAB_PATEL_08_06_2025_12_10_55_PM.pdf")
+
+
+def make_pdf(path, pages, sample=SAMPLE_PDF):
+    source = pdfium.PdfDocument(sample)
+    target = pdfium.PdfDocument.new()
+    while len(target) < pages:
+        take = min(len(source), pages - len(target))
+        target.import_pages(source, list(range(take)))
+    target.save(path)
+
+
+def legacy_extract(pdf_path):
+    # extract_pdf before streaming: every page kept open in one context
+    from extract_pdf import open_pdf, extract_page
+    document = {"pages": []}
+    with open_pdf(pdf_path) as pdf:
+        for page in pdf.pages:
+            document["pages"].append(extract_page(page))
+        stringified_doc = json.dumps(document, indent=2)
+    return stringified_doc
+
+
+def streaming_extract(pdf_path):
+    from extract_pdf import extract_pdf
+    return extract_pdf(pdf_path)
+
+
+MODES = {"legacy": legacy_extract, "streaming": streaming_extract}
+
+
+def child(mode, pdf_path):
+    import logging
+    logging.getLogger("healthtrack").setLevel(logging.ERROR)
+    result = MODES[mode](pdf_path)
+    # ru_maxrss is KiB on Linux
+    print(json.dumps({"peak_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                      "chars": len(result)}))
+
+
+def measure(mode, pdf_path):
+    output = subprocess.run([sys.executable, "-m", "benchmarks.bench_extract_memory", "--child", mode, pdf_path],
+                            check=True, capture_output=True, text=True, env={**os.environ, "EXTRACT_PAGE_WORKERS": "1"})
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 150, 300])
+    parser.add_argument("--max-growth-mib", type=float, default=25)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PDF"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return 0
+
+    peaks = {mode: [] for mode in MODES}
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'pages':>6} " + " ".join(f"{mode + ' peak':>16}" for mode in MODES))
+        for pages in args.pages:
+            pdf_path = os.path.join(directory, f"{pages}.pdf")
+            make_pdf(pdf_path, pages)
+            row = []
+            for mode in MODES:
+                peak = measure(mode, pdf_path)["peak_mib"]
+                peaks[mode].append(peak)
+                row.append(f"{peak:13.1f} MiB")
+            print(f"{pages:>6} " + " ".join(row))
+
+    growth = {mode: values[-1] - values[0] for mode, values in peaks.items()}
+    print(f"growth {args.pages[0]} -> {args.pages[-1]} pages: "
+          + ", ".join(f"{mode} {value:+.1f} MiB" for mode, value in growth.items()))
+    if growth["streaming"] > args.max_growth_mib:
+        print(f"streaming extractor grew by more than {args.max_growth_mib} MiB")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,66 @@
+"""
+Per-call latency of a fresh httpx client per request (old behaviour) vs the
+shared pooled LLM client, against a local TLS stub of the completions API.
+
+    python -m benchmarks.bench_llm_client --calls 50
+
+The stub answers immediately, so the difference is connection set-up and
+TLS handshake cost that the pooled client pays only once.
+"""
+import argparse
+import asyncio
+import ssl
+import statistics
+import time
+
+import httpx
+
+import llmcall
+from benchmarks.llm_stub import StubServer, create_stub_app
+
+
+async def legacy_call(url, verify, body):
+    async with httpx.AsyncClient(timeout=120.0, verify=verify) as client:
+        response = await client.post(url, json=body)
+        response.raise_for_status()
+        return response.json()
+
+
+async def measure(fn, calls):
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def run(calls):
+    with StubServer(create_stub_app(), tls=True) as stub:
+        llmcall.LLM_API_URL = stub.url
+        verify = ssl.create_default_context(cafile=stub.cert_path)
+        body = {"model": llmcall.LLM_MODEL, "messages": [{"role": "user", "content": "x" * 2000}]}
+
+        legacy = await measure(lambda: legacy_call(stub.url, verify, body), calls)
+
+        client = llmcall.create_llm_client(verify=verify)
+        try:
+            pooled = await measure(lambda: llmcall.fetch_pdf_extracted_data("x" * 2000, client), calls)
+        finally:
+            await client.aclose()
+
+    for name, samples in (("new client/call", legacy), ("shared pool", pooled)):
+        print(f"{name:16} mean={statistics.mean(samples):7.2f} ms "
+              f"p50={statistics.median(samples):7.2f} ms max={max(samples):7.2f} ms")
+    print(f"saved per call: {statistics.mean(legacy) - statistics.mean(pooled):.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.calls))
+
+
+if __name__ == "__main__":
+    main()
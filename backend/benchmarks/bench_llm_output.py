@@ -0,0 +1,151 @@
+"""
+Parsing the LLM answer: the old path (envelope json.loads -> parse_markdown
+-> blocks[0] json.loads) vs the direct one (envelope json.loads -> report
+models validated from the JSON text, the fence of a fenced reply found by
+a string search).
+
+    python -m benchmarks.bench_llm_output --rounds 200
+    python -m benchmarks.bench_llm_output --live 10
+
+Offline it times both parsers on a long lab bundle answer (106 KiB; one
+run: legacy fenced 8.5 ms, direct fenced 3.3 ms, JSON mode 2.6 ms, and
+4.6 ms for an answer with one malformed test, which is validated a second
+time entry by entry) and runs them over answers shaped the ways models
+reply: the fenced block the old prompt gets, the same with a sentence
+around it, bare JSON from JSON mode, and broken answers (cut off, wrong
+structure). Every answer a parser rejects is an extraction that needs
+another LLM call.
+
+--live sends the sample PDF to the configured LLM API (GROQ_API_KEY,
+LLM_API_URL) that many times for each LLM_RESPONSE_FORMAT and reports how
+often each parser fails on the real answers.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+from benchmarks.llm_stub import large_result
+from parse_md_file import parse_markdown
+
+SAMPLE_PDF = os.path.join("uploads", "MR_DORAB_PATEL_08_06_2025_12_10_55_PM.pdf")
+
+
+def legacy_parse(resp_from_llm):
+    # main.parse_llm_response before the direct path, without the logging
+    try:
+        resp_json = json.loads(resp_from_llm)
+        choices = resp_json["choices"][0]["message"]["content"]
+        parsed_blocks = parse_markdown(choices)
+        res_json = json.loads(parsed_blocks[0]["content"].strip())
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        return {"error": str(e)}
+    if not isinstance(res_json, dict) or "test_categories" not in res_json:
+        return {"error": "Missing 'test_categories' in parsed JSON"}
+    return {"res_json": res_json, "raw": parsed_blocks}
+
+
+def direct_parse(resp_from_llm):
+    from main import parse_llm_response
+    return parse_llm_response(resp_from_llm)
+
+
+PARSERS = {"legacy": legacy_parse, "direct": direct_parse}
+
+
+def envelope(content):
+    return json.dumps({"choices": [{"message": {"role": "assistant", "content": content}}],
+                       "usage": {"prompt_tokens": 1, "completion_tokens": 1}})
+
+
+def answer_shapes(result):
+    text = json.dumps(result)
+    wrong = {**result, "test_categories": {"Hematology": {"tests": ["Hemoglobin 13.5 g/dL"]}}}
+    return {
+        "fenced": f"```json\n{text}\n```",
+        "fenced, preamble": f"Here is the extracted data:\n\n```json\n{text}\n```",
+        "fenced, note after": f"```json\n{text}\n```\n\nNote: reference ranges copied as printed.",
+        "bare JSON (JSON mode)": text,
+        "bare JSON, indented": json.dumps(result, indent=2),
+        "cut off": f"```json\n{text[:len(text) // 2]}",
+        "wrong structure": json.dumps(wrong),
+    }
+
+
+def time_parser(parse, resp, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        parse(resp)
+    return (time.perf_counter() - start) / rounds
+
+
+def offline(rounds):
+    result = large_result()
+    fenced = envelope(answer_shapes(result)["fenced"])
+    bare = envelope(json.dumps(result))
+    print(f"answer: {len(json.dumps(result)) / 1024:.0f} KiB, {rounds} rounds")
+    print(f"legacy, fenced answer     {time_parser(legacy_parse, fenced, rounds) * 1000:7.2f} ms")
+    print(f"direct, fenced answer     {time_parser(direct_parse, fenced, rounds) * 1000:7.2f} ms")
+    print(f"direct, JSON mode answer  {time_parser(direct_parse, bare, rounds) * 1000:7.2f} ms")
+    # One malformed test sends the answer through the lenient per-entry models
+    category = next(iter(result["test_categories"]))
+    malformed = {**result, "test_categories": {**result["test_categories"], category: {
+        **result["test_categories"][category],
+        "tests": ["Hemoglobin 13.5 g/dL", *result["test_categories"][category]["tests"]]}}}
+    print(f"direct, one bad test      {time_parser(direct_parse, envelope(json.dumps(malformed)), rounds) * 1000:7.2f} ms")
+
+    print()
+    print(f"{'answer shape':24} {'legacy':>8} {'direct':>8}")
+    failures = {name: 0 for name in PARSERS}
+    shapes = answer_shapes(result)
+    for shape, content in shapes.items():
+        outcomes = []
+        for name, parse in PARSERS.items():
+            ok = "error" not in parse(envelope(content))
+            failures[name] += not ok
+            outcomes.append("ok" if ok else "RETRY")
+        print(f"{shape:24} {outcomes[0]:>8} {outcomes[1]:>8}")
+    print(f"{'needs a retry':24} " + " ".join(f"{failures[name]:>4}/{len(shapes):<3}" for name in PARSERS))
+
+
+async def live(calls):
+    import llmcall
+    from extract_pdf import extract_document_structure
+    from prompt_format import format_prompt
+    prompt = format_prompt(extract_document_structure(SAMPLE_PDF))
+
+    print(f"{'response format':16} {'calls':>5} {'legacy fails':>13} {'direct fails':>13} {'direct parse':>13}")
+    for name in ("none", "json_object", "json_schema"):
+        llmcall.LLM_RESPONSE_FORMAT = name
+        failures = {parser: 0 for parser in PARSERS}
+        parse_seconds = 0.0
+        for _ in range(calls):
+            resp = await llmcall.fetch_pdf_extracted_data(prompt)
+            for parser, parse in PARSERS.items():
+                start = time.perf_counter()
+                failed = not resp or "error" in parse(resp)
+                if parser == "direct":
+                    parse_seconds += time.perf_counter() - start
+                failures[parser] += failed
+        print(f"{name:16} {calls:>5} {failures['legacy']:>13} {failures['direct']:>13} "
+              f"{parse_seconds / calls * 1000:>10.2f} ms")
+    await llmcall.close_llm_client()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--live", type=int, default=0, help="LLM calls per response format against the real API")
+    args = parser.parse_args()
+    # The direct parser logs every rejected answer; keep the table readable
+    logging.getLogger("healthtrack").setLevel(logging.ERROR)
+    if args.live:
+        asyncio.run(live(args.live))
+    else:
+        offline(args.rounds)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,190 @@
+"""
+Upload latency with the old print() logging vs the queue-backed logger, at
+20 concurrent uploads.
+
+    python -m benchmarks.bench_logging --uploads 20 --repeat 20
+
+Each upload walks the pipeline stages with simulated I/O waits and logs
+what that stage used to print (the indented extracted document, block
+previews, ...) or what it logs now. A probe coroutine meanwhile measures
+how late the event loop wakes it up, which is what every other request on
+the server would feel. The extraction print is done on the loop, as with
+EXTRACT_WORKERS=0; with the pool it ran in a worker but still delayed that
+upload.
+
+Every mode runs in its own process whose stdout is a pipe read by this
+script, like a container runtime collecting logs. --drain-mib-s caps how
+fast it is read, to mimic a slow log collector. The children inherit
+PYTHONUNBUFFERED, which most container images set.
+
+    print         the old print() calls
+    logger        the new loggers at the default INFO level
+    logger-debug  DEBUG with LOG_PAYLOAD_SAMPLE_RATE=1: every payload logged
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.llm_stub import large_result
+
+SAMPLE_PDF = os.path.join("uploads", "MR_DORAB_PATEL_08_06_2025_12_10_55_PM.pdf")
+MODES = ("print", "logger", "logger-debug")
+# Simulated wait per stage: save, extraction, LLM, Mongo writes (seconds)
+STAGE_WAITS = (0.002, 0.05, 0.2, 0.01)
+PROBE_INTERVAL = 0.01
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def build_inputs(repeat):
+    from extract_pdf import extract_document_structure
+    from parse_md_file import parse_markdown
+    doc = extract_document_structure(SAMPLE_PDF)
+    doc["pages"] = doc["pages"] * repeat
+    answer = "```json\n" + json.dumps(large_result()) + "\n```"
+    return json.dumps(doc, indent=2), answer, parse_markdown(answer)
+
+
+def print_stage(stage, doc_json, answer, blocks):
+    # What main.py and extract_pdf.py printed before the logging module
+    if stage == 1:
+        print("🔍 Extracting PDF...")
+        print(doc_json)
+        print(f"PDF extraction result: {type(doc_json)}")
+    elif stage == 2:
+        print("🤖 Calling LLM...")
+        print("LLM response type: <class 'str'>")
+        print("✅ LLM response parsed successfully")
+        print(f"📝 Choices content preview: {answer[:200]}...")
+        print("📄 Parsing markdown...")
+        print(f"Parsed blocks type: {type(blocks)}")
+        print(f"Number of blocks: {len(blocks)}")
+        for i, block in enumerate(blocks):
+            print(f"Block {i}: {type(block)} - Keys: {block.keys()}")
+            print(f"  Content preview: {repr(block['content'][:100])}")
+        print(f"🔍 JSON content to parse: {repr(blocks[0]['content'][:200])}")
+        print("✅ Final JSON parsed successfully")
+    elif stage == 3:
+        print("💾 Inserting user data...")
+        print("6650c0ffee0000000000cafe res from db")
+        print("📊 Prepared 8 reports for insertion")
+
+
+def logger_stage(stage, doc_json, answer, blocks):
+    from logs import get_logger, log_payload
+    log = get_logger("bench")
+    if stage == 1:
+        log.info("Extracting PDF")
+        log.info("Extracted PDF", extra={"chars": len(doc_json)})
+        log_payload(log, "Extracted document", doc_json)
+    elif stage == 2:
+        log.info("Calling LLM", extra={"prompt_chars": len(doc_json)})
+        log_payload(log, "LLM answer", answer)
+        log_payload(log, "Parsed markdown blocks", blocks, blocks=len(blocks))
+    elif stage == 3:
+        log.debug("Inserted patient details", extra={"db_userid": "6650c0ffee0000000000cafe"})
+        log.info("Inserting reports", extra={"reports": 8})
+
+
+async def upload(log_stage, inputs):
+    start = time.perf_counter()
+    for stage, wait in enumerate(STAGE_WAITS):
+        await asyncio.sleep(wait)
+        log_stage(stage, *inputs)
+    return time.perf_counter() - start
+
+
+async def probe(stop, lags):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def run(mode, uploads, inputs):
+    log_stage = print_stage if mode == "print" else logger_stage
+    stop = asyncio.Event()
+    lags = []
+    probe_task = asyncio.create_task(probe(stop, lags))
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(upload(log_stage, inputs) for _ in range(uploads)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+    return latencies, lags, elapsed
+
+
+def run_one(mode, uploads, repeat):
+    if mode == "logger-debug":
+        os.environ["LOG_LEVEL"] = "DEBUG"
+        os.environ["LOG_PAYLOAD_SAMPLE_RATE"] = "1"
+    import logs
+    inputs = build_inputs(repeat)
+    if mode != "print":
+        logs.setup_logging()
+    latencies, lags, elapsed = asyncio.run(run(mode, uploads, inputs))
+    flush_start = time.perf_counter()
+    if mode != "print":
+        logs.shutdown_logging()
+    sys.stdout.flush()
+    flush = time.perf_counter() - flush_start
+    sys.stderr.write(json.dumps({
+        "p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "max": max(latencies),
+        "lag_p95": percentile(lags, 95), "lag_max": max(lags), "elapsed": elapsed, "flush": flush,
+        "doc_chars": len(inputs[0])
+    }) + "\n")
+
+
+def drain(pipe, mib_per_second, counter):
+    # Read the child's stdout in 64 KiB pieces, no faster than the given rate
+    while chunk := pipe.read1(64 * 1024):
+        counter[0] += len(chunk)
+        if mib_per_second:
+            time.sleep(len(chunk) / (mib_per_second * 1024 * 1024))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20, help="copies of the sample pages in the extracted document")
+    parser.add_argument("--drain-mib-s", type=float, default=0, help="stdout read rate, 0 = as fast as possible")
+    parser.add_argument("--mode", choices=MODES)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_one(args.mode, args.uploads, args.repeat)
+        return
+
+    print(f"uploads={args.uploads} repeat={args.repeat} drain={args.drain_mib_s or 'unlimited'} MiB/s")
+    for mode in MODES:
+        child = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.bench_logging", "--mode", mode,
+             "--uploads", str(args.uploads), "--repeat", str(args.repeat)],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        written = [0]
+        reader = threading.Thread(target=drain, args=(child.stdout, args.drain_mib_s, written))
+        reader.start()
+        errors = child.stderr.read().decode()
+        child.wait()
+        reader.join()
+        if child.returncode != 0:
+            raise SystemExit(errors)
+        result = json.loads(errors.strip().splitlines()[-1])
+        print(f"{mode:13} upload p50 {result['p50'] * 1000:7.1f} ms  p95 {result['p95'] * 1000:7.1f} ms  "
+              f"max {result['max'] * 1000:7.1f} ms | loop lag p95 {result['lag_p95'] * 1000:6.1f} ms  "
+              f"max {result['lag_max'] * 1000:6.1f} ms | {written[0] / 1024 / 1024:6.1f} MiB logged, "
+              f"{result['flush'] * 1000:.0f} ms to flush at exit")
+
+
+if __name__ == "__main__":
+    main_cli()
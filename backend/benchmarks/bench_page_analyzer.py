@@ -0,0 +1,67 @@
+"""
+Per-page CPU time of the old text/table extraction vs analyze_page.
+
+    python -m benchmarks.bench_page_analyzer --rounds 5
+
+The old path called extract_text() twice and extract_tables() once per page.
+Character parsing is warmed up first so only the text/table stage is measured.
+Note that pdfplumber memoizes get_textmap() per page, so the second
+extract_text() was already a cache hit; on the sample reports (no ruled
+tables) the two paths are within noise of each other.
+"""
+import argparse
+import glob
+import os
+import time
+
+import pdfplumber
+
+from extract_pdf import analyze_page
+
+
+def legacy_page(page):
+    lines = page.extract_text().split("\n") if page.extract_text() else []
+    tables = page.extract_tables()
+    return lines, tables
+
+
+def cpu_per_page(pdf_path, fn, rounds):
+    total = 0.0
+    pages = 0
+    for _ in range(rounds):
+        # Fresh handle per round so no textmap is reused across rounds
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                page.chars  # parse the layout outside the timed section
+            start = time.process_time()
+            for page in pdf.pages:
+                fn(page)
+            total += time.process_time() - start
+            pages += len(pdf.pages)
+    return total / pages * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    for pdf_path in sorted(glob.glob(os.path.join("uploads", "*.pdf"))):
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                assert analyze_page(page) == legacy_page(page), f"output differs on page {page.page_number}"
+
+        # One untimed round of each so lazy imports and allocator warm-up
+        # are not charged to whichever path happens to run first
+        cpu_per_page(pdf_path, legacy_page, 1)
+        cpu_per_page(pdf_path, analyze_page, 1)
+
+        old = cpu_per_page(pdf_path, legacy_page, args.rounds)
+        new = cpu_per_page(pdf_path, analyze_page, args.rounds)
+        print(f"{os.path.basename(pdf_path)}")
+        print(f"  legacy       {old:7.2f} ms/page")
+        print(f"  analyze_page {new:7.2f} ms/page  ({(1 - new / old) * 100:.0f}% CPU saved)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Pages-per-second for serial vs page-parallel extraction.
+
+    python -m benchmarks.bench_page_parallel --workers 4 --repeat 6
+
+--repeat builds a larger bundle by concatenating the sample PDF with itself
+(9 pages x 6 = 54 pages), which is closer to a hospital discharge bundle.
+Also checks that the parallel output is identical to the serial one.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pypdfium2 as pdfium
+
+from extract_pdf import extract_document_structure, extract_document_structure_parallel
+
+SAMPLE_PDF = os.path.join("uploads", "MR_DORAB_PATEL_08_06_2025_12_10_55_PM.pdf")
+
+
+def build_bundle(source, repeat):
+    src = pdfium.PdfDocument(source)
+    bundle = pdfium.PdfDocument.new()
+    for _ in range(repeat):
+        bundle.import_pages(src)
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    bundle.save(path)
+    return path, len(bundle)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", default=SAMPLE_PDF)
+    parser.add_argument("--repeat", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    path, page_count = build_bundle(args.pdf, args.repeat)
+    try:
+        serial, serial_time = timed(extract_document_structure, path, 1)
+        parallel, parallel_time = timed(extract_document_structure_parallel, path, args.workers)
+    finally:
+        os.remove(path)
+
+    assert serial == parallel, "parallel extraction differs from serial output"
+    print(f"pages={page_count} workers={args.workers}")
+    print(f"serial   {serial_time:7.2f} s  {page_count / serial_time:7.1f} pages/s")
+    print(f"parallel {parallel_time:7.2f} s  {page_count / parallel_time:7.1f} pages/s")
+    print(f"speedup  {serial_time / parallel_time:7.2f}x (outputs identical)")
+
+
+if __name__ == "__main__":
+    main()
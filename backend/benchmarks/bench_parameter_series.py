@@ -0,0 +1,74 @@
+"""
+Trend lookup for /report-detail: the $unwind aggregation over report_data
+vs one indexed query on parameter_series, at 10, 100 and 1,000 reports per
+user. Needs MONGO_URI pointing at a disposable (local) mongod.
+
+    python -m benchmarks.bench_parameter_series --sizes 10 100 1000
+
+Inserts the synthetic reports (and their series points) under throwaway
+auth_userids, times both paths for the tags of one report, then deletes
+everything again.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from collections import defaultdict
+
+from benchmarks.bench_report_listing import synthetic_report
+from db import report_data, parameter_series
+from indexes import ensure_indexes
+from queries import parameter_history_pipeline
+from series import write_series, get_parameter_series
+
+
+async def unwind_path(auth_userid, tag_list):
+    result_map = defaultdict(list)
+    async for doc in report_data.aggregate(parameter_history_pipeline(auth_userid, tag_list)):
+        tag = doc.pop("parameter_tag")
+        result_map[tag].append(doc)
+    return result_map
+
+
+async def timed(fn, *args, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = await fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+async def run(sizes, rounds):
+    await ensure_indexes()
+    print(f"{'reports':>8} {'points':>8} {'$unwind ms':>11} {'series ms':>10} {'speedup':>8}")
+    for count in sizes:
+        auth_userid = f"bench-{uuid.uuid4().hex}"
+        documents = [synthetic_report(auth_userid, i) for i in range(count)]
+        await report_data.insert_many(documents)
+        await write_series(documents)
+        try:
+            # The detail page asks for the tags of the report being viewed
+            tag_list = [test["parameter_tag"] for test in documents[-1]["tests"]]
+            unwind_ms, old = await timed(unwind_path, auth_userid, tag_list, rounds=rounds)
+            series_ms, new = await timed(get_parameter_series, auth_userid, tag_list, rounds=rounds)
+        finally:
+            await report_data.delete_many({"auth_userid": auth_userid})
+            await parameter_series.delete_many({"auth_userid": auth_userid})
+
+        points = sum(len(values) for values in new.values())
+        assert points == sum(len(values) for values in old.values()), "paths returned different point counts"
+        print(f"{count:>8} {points:>8} {unwind_ms:>11.1f} {series_ms:>10.1f} {unwind_ms / series_ms:>7.1f}x")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.rounds))
+
+
+if __name__ == "__main__":
+    main_cli()
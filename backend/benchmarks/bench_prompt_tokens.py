@@ -0,0 +1,46 @@
+"""
+Prompt size of the old indented-JSON serialization vs the compact format.
+
+    python -m benchmarks.bench_prompt_tokens
+
+Uses tiktoken's cl100k_base encoding when it is installed, otherwise a rough
+word/punctuation count (JSON punctuation is close to one token per symbol).
+"""
+import glob
+import json
+import os
+import re
+
+from extract_pdf import extract_document_structure
+from prompt_format import serialize_compact
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(text):
+        return len(_encoding.encode(text))
+
+    TOKENIZER = "tiktoken cl100k_base"
+except ImportError:
+    _token = re.compile(r"\w+|[^\w\s]")
+
+    def count_tokens(text):
+        return len(_token.findall(text))
+
+    TOKENIZER = "approximate (words + punctuation)"
+
+
+def main():
+    print(f"tokenizer: {TOKENIZER}")
+    print(f"{'report':45} {'json':>8} {'compact':>8} {'tables':>8} {'saved':>6}")
+    for pdf_path in sorted(glob.glob(os.path.join("uploads", "*.pdf"))):
+        doc = extract_document_structure(pdf_path)
+        old = count_tokens(json.dumps(doc, indent=2))
+        new = count_tokens(serialize_compact(doc, tables_only=False))
+        lab_only = count_tokens(serialize_compact(doc, tables_only=True))
+        print(f"{os.path.basename(pdf_path)[:45]:45} {old:8} {new:8} {lab_only:8} {(1 - new / old) * 100:5.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Read-endpoint latency while uploads are in flight.
+
+Start the API first, once per mode you want to compare:
+
+    EXTRACT_WORKERS=0 uvicorn main:app --port 8000   # old inline extraction
+    EXTRACT_WORKERS=4 uvicorn main:app --port 8000   # process pool
+
+then run from the backend directory:
+
+    python -m benchmarks.bench_read_latency --user <auth_userid> --report <report_id>
+
+Uploads the sample PDFs in uploads/ in a loop while polling /reports and
+/report-detail, and prints p50/p99 latency for the read endpoints plus how
+many uploads were turned away with 503.
+"""
+import argparse
+import asyncio
+import glob
+import os
+import statistics
+import time
+
+import httpx
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def upload_loop(client, pdfs, user, stop, counters):
+    i = 0
+    while not stop.is_set():
+        path = pdfs[i % len(pdfs)]
+        i += 1
+        with open(path, "rb") as f:
+            files = {"file": (os.path.basename(path), f.read(), "application/pdf")}
+        data = {"userId": user, "title": "bench", "notes": "bench"}
+        try:
+            res = await client.post("/extract/", data=data, files=files)
+            counters["rejected" if res.status_code == 503 else "uploads"] += 1
+        except httpx.HTTPError:
+            counters["errors"] += 1
+
+
+async def read_loop(client, path, params, stop, samples):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            await client.get(path, params=params)
+        except httpx.HTTPError:
+            continue
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.05)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--report", help="report id for /report-detail")
+    parser.add_argument("--uploaders", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0)
+    args = parser.parse_args()
+
+    pdfs = sorted(glob.glob(os.path.join("uploads", "*.pdf")))
+    stop = asyncio.Event()
+    counters = {"uploads": 0, "rejected": 0, "errors": 0}
+    samples = {"/reports": [], "/report-detail": []}
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=300.0) as client:
+        tasks = [asyncio.create_task(upload_loop(client, pdfs, args.user, stop, counters))
+                 for _ in range(args.uploaders)]
+        for _ in range(args.readers):
+            tasks.append(asyncio.create_task(
+                read_loop(client, f"/reports/{args.user}", None, stop, samples["/reports"])))
+            if args.report:
+                tasks.append(asyncio.create_task(
+                    read_loop(client, f"/report-detail/{args.report}", {"auth_userid": args.user},
+                              stop, samples["/report-detail"])))
+
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    for name, values in samples.items():
+        if not values:
+            continue
+        print(f"{name:16} n={len(values):5} p50={statistics.median(values):8.1f} ms "
+              f"p99={percentile(values, 99):8.1f} ms max={max(values):8.1f} ms")
+    print(f"uploads completed={counters['uploads']} rejected(503)={counters['rejected']} "
+          f"errors={counters['errors']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,160 @@
+"""
+Report storage with the static test text inline (every test repeats
+full_form, method, clinical_significance and range_text) vs shared in
+test_reference (REPORT_TEXT_STORAGE=shared).
+
+    python -m benchmarks.bench_reference_text --reports 5000
+    python -m benchmarks.bench_reference_text --reports 20000 --uri mongodb://localhost:27017
+
+Reports are generated from the parameter catalog: --labs labs, each with
+its own wording per parameter, and --rewordings versions of that wording
+(the LLM does not always write it the same way). Offline it compares the
+BSON bytes of report_data plus test_reference. With --uri it stores both
+layouts in a scratch database and reports collStats sizes, how much of each
+collection sits in the WiredTiger cache after reading it all (the working
+set), and /report-detail latency (get_report_detail, reference cache cold
+and warm).
+
+Uses (and drops) the healthtrack_bench database.
+"""
+import argparse
+import asyncio
+import copy
+import random
+import time
+
+import bson
+
+from parameter_catalog import CATALOG
+
+BENCH_DB = "healthtrack_bench"
+SIGNIFICANCE = ("{name} is measured to assess organ function and screen for disease. Values outside the "
+                "reference range may indicate an underlying condition and should be interpreted together "
+                "with clinical findings, medication history and previous results. ")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def generate(reports, labs, rewordings, tests, seed=1):
+    rng = random.Random(seed)
+    documents = []
+    for n in range(reports):
+        lab = rng.randrange(labs)
+        entries = rng.sample(CATALOG, min(tests, len(CATALOG)))
+        documents.append({
+            "auth_userid": f"user{n % 200}",
+            "db_userid": f"patient{n % 1000}",
+            "report_name": "Panel",
+            "report_metadata": {"report_date": "01/01/2025", "laboratory_name": f"Lab {lab}"},
+            "report_date": "2025-01-01",
+            "tests": [{
+                "parameter_name": entry["tag"].replace("_", " ").title(),
+                "parameter_tag": entry["tag"],
+                "value": f"{rng.uniform(1, 200):.1f}",
+                "unit": entry["unit"],
+                "reference_range": {"lower_limit": 1, "upper_limit": 200,
+                                    "range_text": f"1 - 200 {entry['unit']} (adults, lab {lab})"},
+                "status": "NORMAL",
+                "full_form": entry["synonyms"][-1].replace("_", " ").title() if entry["synonyms"] else entry["tag"],
+                "method": f"Photometry, lab {lab}",
+                "notes": "",
+                "clinical_significance": SIGNIFICANCE.format(name=entry["tag"]) * 2
+                                         + f"(version {rng.randrange(rewordings)})",
+            } for entry in entries]
+        })
+    return documents
+
+
+def layouts(documents):
+    from reference_text import ReferenceText
+    inline = copy.deepcopy(documents)
+    shared = copy.deepcopy(documents)
+    splitter = ReferenceText(storage="shared")
+    references = {}
+    for document in shared:
+        references.update(splitter.split(document))
+    return inline, shared, list(references.values())
+
+
+def bson_bytes(documents):
+    return sum(len(bson.encode(document)) for document in documents)
+
+
+def offline(documents):
+    inline, shared, references = layouts(documents)
+    inline_bytes = bson_bytes(inline)
+    shared_bytes = bson_bytes(shared)
+    reference_bytes = bson_bytes(references)
+    print(f"inline  report_data {inline_bytes / 2**20:8.1f} MiB")
+    print(f"shared  report_data {shared_bytes / 2**20:8.1f} MiB  + test_reference {reference_bytes / 2**20:6.2f} MiB "
+          f"({len(references)} documents)  = {(shared_bytes + reference_bytes) / inline_bytes:.0%} of inline")
+    return inline, shared, references
+
+
+async def with_mongo(uri, inline, shared, references, reads):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    import main
+    import reference_text
+
+    client = AsyncIOMotorClient(uri)
+    db = client[BENCH_DB]
+    await client.drop_database(BENCH_DB)
+    await db["inline"].insert_many(inline)
+    await db["shared"].insert_many(shared)
+    await db["test_reference"].insert_many(references)
+    reference_text.test_reference = db["test_reference"]
+
+    async def cache_bytes(name):
+        stats = await db.command("collStats", name)
+        return stats.get("wiredTiger", {}).get("cache", {}).get("bytes currently in the cache", 0)
+
+    print()
+    print(f"{'collection':16} {'size':>10} {'storage':>10} {'in cache':>10}")
+    for name in ("inline", "shared", "test_reference"):
+        async for _ in db[name].find({}):
+            pass
+        stats = await db.command("collStats", name)
+        print(f"{name:16} {stats['size'] / 2**20:8.1f}Mi {stats['storageSize'] / 2**20:8.1f}Mi "
+              f"{await cache_bytes(name) / 2**20:8.1f}Mi")
+
+    # get_report_detail without its trend lookup, which is the same either way
+    async def no_series(auth_userid, tag_list):
+        return {}
+    main.get_parameter_series = no_series
+    ids = [document["_id"] for document in inline]
+    print()
+    for name, cache in (("inline", None), ("shared, cold", 0), ("shared, warm", len(references))):
+        main.report_data = db["inline" if cache is None else "shared"]
+        main.reference_text = reference_text.ReferenceText(storage="shared", cache_size=max(cache or 0, 1))
+        latencies = []
+        for report_id in random.Random(2).sample(ids, min(reads, len(ids))):
+            start = time.perf_counter()
+            await main.get_report_detail(str(report_id), "bench")
+            latencies.append(time.perf_counter() - start)
+        print(f"/report-detail {name:14} p50 {percentile(latencies, 50) * 1000:6.2f} ms  "
+              f"p95 {percentile(latencies, 95) * 1000:6.2f} ms")
+
+    await client.drop_database(BENCH_DB)
+    client.close()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", help="also measure against this mongod")
+    parser.add_argument("--reports", type=int, default=5000)
+    parser.add_argument("--tests", type=int, default=30, help="tests per report")
+    parser.add_argument("--labs", type=int, default=20)
+    parser.add_argument("--rewordings", type=int, default=3)
+    parser.add_argument("--reads", type=int, default=500)
+    args = parser.parse_args()
+    print(f"reports={args.reports} tests/report={args.tests} labs={args.labs} rewordings={args.rewordings}")
+    inline, shared, references = offline(generate(args.reports, args.labs, args.rewordings, args.tests))
+    if args.uri:
+        asyncio.run(with_mongo(args.uri, inline, shared, references, args.reads))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,95 @@
+"""
+Full report listing vs the paginated summary listing for a synthetic user
+with many reports. Needs MONGO_URI pointing at a disposable (local) mongod.
+
+    python -m benchmarks.bench_report_listing --reports 5000
+
+Inserts the synthetic reports under a throwaway auth_userid, measures
+response size and latency through the app, then deletes them again.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from datetime import date, timedelta
+
+import httpx
+
+import main
+from db import report_data
+
+SIGNIFICANCE = ("Measures the oxygen-carrying protein in red blood cells. Low values suggest anaemia, "
+                "high values may indicate dehydration or lung disease. ") * 3
+
+
+def synthetic_report(auth_userid, index):
+    day = date(2015, 1, 1) + timedelta(days=index)
+    tests = [{
+        "parameter_name": f"Parameter {t}", "parameter_tag": f"PARAM_{t}", "value": str(random.uniform(1, 200)),
+        "unit": "mg/dL", "reference_range": {"lower_limit": 1, "upper_limit": 100, "range_text": "1-100"},
+        "status": "NORMAL", "full_form": f"Parameter number {t}", "method": "Spectrophotometry",
+        "notes": "", "clinical_significance": SIGNIFICANCE
+    } for t in range(random.randint(5, 25))]
+    return {
+        "report_name": f"Panel {index % 7}", "auth_userid": auth_userid, "db_userid": "bench",
+        "patient_details": {"patient_name": "Bench User", "patient_id": "B-1"},
+        "report_metadata": {"report_name": f"Panel {index % 7}", "report_date": day.strftime("%d-%b-%Y")},
+        "report_date": day.isoformat(), "tests": tests
+    }
+
+
+async def timed_get(client, path, params=None, rounds=5):
+    samples, size = [], 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        response = await client.get(path, params=params)
+        samples.append((time.perf_counter() - start) * 1000)
+        size = len(response.content)
+    return statistics.median(samples), size, response.json()
+
+
+async def run(count, page_size):
+    auth_userid = f"bench-{uuid.uuid4().hex}"
+    await report_data.insert_many([synthetic_report(auth_userid, i) for i in range(count)])
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            full_ms, full_bytes, _ = await timed_get(client, f"/reports/{auth_userid}", rounds=3)
+            page_ms, page_bytes, page = await timed_get(
+                client, f"/reports/{auth_userid}", {"view": "summary", "limit": page_size})
+
+            # Walk every page to check the cursor covers the history exactly once
+            seen, cursor, pages, walk_start = 0, None, 0, time.perf_counter()
+            while True:
+                params = {"view": "summary", "limit": page_size}
+                if cursor:
+                    params["cursor"] = cursor
+                body = (await client.get(f"/reports/{auth_userid}", params=params)).json()
+                seen += len(body["items"])
+                pages += 1
+                cursor = body["next_cursor"]
+                if not cursor:
+                    break
+            walk_ms = (time.perf_counter() - walk_start) * 1000
+    finally:
+        await report_data.delete_many({"auth_userid": auth_userid})
+
+    assert seen == count, f"pagination returned {seen} of {count} reports"
+    print(f"reports={count}")
+    print(f"full listing        {full_ms:8.1f} ms  {full_bytes / 1024:10.1f} KiB")
+    print(f"summary first page  {page_ms:8.1f} ms  {page_bytes / 1024:10.1f} KiB  ({page_size} items)")
+    print(f"summary all pages   {walk_ms:8.1f} ms  {pages} pages, {seen} reports")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.reports, args.page_size))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,98 @@
+"""
+Persisting upload results one upload at a time vs group commit, against a
+local mongod.
+
+    python -m benchmarks.bench_report_writes --uploads 500 --concurrency 20
+    python -m benchmarks.bench_report_writes --uri "mongodb://localhost:27017/?replicaSet=rs0"
+
+Each upload writes a patient (from a pool of --patients identities, so most
+are repeat patients) and the report documents of a long lab bundle through
+ReportWriter, --concurrency of them at a time. Window 0 is the old
+behaviour: every upload resolves its patient and inserts its reports on its
+own. Reported: uploads persisted per second and the latency of write() as
+each upload sees it. Point --uri at a replica set to include transactions.
+
+Uses (and drops) the healthtrack_bench database.
+"""
+import argparse
+import asyncio
+import copy
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from benchmarks.llm_stub import large_result
+
+BENCH_DB = "healthtrack_bench"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(uri, uploads, concurrency, patients, windows, categories, tests):
+    import indexes
+    import main
+    import patients as patients_module
+    import report_writer
+
+    client = AsyncIOMotorClient(uri)
+    db = client[BENCH_DB]
+    await client.drop_database(BENCH_DB)
+    indexes.db = db
+    await indexes.ensure_indexes()
+    # Point the writer at the scratch database
+    patients_module.users = db["users"]
+    report_writer.report_data = db["report_data"]
+    report_writer.client = client
+
+    result = large_result(categories, tests)
+    print(f"uploads={uploads} concurrency={concurrency} patients={patients} "
+          f"reports/upload={categories} tests/report={tests}")
+
+    for window in windows:
+        writer = report_writer.ReportWriter(window_ms=window, max_batch=concurrency)
+        writer.start(None)
+        await db["report_data"].delete_many({})
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def upload(i):
+            res_json = copy.deepcopy(result)
+            res_json["patient_details"] = {"patient_name": f"Patient {i % patients}", "patient_id": str(i % patients)}
+            async with semaphore:
+                start = time.perf_counter()
+                await writer.write(res_json["patient_details"], "bench",
+                                   lambda db_userid: main.build_report_documents(res_json, "bench", db_userid))
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(upload(i) for i in range(uploads)))
+        elapsed = time.perf_counter() - start
+        await writer.stop()
+        stored = await db["report_data"].count_documents({})
+        print(f"window {window:5.1f} ms  transactions={writer.transactions:4}  {uploads / elapsed:8.1f} uploads/s  "
+              f"write p50 {percentile(latencies, 50) * 1000:7.1f} ms  p95 {percentile(latencies, 95) * 1000:7.1f} ms  "
+              f"({stored} reports, {await db['users'].count_documents({})} patients)")
+
+    await client.drop_database(BENCH_DB)
+    client.close()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--uploads", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--patients", type=int, default=50)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 2, 5, 10], help="group commit windows (ms)")
+    parser.add_argument("--categories", type=int, default=8)
+    parser.add_argument("--tests", type=int, default=30)
+    args = parser.parse_args()
+    asyncio.run(run(args.uri, args.uploads, args.concurrency, args.patients, args.windows,
+                    args.categories, args.tests))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,97 @@
+"""
+Serialization time and peak RSS for the full /reports listing: the old path
+(list of every document, _id rewritten in a loop, jsonable_encoder, stdlib
+json) vs orjson streamed straight off the cursor.
+
+    python -m benchmarks.bench_serialization --reports 5000
+
+Each path runs in its own process so the peak RSS figures do not mix. The
+cursor is simulated with synthetic documents, so no Mongo is needed;
+"cursor-only" shows what producing those documents costs by itself.
+"""
+import argparse
+import asyncio
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+
+from bson import ObjectId
+
+
+async def fake_cursor(count):
+    from benchmarks.bench_report_listing import synthetic_report
+    random.seed(0)
+    for i in range(count):
+        yield {"_id": ObjectId(), **synthetic_report("bench", i)}
+
+
+async def cursor_only(count):
+    async for _ in fake_cursor(count):
+        pass
+    return 0
+
+
+async def legacy_path(count):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    reports = []
+    async for report in fake_cursor(count):
+        report["_id"] = str(report["_id"])
+        reports.append(report)
+    return len(JSONResponse(content=jsonable_encoder(reports)).body)
+
+
+async def streaming_path(count):
+    from serialization import stream_json_array
+    size = 0
+    async for chunk in stream_json_array(fake_cursor(count)):
+        size += len(chunk)
+    return size
+
+
+PATHS = {"cursor-only": cursor_only, "legacy": legacy_path, "streaming": streaming_path}
+
+
+def peak_rss_kib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_one(path, count):
+    # Import everything up front so the baseline covers the modules
+    import fastapi.encoders  # noqa: F401
+    import serialization  # noqa: F401
+    import benchmarks.bench_report_listing  # noqa: F401
+    baseline = peak_rss_kib()
+    start = time.perf_counter()
+    size = asyncio.run(PATHS[path](count))
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"seconds": elapsed, "bytes": size, "peak_rss_kib": peak_rss_kib(),
+                      "added_rss_kib": peak_rss_kib() - baseline}))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=5000)
+    parser.add_argument("--path", choices=sorted(PATHS))
+    args = parser.parse_args()
+
+    if args.path:
+        run_one(args.path, args.reports)
+        return
+
+    print(f"reports={args.reports}")
+    for path in PATHS:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_serialization", "--path", path, "--reports", str(args.reports)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{path:12} {result['seconds'] * 1000:9.1f} ms  {result['bytes'] / 1024 / 1024:7.1f} MiB out  "
+              f"peak RSS {result['peak_rss_kib'] / 1024:7.1f} MiB (+{result['added_rss_kib'] / 1024:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main_cli()
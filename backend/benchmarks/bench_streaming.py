@@ -0,0 +1,97 @@
+"""
+Time to first persisted test category and peak client memory, blocking vs
+streaming LLM calls, against a local streaming stub in a separate process.
+
+    python -m benchmarks.bench_streaming --categories 8 --tests 30
+
+Both modes receive the same answer at the same simulated token rate. The
+persistence stage is a callback that records when each category reaches it,
+so no database is needed. Memory is the tracemalloc peak of this process.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+
+
+import llmcall
+from main import parse_llm_response
+from stream_json import ReportStreamParser
+
+
+async def blocking(on_category):
+    resp_from_llm = await llmcall.fetch_pdf_extracted_data("report")
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = parse_llm_response(resp_from_llm)
+    for name, category in result["res_json"]["test_categories"].items():
+        on_category(name, category)
+
+
+async def streaming(on_category):
+    parser = ReportStreamParser()
+    async for delta in llmcall.stream_pdf_extracted_data("report"):
+        for kind, name, value in parser.feed(delta):
+            if kind == "category":
+                on_category(name, value)
+    parser.result()
+
+
+async def measure(fn):
+    arrivals = []
+    start = time.perf_counter()
+    tracemalloc.start()
+    await fn(lambda name, category: arrivals.append(time.perf_counter() - start))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return arrivals[0], time.perf_counter() - start, peak, len(arrivals)
+
+
+async def run():
+    # Warm the pooled connection so neither mode pays the connect
+    await llmcall.fetch_pdf_extracted_data("warm-up")
+    results = {"blocking": await measure(blocking), "streaming": await measure(streaming)}
+    await llmcall.close_llm_client()
+    return results
+
+
+def wait_for_port(port):
+    for _ in range(200):
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.1):
+            return
+        time.sleep(0.05)
+    raise RuntimeError("stub server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--categories", type=int, default=8)
+    parser.add_argument("--tests", type=int, default=30)
+    parser.add_argument("--interval", type=float, default=0.002, help="seconds between 16-char deltas")
+    args = parser.parse_args()
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    stub = subprocess.Popen([sys.executable, "-m", "benchmarks.llm_stub", "--port", str(port),
+                             "--categories", str(args.categories), "--tests", str(args.tests),
+                             "--interval", str(args.interval)])
+    try:
+        wait_for_port(port)
+        llmcall.LLM_API_URL = f"http://127.0.0.1:{port}/v1/chat/completions"
+        results = asyncio.run(run())
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    for name, (first, total, peak, count) in results.items():
+        print(f"{name:9} first category {first * 1000:8.1f} ms  all {count} done {total * 1000:8.1f} ms  "
+              f"peak {peak / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Checks of the chunked LLM stage against the fake LLM server, run from the
+backend directory:
+
+    python -m benchmarks.check_chunk_merge
+
+A 12-page document goes through run_chunked_llm_stage in chunks of
+LLM_CHUNK_PAGES. The fake server answers each chunk from the pages it was
+sent, so the merge is checked on what chunks really look like: a category
+every chunk repeats, a category split over a chunk boundary, patient details
+that differ per chunk, and a chunk whose answer is broken. Exits with
+status 1 if any check fails. The timing comparison is bench_chunked_llm.
+"""
+import asyncio
+import contextlib
+import io
+import json
+import sys
+
+import llmcall
+from benchmarks.bench_chunked_llm import pages_in
+from benchmarks.llm_stub import StubServer, create_stub_app
+from main import run_chunked_llm_stage
+import chunking
+
+PAGES = 12
+# Biochemistry is printed on these pages: the first chunk boundary falls inside it
+SPLIT_CATEGORY_PAGES = (chunking.LLM_CHUNK_PAGES, chunking.LLM_CHUNK_PAGES + 1)
+
+
+def document():
+    return {"pages": [{"page_number": n, "text_blocks": [f"Result line of page {n}"], "tables": []}
+                      for n in range(1, PAGES + 1)]}
+
+
+def fake_answer(body, broken_page=None):
+    pages = pages_in(body)
+    if broken_page in pages:
+        return "```json\n{\"test_categories\": {\"Hematology\": \n```"
+    first = pages[0]
+    categories = {"Hematology": {"report_name": "CBC", "tests": [
+        # Every chunk repeats the same test, as models do with a summary row
+        {"parameter_name": "Hemoglobin", "parameter_tag": "HEMOGLOBIN", "value": "13.5"},
+        *({"parameter_name": f"Page {n}", "parameter_tag": f"PAGE_{n}", "value": str(n)} for n in pages)]}}
+    split = [n for n in pages if n in SPLIT_CATEGORY_PAGES]
+    if split:
+        categories["Biochemistry"] = {"report_name": "" if first == 1 else "Biochemistry", "tests": [
+            {"parameter_name": f"Chemistry {n}", "parameter_tag": f"CHEM_{n}", "value": str(n)} for n in split]}
+    return "```json\n" + json.dumps({
+        # Only the first chunk sees the header with the name; a later one the id
+        "patient_details": {"patient_name": f"Patient of chunk starting at page {first}" if first == 1 else "",
+                            "patient_id": "" if first == 1 else "P-7"},
+        "report_metadata": {"report_name": "Bundle", "report_date": "01/01/2025"},
+        "test_categories": categories,
+    }) + "\n```"
+
+
+async def run_stage(answer):
+    with StubServer(create_stub_app(answer)) as stub:
+        llmcall.LLM_API_URL = stub.url
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = await run_chunked_llm_stage(document())
+        await llmcall.close_llm_client()
+    return result
+
+
+def check(results, name, ok):
+    results.append(ok)
+    print(f"{'ok  ' if ok else 'FAIL'} {name}")
+
+
+def main():
+    results = []
+    chunks = chunking.split_document(document())
+    check(results, f"{PAGES} pages go out in {len(chunks)} chunks", len(chunks) > 1)
+
+    merged = asyncio.run(run_stage(fake_answer))
+    categories = (merged.get("res_json") or {}).get("test_categories", {})
+    check(results, "all chunks answered", "error" not in merged)
+    check(results, "a category repeated by every chunk is merged into one, its tests in page order",
+          list(categories) == ["Hematology", "Biochemistry"]
+          and [t["parameter_tag"] for t in categories["Hematology"]["tests"]]
+          == ["HEMOGLOBIN"] + [f"PAGE_{n}" for n in range(1, PAGES + 1)])
+    check(results, "a category split over a chunk boundary keeps the tests of both chunks",
+          [t["parameter_tag"] for t in categories.get("Biochemistry", {}).get("tests", [])]
+          == [f"CHEM_{n}" for n in SPLIT_CATEGORY_PAGES])
+    check(results, "an empty category field is filled from a later chunk",
+          categories.get("Biochemistry", {}).get("report_name") == "Biochemistry")
+    patient = (merged.get("res_json") or {}).get("patient_details", {})
+    check(results, "patient details come from the first chunk, gaps filled from later ones",
+          patient.get("patient_name") == "Patient of chunk starting at page 1" and patient.get("patient_id") == "P-7")
+
+    broken_page = PAGES - 1
+    failed = asyncio.run(run_stage(lambda body: fake_answer(body, broken_page)))
+    check(results, "a broken chunk fails the whole stage and says which chunk",
+          "error" in failed and failed.get("chunk") == len(chunks) - 1)
+
+    print(f"{sum(results)}/{len(results)} checks passed")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""
+Checks of the parameter catalog's tag mapping, run from the backend directory:
+
+    python -m benchmarks.check_parameter_catalog
+
+Each case is (LLM tag, printed name, canonical unit) and the catalog tag it
+has to map to. Urine results must never join the serum parameter of the
+same name, or they land in its trend series. Exits with status 1 if any
+case maps differently.
+"""
+import sys
+
+from parameter_catalog import parameter_catalog
+
+CASES = [
+    # Urine vs serum: the printed name alone does not say which
+    (("URINE_CREATININE", "Creatinine", "mg/dL"), "URINE_CREATININE"),
+    (("URINE_ALBUMIN", "Albumin", ""), "URINE_ALBUMIN"),
+    (("URINE_GLUCOSE", "Glucose", "mg/dL"), "URINE_GLUCOSE"),
+    (("URINE_PROTEIN", "Protein", ""), "URINE_PROTEIN"),
+    (("CREATININE", "Creatinine", "mg/dL"), "CREATININE"),
+    (("SERUM_CREATININE", "Creatinine", "mg/dL"), "CREATININE"),
+    (("ALBUMIN", "Albumin", "g/dL"), "ALBUMIN"),
+    # The name is used when the tag adds nothing to it, or says nothing the catalog knows
+    (("SERUM_CREATININE", "Serum Creatinine", "mg/dL"), "CREATININE"),
+    ((None, "Haemoglobin", "g/dL"), "HEMOGLOBIN"),
+    (("HB", "Haemoglobin", "g/dL"), "HEMOGLOBIN"),
+    (("BLOOD_GLUCOSE_FASTING", "Fasting Blood Sugar", "mg/dL"), "GLUCOSE_FASTING"),
+]
+
+
+def main():
+    failed = 0
+    for (tag, name, unit), expected in CASES:
+        found = parameter_catalog.canonical_tag(tag, name, unit)
+        ok = found == expected
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {tag!s:24} {name!s:22} {unit!s:8} -> {found} (expected {expected})")
+    print(f"{len(CASES) - failed}/{len(CASES)} cases passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Local stand-in for the OpenAI-compatible chat completions endpoint, used by
+the LLM benchmarks. Runs uvicorn in a background thread, optionally over TLS
+with a throwaway self-signed certificate so handshake cost is realistic.
+"""
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+SAMPLE_RESULT = {
+    "patient_details": {"patient_name": "Test Patient", "patient_id": "P-1"},
+    "report_metadata": {"report_name": "CBC", "report_date": "01/01/2025"},
+    "test_categories": {
+        "Hematology": {
+            "report_name": "Complete Blood Count",
+            "patient_details": {"patient_name": "Test Patient", "patient_id": "P-1"},
+            "tests": [
+                {"parameter_name": "Hemoglobin", "parameter_tag": "HEMOGLOBIN", "value": "13.5",
+                 "unit": "g/dL", "reference_range": {"lower_limit": 13, "upper_limit": 17, "range_text": "13-17"},
+                 "status": "NORMAL"}
+            ]
+        }
+    }
+}
+
+
+def default_answer(request_body):
+    return "```json\n" + json.dumps(SAMPLE_RESULT) + "\n```"
+
+
+def large_result(categories=8, tests=30):
+    """A report the size of a long multi-section lab bundle."""
+    test = SAMPLE_RESULT["test_categories"]["Hematology"]["tests"][0]
+    result = {
+        "patient_details": SAMPLE_RESULT["patient_details"],
+        "report_metadata": SAMPLE_RESULT["report_metadata"],
+        "test_categories": {}
+    }
+    for c in range(categories):
+        result["test_categories"][f"Category {c}"] = {
+            "report_name": f"Panel {c}",
+            "tests": [{**test, "parameter_tag": f"TEST_{c}_{t}",
+                       "clinical_significance": "Used to assess overall health and screen for disorders. " * 4}
+                      for t in range(tests)]
+        }
+    return result
+
+
+def create_stub_app(answer=default_answer, delay=0.0, stream_chunk_chars=16, stream_interval=0.0):
+    """
+    `delay` is seconds per call, or a callable(request_body) returning it.
+    Requests with "stream": true get the answer as SSE deltas of
+    `stream_chunk_chars` characters, `stream_interval` seconds apart.
+    """
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        content = answer(body)
+
+        if body.get("stream"):
+            async def events():
+                # Pace against a deadline so sleep overshoot does not accumulate
+                start = time.perf_counter()
+                for n, i in enumerate(range(0, len(content), stream_chunk_chars)):
+                    wait = start + n * stream_interval - time.perf_counter()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    chunk = {"id": "stub", "object": "chat.completion.chunk", "model": body.get("model"),
+                             "choices": [{"index": 0, "delta": {"content": content[i:i + stream_chunk_chars]}}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        seconds = delay(body) if callable(delay) else delay
+        if seconds:
+            await asyncio.sleep(seconds)
+        return {
+            "id": "stub",
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(json.dumps(body)) // 4,
+                      "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(json.dumps(body)) + len(content)) // 4}
+        }
+
+    return app
+
+
+def _self_signed_cert():
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]),
+                       critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    directory = tempfile.mkdtemp()
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+class StubServer:
+    """Context manager: `with StubServer(app, tls=True) as stub: stub.url`"""
+
+    def __init__(self, app, tls=False):
+        self.app = app
+        self.tls = tls
+        self.cert_path = None
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+
+        ssl_kwargs = {}
+        if self.tls:
+            self.cert_path, key_path = _self_signed_cert()
+            ssl_kwargs = {"ssl_certfile": self.cert_path, "ssl_keyfile": key_path}
+
+        config = uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning", **ssl_kwargs)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+
+        scheme = "https" if self.tls else "http"
+        self.url = f"{scheme}://127.0.0.1:{port}/v1/chat/completions"
+        return self
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join()
+
+
+if __name__ == "__main__":
+    # Serve the large report from a separate process, so benchmarks can
+    # measure client memory without the server's allocations mixed in
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--categories", type=int, default=8)
+    parser.add_argument("--tests", type=int, default=30)
+    parser.add_argument("--chunk-chars", type=int, default=16)
+    parser.add_argument("--interval", type=float, default=0.002)
+    args = parser.parse_args()
+
+    content = "```json\n" + json.dumps(large_result(args.categories, args.tests), indent=2) + "\n```"
+    chunks = -(-len(content) // args.chunk_chars)
+    app = create_stub_app(lambda body: content, delay=chunks * args.interval,
+                          stream_chunk_chars=args.chunk_chars, stream_interval=args.interval)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,249 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+import hashlib
+import json
+import os
+import time
+
+load_dotenv()  # Load from .env file
+
+# memory | disk | mongo | none
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class MemoryBackend:
+    """In-process LRU. Values are kept as JSON strings so sizes are honest."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, payload)
+        self._bytes = 0
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at < time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return payload
+
+    async def peek(self, key):
+        # get() without marking the entry as used
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
+
+    async def set(self, key, payload, ttl):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.time() + ttl, payload)
+        self._bytes += len(payload)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, payload = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+
+class DiskBackend:
+    """One file per key; file mtime doubles as the LRU clock."""
+
+    def __init__(self, directory=CACHE_DIR, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def _read(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                expires_at = float(f.readline())
+                payload = f.read()
+        except (OSError, ValueError):
+            return None
+        if expires_at < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return payload
+
+    async def get(self, key):
+        path = self._path(key)
+        payload = self._read(path)
+        if payload is not None:
+            self._touch(path)  # mark as recently used
+        return payload
+
+    async def peek(self, key):
+        # get() without marking the entry as used
+        return self._read(self._path(key))
+
+    async def set(self, key, payload, ttl):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(f"{time.time() + ttl}\n")
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self._touch(path)
+        self._evict()
+
+    def _touch(self, path):
+        # Explicit ns timestamps; the filesystem clock can be too coarse for LRU order
+        now = time.time_ns()
+        os.utime(path, ns=(now, now))
+
+    def _evict(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        files.sort()  # oldest access first
+        while files and (len(files) > self.max_entries or total > self.max_bytes):
+            _, size, path = files.pop(0)
+            total -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class MongoBackend:
+    """Shared cache in a Mongo collection. Expiry is handled by a TTL index."""
+
+    def __init__(self, collection, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._indexed = False
+
+    async def _ensure_indexes(self):
+        if not self._indexed:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+            await self.collection.create_index("last_access")
+            self._indexed = True
+
+    async def get(self, key):
+        now = datetime.now(timezone.utc)
+        doc = await self.collection.find_one_and_update(
+            {"_id": key, "expires_at": {"$gt": now}},
+            {"$set": {"last_access": now}},
+            projection={"payload": 1}
+        )
+        return doc["payload"] if doc else None
+
+    async def peek(self, key):
+        # get() as a plain read: no last_access write
+        doc = await self.collection.find_one(
+            {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+            projection={"payload": 1}
+        )
+        return doc["payload"] if doc else None
+
+    async def set(self, key, payload, ttl):
+        await self._ensure_indexes()
+        now = datetime.now(timezone.utc)
+        await self.collection.replace_one(
+            {"_id": key},
+            {"payload": payload, "size": len(payload), "last_access": now,
+             "expires_at": now + timedelta(seconds=ttl)},
+            upsert=True
+        )
+        await self._evict()
+
+    async def _evict(self):
+        count = await self.collection.estimated_document_count()
+        if count > self.max_entries:
+            cursor = self.collection.find({}, {"_id": 1}).sort("last_access", 1).limit(count - self.max_entries)
+            stale = [doc["_id"] async for doc in cursor]
+            await self.collection.delete_many({"_id": {"$in": stale}})
+
+        totals = await self.collection.aggregate(
+            [{"$group": {"_id": None, "bytes": {"$sum": "$size"}}}]
+        ).to_list(1)
+        total = totals[0]["bytes"] if totals else 0
+        if total > self.max_bytes:
+            cursor = self.collection.find({}, {"_id": 1, "size": 1}).sort("last_access", 1)
+            stale = []
+            async for doc in cursor:
+                if total <= self.max_bytes:
+                    break
+                stale.append(doc["_id"])
+                total -= doc.get("size", 0)
+            await self.collection.delete_many({"_id": {"$in": stale}})
+
+
+class ExtractionCache:
+    """
+    Content-addressed cache for the two expensive upload stages.
+
+    extraction:<sha256>                          -> extracted document string
+    llm:<sha256>:<model>:<prompt_version>        -> {"res_json": ..., "raw": ...}
+    """
+
+    def __init__(self, backend, ttl=CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = {
+            "extraction": {"hits": 0, "misses": 0},
+            "llm": {"hits": 0, "misses": 0},
+        }
+
+    async def _get(self, stage, key):
+        if self.backend is None:
+            return None
+        payload = await self.backend.get(key)
+        self.stats[stage]["hits" if payload is not None else "misses"] += 1
+        return json.loads(payload) if payload is not None else None
+
+    async def _set(self, key, value):
+        if self.backend is not None:
+            await self.backend.set(key, json.dumps(value), self.ttl)
+
+    async def get_extraction(self, digest):
+        return await self._get("extraction", f"extraction:{digest}")
+
+    async def set_extraction(self, digest, document):
+        await self._set(f"extraction:{digest}", document)
+
+    async def get_llm_result(self, digest, model, prompt_version):
+        return await self._get("llm", f"llm:{digest}:{model}:{prompt_version}")
+
+    async def set_llm_result(self, digest, model, prompt_version, result):
+        await self._set(f"llm:{digest}:{model}:{prompt_version}", result)
+
+
+def make_backend(name=CACHE_BACKEND):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "disk":
+        return DiskBackend()
+    if name == "mongo":
+        from db import db
+        return MongoBackend(db["extraction_cache"])
+    return None
+
+
+extraction_cache = ExtractionCache(make_backend())
@@ -0,0 +1,97 @@
+from dotenv import load_dotenv
+import json
+import os
+
+load_dotenv()  # Load from .env file
+
+# Documents with more pages than this are sent to the LLM in chunks of at
+# most this many pages. 0 disables chunking.
+LLM_CHUNK_PAGES = int(os.getenv("LLM_CHUNK_PAGES", "5"))
+# Upper bound on the serialized size of one chunk, whatever its page count
+LLM_CHUNK_MAX_CHARS = int(os.getenv("LLM_CHUNK_MAX_CHARS", "60000"))
+# How many chunk requests may be in flight at once for a single upload
+LLM_CHUNK_CONCURRENCY = int(os.getenv("LLM_CHUNK_CONCURRENCY", "4"))
+
+
+def should_chunk(doc, max_pages=LLM_CHUNK_PAGES):
+    return max_pages > 0 and len(doc.get("pages", [])) > max_pages
+
+
+def split_document(doc, max_pages=LLM_CHUNK_PAGES, max_chars=LLM_CHUNK_MAX_CHARS):
+    """
+    Split {"pages": [...]} into a list of smaller documents of the same shape.
+    Pages are never split, and stay in their original order.
+    """
+    chunks = []
+    current = []
+    current_size = 0
+    for page in doc.get("pages", []):
+        size = len(json.dumps(page))
+        if current and (len(current) >= max_pages or current_size + size > max_chars):
+            chunks.append({"pages": current})
+            current = []
+            current_size = 0
+        current.append(page)
+        current_size += size
+    if current:
+        chunks.append({"pages": current})
+    return chunks
+
+
+def _is_empty(value):
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _merge_fields(target, source):
+    # First non-empty value wins; lists are unioned in order of appearance
+    for key, value in (source or {}).items():
+        if isinstance(value, list) and isinstance(target.get(key), list):
+            for item in value:
+                if item not in target[key]:
+                    target[key].append(item)
+        elif _is_empty(target.get(key)) and not _is_empty(value):
+            target[key] = value
+        elif key not in target:
+            target[key] = value
+    return target
+
+
+def merge_chunk_results(results):
+    """
+    Merge per-chunk extraction results (in chunk order) into one result with
+    the same structure as a single-call extraction. Tests are de-duplicated by
+    parameter_tag across all categories; the first occurrence is kept.
+    """
+    merged = {
+        "patient_details": {},
+        "report_metadata": {},
+        "test_categories": {}
+    }
+    seen_tags = set()
+
+    for result in results:
+        _merge_fields(merged["patient_details"], result.get("patient_details"))
+        _merge_fields(merged["report_metadata"], result.get("report_metadata"))
+
+        for name, category in (result.get("test_categories") or {}).items():
+            if not isinstance(category, dict):
+                continue
+
+            tests = []
+            for test in category.get("tests") or []:
+                tag = test.get("parameter_tag") if isinstance(test, dict) else None
+                if tag:
+                    if tag in seen_tags:
+                        continue
+                    seen_tags.add(tag)
+                tests.append(test)
+
+            target = merged["test_categories"].setdefault(name, {})
+            _merge_fields(target, {k: v for k, v in category.items() if k != "tests"})
+            target.setdefault("tests", []).extend(tests)
+
+    # Categories whose tests were all duplicates of earlier chunks
+    merged["test_categories"] = {
+        name: category for name, category in merged["test_categories"].items() if category.get("tests")
+    }
+    return merged
@@ -3,10 +3,13 @@ from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
+from logs import get_logger
 import os
 
 load_dotenv()  # Load from .env file
 
+log = get_logger("db")
+
 # Now you can access
 MONGO_URI = os.getenv("MONGO_URI")
 
@@ -16,12 +19,16 @@ client = AsyncIOMotorClient(MONGO_URI)
 # Ping to confirm connection
 try:
     client.admin.command('ping')
-    print("Connected to MongoDB!")
+    log.info("Connected to MongoDB")
 except Exception as e:
-    print("Connection failed:", e)
+    log.error("MongoDB connection failed", extra={"error": str(e)})
 
 # Export the database you want to use
 db = client["health_reports_db"]  # You can rename this as needed
 
 users = db["users"]
 report_data = db["report_data"]
+# One document per test result, fanned out from report_data for trend lookups
+parameter_series = db["parameter_series"]
+# Static test text shared by reports (REPORT_TEXT_STORAGE=shared)
+test_reference = db["test_reference"]
@@ -1,39 +1,152 @@
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from logs import get_logger, log_payload, setup_worker_logging
 import pdfplumber
+import io
 import json
+import os
 
-def extract_document_structure(pdf_path):
-    document = {
-        "pages": []
+load_dotenv()  # Load from .env file
+
+# Worker processes used to extract page ranges of a single PDF in parallel.
+# 1 keeps the serial path.
+EXTRACT_PAGE_WORKERS = int(os.getenv("EXTRACT_PAGE_WORKERS", "1"))
+# Below this many pages the process start-up cost outweighs the speedup
+PARALLEL_MIN_PAGES = int(os.getenv("PARALLEL_MIN_PAGES", "8"))
+
+log = get_logger("extract_pdf")
+
+
+def analyze_page(page):
+    """
+    Single layout pass over a page. pdfplumber caches the parsed characters
+    and edges on the page object, so the text map is built once and tables are
+    only searched for when the page actually has ruling lines to build them from.
+    """
+    text = page.get_textmap().as_string
+    lines = text.split("\n") if text else []
+
+    tables = []
+    if page.edges:
+        tables = [table.extract() for table in page.find_tables()]
+
+    return lines, tables
+
+
+def extract_page(page):
+    content = {
+        "page_number": page.page_number,
+        "text_blocks": [],
+        "tables": []
     }
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            content = {
-                "page_number": page.page_number,
-                "text_blocks": [],
-                "tables": []
-            }
+    # Text lines (grouped by y position) and tables from one layout pass
+    lines, tables = analyze_page(page)
+    content["text_blocks"] = lines
+    content["tables"] = tables
 
-            # Extract paragraphs (as list of lines grouped by y position)
-            lines = page.extract_text().split("\n") if page.extract_text() else []
-            content["text_blocks"] = lines
+    return content
 
-            # Extract tables
-            tables = page.extract_tables()
-            for table in tables:
-                content["tables"].append(table)
 
-            document["pages"].append(content)
+def open_pdf(source):
+    # `source` is a path, or the PDF itself when the upload was kept in memory
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return pdfplumber.open(io.BytesIO(source))
+    return pdfplumber.open(source)
 
-    return document
 
-def extract_pdf(pdf_path):
+def iter_pages(source, start=0, stop=None):
+    """
+    Extract pages one at a time. A page's parsed layout (characters, edges,
+    text map) is dropped as soon as its content is out, so memory holds one
+    page's worth of pdfplumber objects however long the PDF is.
+    """
+    with open_pdf(source) as pdf:
+        for page in pdf.pages[start:stop]:
+            try:
+                yield extract_page(page)
+            finally:
+                page.close()
+
+
+def extract_page_range(pdf_path, start, stop):
+    # Runs in a worker process, so it opens its own handle on the file
+    return list(iter_pages(pdf_path, start, stop))
+
+
+def split_page_ranges(page_count, workers):
+    # Contiguous, near-equal (start, stop) ranges covering every page
+    workers = max(1, min(workers, page_count))
+    size, extra = divmod(page_count, workers)
+    ranges = []
+    start = 0
+    for i in range(workers):
+        stop = start + size + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
 
-        try:
-            doc = extract_document_structure(pdf_path)
-            stringified_doc = json.dumps(doc, indent=2)
-            print(stringified_doc)
-            return stringified_doc
-        except Exception as e:
-            print(f"Error reading PDF: {e}")
-            return f"Error reading PDF: {e}"
+def count_pages(pdf_path):
+    with open_pdf(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def iter_pages_parallel(pdf_path, workers=EXTRACT_PAGE_WORKERS, page_count=None):
+    if page_count is None:
+        page_count = count_pages(pdf_path)
+    if page_count == 0:
+        return
+
+    ranges = split_page_ranges(page_count, workers)
+    with ProcessPoolExecutor(max_workers=len(ranges), initializer=setup_worker_logging) as executor:
+        futures = [executor.submit(extract_page_range, pdf_path, start, stop) for start, stop in ranges]
+        # Ranges are contiguous and submitted in order, so handing on the
+        # results in submission order keeps the pages in page order
+        for future in futures:
+            yield from future.result()
+
+
+def iter_document_pages(pdf_path, page_workers=EXTRACT_PAGE_WORKERS):
+    if page_workers > 1:
+        page_count = count_pages(pdf_path)
+        if page_count >= PARALLEL_MIN_PAGES:
+            return iter_pages_parallel(pdf_path, page_workers, page_count)
+    return iter_pages(pdf_path)
+
+
+def extract_document_structure_parallel(pdf_path, workers=EXTRACT_PAGE_WORKERS, page_count=None):
+    return {"pages": list(iter_pages_parallel(pdf_path, workers, page_count))}
+
+
+def extract_document_structure(pdf_path, page_workers=EXTRACT_PAGE_WORKERS):
+    return {"pages": list(iter_document_pages(pdf_path, page_workers))}
+
+
+def write_document(pages, out):
+    """
+    Serialize {"pages": [...]} into `out` page by page as `pages` yields
+    them, so no page is kept once written. Returns the page count.
+    """
+    count = 0
+    out.write('{"pages": [')
+    for page in pages:
+        if count:
+            out.write(", ")
+        out.write(json.dumps(page))
+        count += 1
+    out.write("]}")
+    return count
+
+
+def extract_pdf(pdf_path):
+    try:
+        buffer = io.StringIO()
+        page_count = write_document(iter_document_pages(pdf_path), buffer)
+        stringified_doc = buffer.getvalue()
+        log.info("Extracted PDF", extra={"pages": page_count, "chars": len(stringified_doc)})
+        log_payload(log, "Extracted document", stringified_doc)
+        return stringified_doc
+    except Exception as e:
+        log.warning("Error reading PDF", extra={"error": str(e)})
+        return f"Error reading PDF: {e}"
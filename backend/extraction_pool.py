@@ -0,0 +1,76 @@
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from logs import setup_worker_logging
+import asyncio
+import os
+
+load_dotenv()  # Load from .env file
+
+# Number of worker processes running pdfplumber. 0 runs extraction inline
+# on the event loop (the old behaviour, kept for benchmarking).
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+# How many extractions may wait for a free worker before we start rejecting
+EXTRACT_QUEUE_SIZE = int(os.getenv("EXTRACT_QUEUE_SIZE", "16"))
+# Seconds suggested to clients in the Retry-After header when the queue is full
+EXTRACT_RETRY_AFTER = int(os.getenv("EXTRACT_RETRY_AFTER", "5"))
+
+
+class ExtractionQueueFull(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Extraction queue is full")
+        self.retry_after = retry_after
+
+
+class ExtractionPool:
+    """
+    Runs CPU-bound PDF extraction in a process pool so the event loop keeps
+    serving other requests. Admission is bounded: at most `workers` jobs run
+    and `queue_size` more wait; anything beyond that raises ExtractionQueueFull.
+    """
+
+    def __init__(self, workers: int = EXTRACT_WORKERS, queue_size: int = EXTRACT_QUEUE_SIZE,
+                 retry_after: int = EXTRACT_RETRY_AFTER):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self._executor = None
+        self._pending = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self):
+        if self.workers > 0 and self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=setup_worker_logging)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def submit(self, fn, *args):
+        # Inline mode: same as calling fn directly inside the handler
+        if self.workers <= 0:
+            return fn(*args)
+
+        # Only touched from the event loop thread, so a plain counter is safe
+        if self._pending >= self.capacity:
+            raise ExtractionQueueFull(self.retry_after)
+
+        self.start()
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+
+extraction_pool = ExtractionPool()
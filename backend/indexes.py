@@ -0,0 +1,111 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from bson import ObjectId
+from db import db
+from jobs import JOB_STORE, FINISHED as JOB_FINISHED
+from queries import reports_by_user_filter, report_summary_pipeline, parameter_series_filter, parameter_trend_filter
+
+# Every secondary index the API relies on, per collection. Names are fixed so
+# create_indexes is a no-op once they exist.
+INDEXES = {
+    "report_data": [
+        IndexModel([("auth_userid", ASCENDING), ("report_metadata.report_date", DESCENDING)],
+                   name="auth_userid_report_metadata_date"),
+        # Summary listing: keyset pagination on (report_date, _id) per user
+        IndexModel([("auth_userid", ASCENDING), ("report_date", DESCENDING), ("_id", DESCENDING)],
+                   name="auth_userid_report_date_id"),
+        # Multikey: one entry per test, for tag lookups straight on report_data
+        IndexModel([("auth_userid", ASCENDING), ("tests.parameter_tag", ASCENDING)],
+                   name="auth_userid_parameter_tag"),
+        # A patient's reports, newest first; also drives compact-patients
+        IndexModel([("db_userid", ASCENDING), ("report_date", DESCENDING)], name="db_userid_report_date"),
+    ],
+    "users": [
+        # One record per patient identity; records from before identity
+        # resolution have no match_key until compact-patients runs
+        IndexModel([("match_key", ASCENDING)], name="match_key", unique=True,
+                   partialFilterExpression={"match_key": {"$exists": True}}),
+    ],
+    "parameter_series": [
+        # Trend lookup: a few tags of one user, merged in date order
+        IndexModel([("auth_userid", ASCENDING), ("parameter_tag", ASCENDING), ("report_date", ASCENDING)],
+                   name="auth_userid_parameter_tag_date"),
+        # Rollback and backfill replace a report's points
+        IndexModel([("report_id", ASCENDING)], name="report_id"),
+    ],
+}
+
+if JOB_STORE == "mongo":
+    # Takeover looks for unfinished jobs whose lease ran out, oldest first
+    INDEXES["jobs"] = [
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+    ]
+
+
+async def ensure_indexes():
+    for collection, models in INDEXES.items():
+        await db[collection].create_indexes(models)
+
+
+def _explain_find(collection, filter, sort=None):
+    command = {"find": collection, "filter": filter}
+    if sort:
+        command["sort"] = sort
+    return command
+
+
+def _explain_aggregate(collection, pipeline):
+    return {"aggregate": collection, "pipeline": pipeline, "cursor": {}}
+
+
+def query_shapes():
+    """
+    (name, explainable command) for every query the API runs on a hot path.
+    The values are placeholders; the planner only cares about the shape.
+    """
+    auth_userid = "index-check"
+    tags = ["HEMOGLOBIN", "GLUCOSE_FASTING"]
+    shapes = [
+        ("reports full listing", _explain_find("report_data", reports_by_user_filter(auth_userid))),
+        ("reports summary, first page",
+         _explain_aggregate("report_data", report_summary_pipeline(auth_userid, 50))),
+        ("reports summary, next page",
+         _explain_aggregate("report_data", report_summary_pipeline(auth_userid, 50, ("2025-01-01", ObjectId())))),
+        ("reports summary, undated page",
+         _explain_aggregate("report_data", report_summary_pipeline(auth_userid, 50, (None, ObjectId())))),
+        ("report detail by id", _explain_find("report_data", {"_id": ObjectId()})),
+        ("report detail parameter history",
+         _explain_find("parameter_series", parameter_series_filter(auth_userid, tags), {"report_date": 1})),
+        ("parameter trends", _explain_find("parameter_series", parameter_trend_filter(auth_userid, tags))),
+        ("parameter trends, all tags", _explain_find("parameter_series", parameter_trend_filter(auth_userid))),
+        ("patient by match key", _explain_find("users", {"match_key": "0" * 64})),
+    ]
+    if JOB_STORE == "mongo":
+        shapes.append(("expired jobs", _explain_find(
+            "jobs", {"status": {"$nin": list(JOB_FINISHED)},
+                     "$or": [{"lease_until": {"$lt": 0}}, {"lease_until": {"$exists": False}}]},
+            {"created_at": 1})))
+    return shapes
+
+
+def plan_stages(node):
+    """All stage names in the chosen plans of an explain() result."""
+    stages = []
+    if isinstance(node, dict):
+        if isinstance(node.get("stage"), str):
+            stages.append(node["stage"])
+        for key, value in node.items():
+            if key != "rejectedPlans":
+                stages.extend(plan_stages(value))
+    elif isinstance(node, list):
+        for value in node:
+            stages.extend(plan_stages(value))
+    return stages
+
+
+async def explain_query_shapes():
+    """Returns [(name, stages)] for each query shape, using queryPlanner verbosity."""
+    results = []
+    for name, command in query_shapes():
+        explained = await db.command({"explain": command, "verbosity": "queryPlanner"})
+        results.append((name, plan_stages(explained)))
+    return results
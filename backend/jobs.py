@@ -0,0 +1,366 @@
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from uploads import upload_exists, remove_uploads, spill_upload
+from logs import get_logger, request_id, job_id as current_job_id
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+
+load_dotenv()  # Load from .env file
+
+# mongo | local
+JOB_STORE = os.getenv("JOB_STORE", "mongo")
+JOB_DIR = os.getenv("JOB_DIR", "jobs")
+# Uploads processed at the same time
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Jobs waiting for a worker before /extract/ starts answering 503
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "100"))
+JOB_RETRY_AFTER = int(os.getenv("JOB_RETRY_AFTER", "10"))
+# A process holds its jobs for this long and renews them every third of it;
+# jobs of a process that stopped renewing are taken over by the others
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+log = get_logger("jobs")
+
+STAGES = ("queued", "extracting", "llm", "parsing", "persisting", "done", "failed")
+FINISHED = ("done", "failed")
+
+# Set while a job runs so pipeline code can report progress without knowing about jobs
+_stage_reporter = ContextVar("stage_reporter", default=None)
+
+
+async def report_stage(stage, **fields):
+    reporter = _stage_reporter.get()
+    if reporter is not None:
+        await reporter(stage, **fields)
+
+
+def silence_stage_reports():
+    # Call at the start of a child task (it has its own context copy) so
+    # per-file pipelines inside a batch job do not overwrite the job status
+    _stage_reporter.set(None)
+
+
+def job_files(job):
+    # Single uploads carry file_path, batch jobs a list of files
+    if job.get("files"):
+        return [entry["file_path"] for entry in job["files"]]
+    return [job["file_path"]] if job.get("file_path") else []
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobQueueFull(Exception):
+    """Raised when too many uploads are already waiting to be processed."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+
+class MongoJobStore:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def create(self, job):
+        await self.collection.insert_one(job)
+
+    async def update(self, job_id, fields):
+        await self.collection.update_one({"_id": job_id}, {"$set": fields, "$inc": {"version": 1}})
+
+    async def get(self, job_id):
+        return await self.collection.find_one({"_id": job_id})
+
+    async def claim(self, job_id, owner):
+        # Atomic, so two API processes never run the same job
+        result = await self.collection.update_one(
+            {"_id": job_id, "status": "queued", "owner": owner},
+            {"$set": {"status": "extracting", "updated_at": _now()}, "$inc": {"version": 1}}
+        )
+        return result.modified_count == 1
+
+    async def renew(self, job_ids, owner, lease_until):
+        await self.collection.update_many({"_id": {"$in": list(job_ids)}, "owner": owner},
+                                          {"$set": {"lease_until": lease_until}})
+
+    async def expired(self, now):
+        # Unfinished jobs no live process holds (jobs from before leases have none)
+        cursor = self.collection.find({
+            "status": {"$nin": list(FINISHED)},
+            "$or": [{"lease_until": {"$lt": now}}, {"lease_until": {"$exists": False}}]
+        }).sort("created_at", 1)
+        return [job async for job in cursor]
+
+    async def adopt(self, job, owner, lease_until):
+        # Compare-and-set on the lease read, so only one process takes a job over
+        result = await self.collection.update_one(
+            {"_id": job["_id"], "status": {"$nin": list(FINISHED)}, "lease_until": job.get("lease_until")},
+            {"$set": {"status": "queued", "owner": owner, "lease_until": lease_until, "updated_at": _now()},
+             "$inc": {"version": 1}}
+        )
+        return result.modified_count == 1
+
+
+class LocalJobStore:
+    """One JSON file per job; for single-process deployments without Mongo."""
+
+    def __init__(self, directory=JOB_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _write(self, job):
+        tmp_path = self._path(job["_id"]) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, self._path(job["_id"]))
+
+    async def create(self, job):
+        self._write(job)
+
+    async def update(self, job_id, fields):
+        job = await self.get(job_id)
+        if job is not None:
+            job.update(fields)
+            job["version"] = job.get("version", 0) + 1
+            self._write(job)
+
+    async def get(self, job_id):
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    async def claim(self, job_id, owner):
+        job = await self.get(job_id)
+        if job is None or job["status"] != "queued" or job.get("owner") != owner:
+            return False
+        await self.update(job_id, {"status": "extracting", "updated_at": _now()})
+        return True
+
+    async def renew(self, job_ids, owner, lease_until):
+        for job_id in job_ids:
+            job = await self.get(job_id)
+            if job is not None and job.get("owner") == owner:
+                job["lease_until"] = lease_until
+                self._write(job)
+
+    async def expired(self, now):
+        jobs = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                job = await self.get(name[:-5])
+                if job and job["status"] not in FINISHED and (job.get("lease_until") or 0) < now:
+                    jobs.append(job)
+        return sorted(jobs, key=lambda job: job["created_at"])
+
+    async def adopt(self, job, owner, lease_until):
+        current = await self.get(job["_id"])
+        if current is None or current["status"] in FINISHED or current.get("lease_until") != job.get("lease_until"):
+            return False
+        await self.update(job["_id"], {"status": "queued", "owner": owner, "lease_until": lease_until,
+                                       "updated_at": _now()})
+        return True
+
+
+class JobQueue:
+    """
+    Runs upload jobs in the background with a fixed number of workers.
+    Every stage change is written to the store, so clients can poll
+    /jobs/{id} from any API process.
+
+    Each process leases the jobs it queued or is running (owner and
+    lease_until in the store) and renews the lease while it is alive. Jobs
+    whose lease ran out, because their process died or was restarted, are
+    taken over by another process (or this one after a restart) as long as
+    their uploaded file is still on disk; jobs of live processes are left
+    alone. On stop, uploads of unfinished jobs still held in memory are
+    written to disk so a restart can resume them.
+    """
+
+    def __init__(self, store, workers=JOB_WORKERS, max_pending=JOB_QUEUE_LIMIT,
+                 retry_after=JOB_RETRY_AFTER, lease_seconds=JOB_LEASE_SECONDS):
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.handler = None
+        self._queue = None
+        self._tasks = []
+        self._changed = {}
+        # Jobs this process has leased: queued here or running
+        self._held = set()
+        self.running = 0
+
+    @property
+    def queued(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self, handler):
+        self.handler = handler
+        self._queue = asyncio.Queue()
+
+        # Resume whatever a previous process left behind
+        await self._adopt_expired()
+
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        # Running jobs stay unfinished in the store and resume on next start
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._spill_uploads()
+
+    async def _spill_uploads(self):
+        # Uploads held in memory would be lost with the process: write those
+        # of the jobs left unfinished to disk and point the jobs at the files
+        for job_id in set(self._held):
+            try:
+                job = await self.store.get(job_id)
+                if job is None or job["status"] in FINISHED:
+                    continue
+                if job.get("files"):
+                    files = [{**entry, "file_path": spill_upload(entry["file_path"])} for entry in job["files"]]
+                    if files != job["files"]:
+                        await self.store.update(job_id, {"files": files})
+                elif job.get("file_path"):
+                    file_path = spill_upload(job["file_path"])
+                    if file_path != job["file_path"]:
+                        await self.store.update(job_id, {"file_path": file_path})
+            except Exception as e:
+                log.warning("Failed to keep upload for resume", extra={"job_id": job_id, "error": str(e)})
+
+    def _lease_until(self):
+        return time.time() + self.lease_seconds
+
+    async def _adopt_expired(self):
+        for job in await self.store.expired(time.time()):
+            if not await self.store.adopt(job, self.owner, self._lease_until()):
+                continue  # Another process got there first
+            if all(upload_exists(ref) for ref in job_files(job)):
+                log.info("Resuming job", extra={"job_id": job["_id"], "previous_owner": job.get("owner")})
+                self._held.add(job["_id"])
+                self._queue.put_nowait(job["_id"])
+            else:
+                await self._set(job["_id"], {"status": "failed", "error": "Uploaded file lost before processing"})
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if self._held:
+                    await self.store.renew(set(self._held), self.owner, self._lease_until())
+                await self._adopt_expired()
+            except Exception as e:
+                log.warning("Job lease renewal failed", extra={"error": str(e)})
+
+    async def submit(self, **fields):
+        if self._queue.qsize() >= self.max_pending:
+            raise JobQueueFull(self.retry_after)
+
+        job_id = uuid.uuid4().hex
+        now = _now()
+        # The submitting request's id follows the job into its logs
+        job = {"_id": job_id, "status": "queued", "version": 0, "error": None, "result": None,
+               "created_at": now, "updated_at": now, "request_id": request_id.get(),
+               "owner": self.owner, "lease_until": self._lease_until(), **fields}
+        await self.store.create(job)
+        self._held.add(job_id)
+        self._queue.put_nowait(job_id)
+        return job
+
+    async def get(self, job_id):
+        return await self.store.get(job_id)
+
+    async def wait_for_change(self, job_id, version, timeout):
+        """Return the job once its version moves past `version`, or at timeout."""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            job = await self.store.get(job_id)
+            if job is None or job.get("version", 0) > version or job["status"] in FINISHED:
+                return job
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return job
+            event = self._changed.setdefault(job_id, asyncio.Event())
+            # Short waits so changes made by another API process are seen too
+            try:
+                await asyncio.wait_for(event.wait(), min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _set(self, job_id, fields):
+        await self.store.update(job_id, {**fields, "updated_at": _now()})
+        event = self._changed.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                if await self.store.claim(job_id, self.owner):
+                    self.running += 1
+                    try:
+                        await self._run(job_id)
+                    finally:
+                        self.running -= 1
+                self._held.discard(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id):
+        job = await self.store.get(job_id)
+
+        async def reporter(stage, **fields):
+            await self._set(job_id, {"status": stage, **fields})
+
+        token = _stage_reporter.set(reporter)
+        # Workers are long-lived tasks, so the ids are reset once the job is over
+        id_tokens = (request_id.set(job.get("request_id")), current_job_id.set(job_id))
+        log.info("Job started", extra={"kind": job.get("kind", "upload")})
+        try:
+            result = await self.handler(job)
+            if isinstance(result, dict) and "error" in result:
+                log.warning("Job failed", extra={"error": result["error"]})
+                await self._set(job_id, {"status": "failed", "error": result["error"]})
+            else:
+                log.info("Job done")
+                await self._set(job_id, {"status": "done", "result": result})
+        except asyncio.CancelledError:
+            # Shutting down: keep the file so the job resumes on next start
+            raise
+        except Exception as e:
+            log.exception("Job crashed")
+            await self._set(job_id, {"status": "failed", "error": f"Internal server error: {str(e)}"})
+        finally:
+            _stage_reporter.reset(token)
+
+        # Finished one way or the other, the uploads are no longer needed
+        remove_uploads(job_files(job))
+        request_id.reset(id_tokens[0])
+        current_job_id.reset(id_tokens[1])
+
+
+def make_store(name=JOB_STORE):
+    if name == "local":
+        return LocalJobStore()
+    from db import db
+    return MongoJobStore(db["jobs"])
+
+
+job_queue = JobQueue(make_store())
@@ -1,18 +1,85 @@
 import httpx
 import json
 from dotenv import load_dotenv
+from metrics import LLM_REQUESTS, record_llm_usage
+from logs import get_logger
+from report_schema import report_json_schema
 import os
 
 load_dotenv()  # Load from .env file
 
+log = get_logger("llm")
+
 # Now you can access
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-async def fetch_pdf_extracted_data(pdf_contents: str):
-    url = 'https://api.groq.com/openai/v1/chat/completions'
-    api_key = GROQ_API_KEY
+LLM_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+# Bump whenever SYSTEM_PROMPT changes so cached LLM results are not reused
+PROMPT_VERSION = "1"
+
+# Stream completions and persist test categories as they are parsed
+LLM_STREAM = os.getenv("LLM_STREAM", "false").lower() == "true"
+
+LLM_API_URL = os.getenv("LLM_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+
+# What the API is asked to return: json_object (JSON mode), json_schema (the
+# report schema, for models that support structured outputs) or none (free
+# text, usually a ```json fenced block)
+LLM_RESPONSE_FORMAT = os.getenv("LLM_RESPONSE_FORMAT", "json_object")
+
+# Connection pool for the shared LLM client
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+
+# Per-phase timeouts (seconds). Read is long because completions are slow.
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+LLM_WRITE_TIMEOUT = float(os.getenv("LLM_WRITE_TIMEOUT", "30"))
+LLM_POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", "30"))
+
+_llm_client = None
+
+
+def create_llm_client(**client_kwargs):
+    return httpx.AsyncClient(
+        http2=LLM_HTTP2,
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(
+            connect=LLM_CONNECT_TIMEOUT,
+            read=LLM_READ_TIMEOUT,
+            write=LLM_WRITE_TIMEOUT,
+            pool=LLM_POOL_TIMEOUT
+        ),
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {GROQ_API_KEY}"
+        },
+        **client_kwargs
+    )
+
+
+def get_llm_client():
+    # Normally created by the app lifespan; created lazily for scripts
+    global _llm_client
+    if _llm_client is None or _llm_client.is_closed:
+        _llm_client = create_llm_client()
+    return _llm_client
 
-    system_prompt = """Medical Report Data Extraction System Prompt
+
+async def close_llm_client():
+    global _llm_client
+    if _llm_client is not None:
+        await _llm_client.aclose()
+        _llm_client = None
+
+
+SYSTEM_PROMPT = """Medical Report Data Extraction System Prompt
 You are a medical data extraction specialist. Your task is to analyze medical reports and extract all relevant information into a structured JSON format. You have the autonomy to make intelligent decisions about data categorization, parameter standardization, and field creation based on the content provided.
 Core Responsibilities
 1. Analyze the provided medical report data comprehensively
@@ -115,12 +182,22 @@ Output Requirements
 Process the provided medical report data and return the complete structured JSON extraction.
 """
 
+
+def response_format(name):
+    if name == "json_schema":
+        return {"type": "json_schema", "json_schema": {"name": "lab_report", "schema": report_json_schema()}}
+    if name == "json_object":
+        return {"type": "json_object"}
+    return None
+
+
+def build_request_body(pdf_contents: str, stream: bool = False):
     request_body = {
-        "model": "meta-llama/llama-4-scout-17b-16e-instruct",
+        "model": LLM_MODEL,
         "messages": [
             {
                 "role": "system",
-                "content": system_prompt
+                "content": SYSTEM_PROMPT
             },
             {
                 "role": "user",
@@ -128,20 +205,58 @@ Process the provided medical report data and return the complete structured JSON
             }
         ]
     }
+    output_format = response_format(LLM_RESPONSE_FORMAT)
+    if output_format is not None:
+        request_body["response_format"] = output_format
+    if stream:
+        request_body["stream"] = True
+    return request_body
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
+
+async def fetch_pdf_extracted_data(pdf_contents: str, client: httpx.AsyncClient = None):
+    url = LLM_API_URL
+    request_body = build_request_body(pdf_contents)
 
     try:
-        async with httpx.AsyncClient(timeout=120.0) as client: 
-            response = await client.post(url, json=request_body, headers=headers)
-            response.raise_for_status()
-            res = json.dumps(response.json())
-            return res
+        # Shared client: keeps TLS connections alive between uploads
+        client = client or get_llm_client()
+        response = await client.post(url, json=request_body)
+        response.raise_for_status()
+        LLM_REQUESTS.inc(1, "ok")
+        # Passed on as received, parse_llm_response decodes it once
+        return response.text
     except httpx.HTTPError as e:
-        print('Error:', e)
-        if e.response is not None:
+        LLM_REQUESTS.inc(1, "error")
+        log.error("LLM request failed", extra={"error": str(e)})
+        if getattr(e, "response", None) is not None:
             return e.response.text
-        return None
\ No newline at end of file
+        return None
+
+
+async def stream_pdf_extracted_data(pdf_contents: str, client: httpx.AsyncClient = None):
+    """
+    Same request as fetch_pdf_extracted_data with "stream": true. Yields the
+    content deltas of the answer as they arrive over server-sent events.
+    """
+    url = LLM_API_URL
+    request_body = build_request_body(pdf_contents, stream=True)
+
+    client = client or get_llm_client()
+    async with client.stream("POST", url, json=request_body) as response:
+        if response.is_error:
+            LLM_REQUESTS.inc(1, "error")
+        response.raise_for_status()
+        LLM_REQUESTS.inc(1, "ok")
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            event = json.loads(data)
+            # Usage arrives with the last chunk (Groq puts it under x_groq)
+            record_llm_usage(event.get("usage") or (event.get("x_groq") or {}).get("usage"))
+            for choice in event.get("choices") or []:
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    yield delta
@@ -0,0 +1,192 @@
+"""
+Structured logging that never writes on the event loop.
+
+Loggers from get_logger() hand their records to a queue; a background
+thread formats them (one JSON object per line, or plain text) and writes
+them out, so a slow stdout or log collector cannot stall request handling.
+Every record carries the id of the request, and of the job, it was logged
+from. Large debug payloads go through log_payload(), which only writes a
+sample of them.
+"""
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+
+import orjson
+
+load_dotenv()  # Load from .env file
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# json | text
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Share of log_payload() calls that are written when DEBUG is on (1 = all)
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+# Sampled payloads are cut to this many characters
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+
+ROOT_LOGGER = "healthtrack"
+REQUEST_ID_HEADER = b"x-request-id"
+# Client supplied ids are kept only if they look like an id
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+request_id = ContextVar("request_id", default=None)
+job_id = ContextVar("job_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener = None
+
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def log_payload(logger, message, payload, **fields):
+    """
+    Debug record with a large payload (an extracted document, an LLM
+    answer), written for LOG_PAYLOAD_SAMPLE_RATE of the calls and cut to
+    LOG_PAYLOAD_MAX_CHARS. Free unless DEBUG is enabled.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+        return
+    if not isinstance(payload, str):
+        payload = repr(payload)
+    logger.debug(message, extra={**fields, "payload": payload[:LOG_PAYLOAD_MAX_CHARS],
+                                 "payload_chars": len(payload)})
+
+
+def record_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **record_fields(record),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    Does on the calling thread only what cannot wait: stamping the request
+    and job ids (context variables) and rendering %-args and tracebacks
+    while those objects are still alive. Formatting and I/O happen on the
+    listener thread.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.request_id = request_id.get()
+        record.job_id = job_id.get()
+        return record
+
+
+def make_formatter(fmt=LOG_FORMAT):
+    return JSONFormatter() if fmt == "json" else TextFormatter()
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """Route the app's loggers through the queue and start the writer thread."""
+    global _listener
+    if _listener is not None:
+        return
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(make_formatter(fmt))
+    log_queue = queue.SimpleQueue()
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(level)
+    logger.handlers = [ContextQueueHandler(log_queue)]
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, writer)
+    _listener.start()
+
+
+def shutdown_logging():
+    # Writes out whatever is still queued before returning
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_worker_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """
+    Process pool initializer. A forked worker inherits the queue handler
+    but not the thread draining it, so it writes directly instead; it has
+    no event loop to block.
+    """
+    global _listener
+    _listener = None
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(make_formatter(fmt))
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(level)
+    logger.handlers = [writer]
+    logger.propagate = False
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware giving every request a correlation id: the client's
+    X-Request-ID if it sent a usable one, else a new one. It is set for
+    the logs of the request (and of the jobs it submits) and echoed back
+    in the X-Request-ID response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        supplied = dict(scope["headers"]).get(REQUEST_ID_HEADER, b"").decode("latin-1")
+        current = supplied if VALID_REQUEST_ID.match(supplied) else uuid.uuid4().hex
+        token = request_id.set(current)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (REQUEST_ID_HEADER, current.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
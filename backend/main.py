@@ -1,17 +1,70 @@
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, Response, PlainTextResponse
+from contextlib import asynccontextmanager
 from extract_pdf import extract_pdf
-from llmcall import fetch_pdf_extracted_data
-from parse_md_file import parse_markdown
+from extraction_pool import extraction_pool, ExtractionQueueFull
+from llmcall import fetch_pdf_extracted_data, stream_pdf_extracted_data, get_llm_client, close_llm_client, LLM_MODEL, LLM_STREAM
+from stream_json import ReportStreamParser
+from prompt_format import format_prompt, prompt_cache_version
+from cache import extraction_cache
+from metrics import (registry, Gauge, MetricsMiddleware, STAGE_SECONDS, MONGO_QUERY_SECONDS,
+                     record_llm_usage, timed_cursor)
+from uploads import (save_upload, remove_uploads, upload_source, UploadSizeLimit, UploadTooLarge,
+                     UPLOAD_MAX_BYTES, FORM_OVERHEAD_BYTES, BATCH_MAX_BYTES)
+from response_cache import response_cache
+from serialization import FastJSONResponse, dumps, to_jsonable, stream_json_array
+from jobs import job_queue, report_stage, silence_stage_reports, JobQueueFull, FINISHED as JOB_FINISHED
+from chunking import should_chunk, split_document, merge_chunk_results, LLM_CHUNK_CONCURRENCY
+from parse_md_file import parse_markdown, find_json_fence
+from report_schema import parse_report, parse_section, parse_category, describe_errors
+from normalize import normalize_report_date, normalize_tests, canonical_unit
+from parameter_catalog import parameter_catalog
+from queries import reports_by_user_filter, report_summary_pipeline
+from series import write_series, delete_series, get_parameter_series, get_trend_points
+from trends import compute_trends, BUCKETS as TREND_BUCKETS
+from indexes import ensure_indexes
+from logs import (get_logger, log_payload, setup_logging, shutdown_logging, RequestIdMiddleware,
+                  LOG_PAYLOAD_MAX_CHARS)
+from patients import upsert_patient, upsert_patients
+from report_writer import report_writer
+from reference_text import reference_text
 from db import users, report_data
 from bson import ObjectId
+from pymongo.errors import BulkWriteError, PyMongoError
+from pydantic import ValidationError
 from typing import List, Optional
-from collections import defaultdict
 import os
-import shutil
+import asyncio
+import base64
+import httpx
 import json
+import time
+import zipfile
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Spin up the extraction workers, the pooled LLM client and the upload
+    # job workers before serving, tear them down on exit
+    setup_logging()
+    extraction_pool.start()
+    get_llm_client()
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        log.warning("Failed to ensure MongoDB indexes", extra={"error": str(e)})
+    report_writer.start(documents_written)
+    await job_queue.start(run_job)
+    yield
+    await job_queue.stop()
+    await report_writer.stop()
+    await close_llm_client()
+    extraction_pool.shutdown()
+    shutdown_logging()
+
+log = get_logger("api")
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Allow all origins (development only)
 app.add_middleware(
@@ -22,9 +75,22 @@ app.add_middleware(
     allow_headers=["*"],
 )            
 
+# Request latency and in-flight count for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Reject oversized uploads while they stream in, before they are read fully
+app.add_middleware(
+    UploadSizeLimit,
+    limits={"/extract/": UPLOAD_MAX_BYTES + FORM_OVERHEAD_BYTES, "/extract/batch/": BATCH_MAX_BYTES},
+)
+
+# Outermost, so every response and every log line of the request carries its id
+app.add_middleware(RequestIdMiddleware)
+
 # Example data model for request body
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Files per /extract/batch/ request, and how many of them run at once
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "200"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
 # Root route
 @app.get("/")
 def read_root():
@@ -36,207 +102,805 @@ def read_item(item_id: int, q: str = None):
     return {"item_id": item_id, "query": q}
 
 
-async def insert_user_data(res_json):
-     #save the report data in db
-    inserted_user = await users.insert_one(res_json['patient_details'])
-    res = str(inserted_user.inserted_id)
-    print(res, "res from db")
-    return res
+async def save_patient(res_json, userId):
+    """The db_userid of the report's patient, reusing their record if they have one; and whether it was new."""
+    with STAGE_SECONDS.time("upsert_patient"):
+        db_userid, created = await upsert_patient(res_json.get('patient_details'), userId)
+    log.debug("Resolved patient", extra={"db_userid": db_userid, "created": created})
+    return db_userid, created
 
-async def insert_report_data(data):
-    insert_report_data = await report_data.insert_many(data)
-    return str(insert_report_data.inserted_ids)
 
 
+def encode_cursor(report_date, report_id):
+    raw = json.dumps([report_date, str(report_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
 
-def convert_object_ids(obj):
-    if isinstance(obj, list):
-        return [convert_object_ids(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {k: convert_object_ids(v) for k, v in obj.items()}
-    elif isinstance(obj, ObjectId):
-        return str(obj)
+
+def decode_cursor(cursor):
+    try:
+        report_date, report_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if report_date is not None and not isinstance(report_date, str):
+            raise ValueError("report_date")
+        return report_date, ObjectId(report_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def get_report_summaries(auth_userid, limit, cursor):
+    """
+    One page of the report list, newest first, with only what the list page
+    renders. Keyset pagination on (report_date, _id), so page N costs the same
+    as page 1 however long the history is.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    pipeline = report_summary_pipeline(auth_userid, limit, after)
+
+    items = [doc async for doc in timed_cursor(report_data.aggregate(pipeline), "reports_summary")]
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        # None for an undated report, which the next page's match understands
+        next_cursor = encode_cursor(last.get("report_date"), last["_id"])
+
+    for item in items:
+        item["_id"] = str(item["_id"])
+        item.pop("report_date", None)
+
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def get_full_report_list(auth_userid):
+    reports_data_res = report_data.find(reports_by_user_filter(auth_userid))
+    # Encoded document by document straight off the cursor; ObjectIds become strings on the way
+    return stream_json_array(reference_text.attach_stream(timed_cursor(reports_data_res, "reports_full")))
+
+
+def body_response(kind, etag, body, if_none_match):
+    # no-cache: browsers keep the body but revalidate with If-None-Match every time
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            response_cache.record_not_modified(kind)
+            return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def cached_json(kind, auth_userid, key, if_none_match, build):
+    """
+    Serve a read endpoint from the response cache. On a miss `build()` runs
+    and its JSON body is stored with an ETag; a matching If-None-Match gets
+    a bodiless 304 whether or not the entry was cached.
+    """
+    cache_key, cached = await response_cache.get(kind, auth_userid, key)
+    if cached is None:
+        body = dumps(await build())
+        etag = await response_cache.set(cache_key, body)
     else:
-        return obj
+        etag, body = cached
+    return body_response(kind, etag, body, if_none_match)
 
 
-@app.get("/reports/{auth_userid}")
-async def get_all_reports(auth_userid: str):
-    reports_data_res = report_data.find({"auth_userid": auth_userid})
-    print(reports_data_res)  # This will just print a cursor object, not the actual data
-    reports = []
-    async for report in reports_data_res:
-        report["_id"] = str(report["_id"])  # convert ObjectId to string
-        reports.append(report)
+async def cached_stream(kind, auth_userid, key, if_none_match, stream):
+    """
+    Like cached_json, for bodies produced as a stream of chunks. A miss is
+    streamed to the client as it is encoded (so it carries no ETag) and
+    cached afterwards unless it outgrew the cache's entry size limit.
+    """
+    cache_key, cached = await response_cache.get(kind, auth_userid, key)
+    if cached is not None:
+        return body_response(kind, *cached, if_none_match)
 
-    return reports
+    async def tee():
+        parts, size = [], 0
+        async for chunk in stream():
+            if parts is not None:
+                size += len(chunk)
+                if size <= response_cache.max_entry_bytes:
+                    parts.append(chunk)
+                else:
+                    parts = None
+            yield chunk
+        if parts is not None:
+            await response_cache.set(cache_key, b"".join(parts))
+
+    return StreamingResponse(tee(), media_type="application/json",
+                             headers={"Cache-Control": "private, no-cache"})
 
-# POST route with request body
-@app.post("/extract/")
-async def process_pdf(
-    userId: str = Form(...),
-    title: str = Form(...),
-    notes: str = Form(...),
-    file: UploadFile = File(...)
-):
-    try:
-        # Validate file type
-        if not file.filename.endswith(".pdf"):
-            return {"error": "Only PDF files are allowed"}
 
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
+async def reports_changed(documents):
+    # New or removed reports change every cached read of their owner
+    for auth_userid in {document.get("auth_userid") for document in documents}:
+        await response_cache.invalidate(auth_userid)
 
-        # Save the uploaded file to disk
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
 
-        # Extract PDF content
-        print("🔍 Extracting PDF...")
-        extract_pdf_response = extract_pdf(file_path)
-        print(f"PDF extraction result: {type(extract_pdf_response)}")
-        
+async def documents_written(documents):
+    # After each group commit of the report writer
+    await write_series(documents)
+    await reports_changed(documents)
+
+
+@app.get("/reports/{auth_userid}")
+async def get_all_reports(
+    auth_userid: str,
+    view: str = Query("full", pattern="^(full|summary)$"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None)
+):
+    # ?view=summary: paginated, projected listing for the reports page
+    if view == "summary":
+        return await cached_json(
+            "reports", auth_userid, f"summary:{limit}:{cursor or ''}", if_none_match,
+            lambda: get_report_summaries(auth_userid, limit, cursor)
+        )
+
+    return await cached_stream("reports", auth_userid, "full", if_none_match,
+                               lambda: get_full_report_list(auth_userid))
+
+async def run_extraction_pipeline(file_path, digest, persister=None):
+    """
+    PDF -> extracted document -> LLM -> parsed JSON for one uploaded file.
+    Returns {"res_json": ..., "raw": ...} on success or {"error": ...}.
+    Results are cached by the SHA-256 of the file, so a re-upload of the same
+    PDF skips both extraction and the LLM call.
+    With LLM_STREAM enabled and a persister given, test categories are
+    persisted while the answer is still streaming in.
+    """
+    cached = await extraction_cache.get_llm_result(digest, LLM_MODEL, prompt_cache_version())
+    if cached is not None:
+        log.info("Extraction cache hit, skipping extraction and LLM")
+        return cached
+
+    extract_pdf_response = await extraction_cache.get_extraction(digest)
+    if extract_pdf_response is None:
+        # Extract PDF content (off the event loop, in the extraction pool)
+        await report_stage("extracting")
+        log.info("Extracting PDF")
+        source = upload_source(file_path)
+        if source is None:
+            return {"error": "Uploaded file lost before processing"}
+        with STAGE_SECONDS.time("extract_pdf"):
+            extract_pdf_response = await extraction_pool.submit(extract_pdf, source)
+
         if not extract_pdf_response:
             return {"error": "Failed to extract content from PDF"}
 
-        # Get LLM response
-        print("🤖 Calling LLM...")
-        resp_from_llm = await fetch_pdf_extracted_data(extract_pdf_response)
-        print(f"LLM response type: {type(resp_from_llm)}")
-        
-        if not resp_from_llm:
-            return {"error": "Failed to get response from LLM"}
+        # extract_pdf reports unreadable files as an error string
+        if extract_pdf_response.startswith("Error reading PDF"):
+            return {"error": extract_pdf_response}
 
-        # Parse LLM response JSON
-        try:
+        await extraction_cache.set_extraction(digest, extract_pdf_response)
+
+    await report_stage("llm")
+
+    # Long documents go to the LLM in concurrent page chunks
+    doc = json.loads(extract_pdf_response)
+    if should_chunk(doc):
+        result = await run_chunked_llm_stage(doc)
+    elif LLM_STREAM and persister is not None:
+        result = await run_streaming_llm_stage(format_prompt(doc), persister)
+    else:
+        result = await run_llm_stage(format_prompt(doc))
+
+    if "error" in result:
+        return result
+
+    await extraction_cache.set_llm_result(digest, LLM_MODEL, prompt_cache_version(), result)
+    return result
+
+
+async def run_llm_stage(pdf_contents):
+    # Get LLM response
+    log.info("Calling LLM", extra={"prompt_chars": len(pdf_contents)})
+    with STAGE_SECONDS.time("fetch_pdf_extracted_data"):
+        resp_from_llm = await fetch_pdf_extracted_data(pdf_contents)
+
+    if not resp_from_llm:
+        return {"error": "Failed to get response from LLM"}
+
+    await report_stage("parsing")
+    return parse_llm_response(resp_from_llm)
+
+
+async def run_streaming_llm_stage(pdf_contents, persister):
+    """
+    Stream the LLM answer and parse it as it arrives, handing every finished
+    test category to the persister straight away. Skips the envelope
+    dump/load and the markdown pass of the blocking path.
+    """
+    log.info("Streaming LLM response", extra={"prompt_chars": len(pdf_contents)})
+    parser = ReportStreamParser()
+    started = time.perf_counter()
+    try:
+        async for delta in stream_pdf_extracted_data(pdf_contents):
+            for kind, name, value in parser.feed(delta):
+                # Validated like the blocking path's answer before anything is stored
+                if kind == "category":
+                    try:
+                        value = parse_category(value)
+                    except ValidationError as e:
+                        log.warning("Dropping invalid part of LLM answer",
+                                    extra={"part": "test category", "key": name, "error": describe_errors(e)})
+                        continue
+                    await persister.add_category(name, value)
+                else:
+                    await persister.add_section(name, parse_section(name, value))
+            if parser.done:
+                break
+    except (httpx.HTTPError, json.JSONDecodeError) as e:
+        await persister.rollback()
+        return {"error": f"LLM streaming failed: {str(e)}"}
+    except ValidationError as e:
+        await persister.rollback()
+        return {"error": f"Invalid report JSON from LLM: {describe_errors(e)}"}
+    except BaseException:
+        # A failed write, a crash or a cancellation: take back what was stored
+        await persister.rollback_quietly()
+        raise
+
+    # Includes persisting the categories that completed along the way
+    STAGE_SECONDS.observe(time.perf_counter() - started, "stream_pdf_extracted_data")
+
+    if not parser.done:
+        await persister.rollback()
+        return {"error": "Incomplete JSON in streamed LLM response"}
+
+    try:
+        with STAGE_SECONDS.time("validate_report"):
+            res_json = parse_report(parser.text())
+    except ValidationError as e:
+        await persister.rollback()
+        return {"error": f"Invalid report JSON from LLM: {describe_errors(e)}"}
+
+    return {"res_json": res_json, "raw": [{"type": "code", "lang": "json", "content": parser.text()}]}
+
+
+async def run_chunked_llm_stage(doc):
+    """
+    Send the document to the LLM a few pages at a time, concurrently, and
+    merge the per-chunk answers. Any failed chunk fails the whole upload so we
+    never persist a report with silently missing pages.
+    """
+    chunks = split_document(doc)
+    log.info("Splitting document into LLM chunks", extra={"pages": len(doc["pages"]), "chunks": len(chunks)})
+    semaphore = asyncio.Semaphore(LLM_CHUNK_CONCURRENCY)
+
+    async def run_chunk(chunk):
+        async with semaphore:
+            return await run_llm_stage(format_prompt(chunk))
+
+    results = await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
+
+    for index, result in enumerate(results):
+        if "error" in result:
+            return {**result, "chunk": index}
+
+    return {
+        "res_json": merge_chunk_results([result["res_json"] for result in results]),
+        "raw": [block for result in results for block in result["raw"]]
+    }
+
+
+def parse_llm_response(resp_from_llm):
+    """
+    Completion envelope -> report JSON.
+    Returns {"res_json": ..., "raw": ...} on success or {"error": ...}.
+    With LLM_RESPONSE_FORMAT set the answer is the report JSON itself and is
+    validated into the report models in one parse; a ```json fenced answer
+    is cut out of the text first, and anything else goes through the
+    markdown parser.
+    """
+    # Parse LLM response JSON
+    try:
+        with STAGE_SECONDS.time("json_decode"):
             resp_json = json.loads(resp_from_llm)
-            print("✅ LLM response parsed successfully")
-        except json.JSONDecodeError as e:
-            print(f"❌ Failed to parse LLM response as JSON: {e}")
-            return {"error": "Invalid JSON response from LLM"}
-
-        # Extract choices content
-        if 'choices' not in resp_json or not resp_json['choices']:
-            return {"error": "No choices found in LLM response"}
-        
-        choices = resp_json['choices'][0]['message']['content']
-        print(f"📝 Choices content preview: {choices[:200] if choices else 'Empty'}...")
-        
-        if not choices or not choices.strip():
-            return {"error": "Empty content from LLM"}
-
-        # Parse markdown
-        print("📄 Parsing markdown...")
+    except json.JSONDecodeError as e:
+        log.warning("LLM response is not JSON", extra={"error": str(e)})
+        return {"error": "Invalid JSON response from LLM"}
+
+    record_llm_usage(resp_json.get("usage") if isinstance(resp_json, dict) else None)
+
+    # Extract choices content
+    if 'choices' not in resp_json or not resp_json['choices']:
+        return {"error": "No choices found in LLM response"}
+
+    choices = resp_json['choices'][0]['message']['content']
+    if not choices or not choices.strip():
+        return {"error": "Empty content from LLM"}
+    log_payload(log, "LLM answer", choices)
+
+    # Direct path: JSON mode / schema answers are the report object itself
+    if choices.lstrip().startswith("{"):
+        return validate_report_content(choices, [{"type": "code", "lang": "json", "content": choices}])
+
+    # A fenced reply, taken out with one regex search rather than a markdown parse
+    fenced = find_json_fence(choices)
+    if fenced is not None:
+        return validate_report_content(fenced, [{"type": "code", "lang": "json", "content": fenced}])
+
+    # Fallback for anything else
+    with STAGE_SECONDS.time("parse_markdown"):
         parsed_blocks = parse_markdown(choices)
-        print(f"Parsed blocks type: {type(parsed_blocks)}")
-        print(f"Number of blocks: {len(parsed_blocks) if parsed_blocks else 0}")
-        
-        # Debug: Print the structure of parsed_blocks
-        if parsed_blocks:
-            for i, block in enumerate(parsed_blocks):
-                print(f"Block {i}: {type(block)} - Keys: {block.keys() if isinstance(block, dict) else 'Not a dict'}")
-                if isinstance(block, dict) and 'content' in block:
-                    content_preview = block['content'][:100] if block['content'] else 'Empty'
-                    print(f"  Content preview: {repr(content_preview)}")
-
-        # Validate parsed blocks
-        if not parsed_blocks or len(parsed_blocks) == 0:
-            return {"error": "No blocks parsed from markdown"}
-        
-        if not isinstance(parsed_blocks[0], dict) or 'content' not in parsed_blocks[0]:
-            return {"error": "Invalid structure in parsed blocks"}
-        
-        # Get and validate JSON content
-        json_content = parsed_blocks[0]['content']
-        if not json_content or not json_content.strip():
-            return {"error": "Empty JSON content in first parsed block"}
-        
-        print(f"🔍 JSON content to parse: {repr(json_content[:200])}")
-        
-        # Parse the final JSON
+    log_payload(log, "Parsed markdown blocks", parsed_blocks, blocks=len(parsed_blocks) if parsed_blocks else 0)
+
+    # Validate parsed blocks
+    if not parsed_blocks or len(parsed_blocks) == 0:
+        return {"error": "No blocks parsed from markdown"}
+
+    # The fenced block, even when the model wrote a sentence before it
+    json_block = next((block for block in parsed_blocks
+                       if isinstance(block, dict) and block.get("type") == "code"), parsed_blocks[0])
+    if not isinstance(json_block, dict) or 'content' not in json_block:
+        return {"error": "Invalid structure in parsed blocks"}
+
+    # Get and validate JSON content
+    json_content = json_block['content']
+    if not json_content or not json_content.strip():
+        return {"error": "Empty JSON content in first parsed block"}
+
+    return validate_report_content(json_content, parsed_blocks)
+
+
+def validate_report_content(json_content, raw):
+    try:
+        with STAGE_SECONDS.time("validate_report"):
+            res_json = parse_report(json_content)
+    except ValidationError as e:
+        # Rare, so logged every time rather than sampled
+        log.warning("LLM answer does not match the report schema",
+                    extra={"error": describe_errors(e), "content": json_content[:LOG_PAYLOAD_MAX_CHARS]})
+        return {"error": f"Invalid report JSON from LLM: {describe_errors(e)}"}
+
+    return {"res_json": res_json, "raw": raw}
+
+
+def build_report_documents(res_json, userId, db_userid):
+    # One report_data document per test category
+    reports_to_insert = []
+    for key, value in res_json['test_categories'].items():
+        if not isinstance(value, dict):
+            log.warning("Skipping test category that is not an object",
+                        extra={"category": key, "type": type(value).__name__})
+            continue
+
+        value["auth_userid"] = userId
+        value["db_userid"] = db_userid
+        value["report_metadata"] = res_json.get('report_metadata', {})
+        # Sortable copy of the printed report date, used for listing order
+        value["report_date"] = normalize_report_date(value["report_metadata"].get("report_date"))
+        # Typed value, comparator and canonical unit next to each raw value
+        normalize_tests(value)
+        reports_to_insert.append(reference_text.storage_copy(value))
+
+    return reports_to_insert
+
+
+class StreamingPersister:
+    """
+    Persists test categories one by one while the LLM answer streams in.
+    Categories are held back until both patient_details (for db_userid) and
+    report_metadata have arrived, then written as soon as each completes.
+    """
+
+    def __init__(self, userId):
+        self.userId = userId
+        self.used = False
+        self.db_userid = None
+        self.created_patient = False
+        self.report_metadata = None
+        self.pending = {}
+        self.inserted_ids = []
+
+    async def add_section(self, name, value):
+        self.used = True
+        if name == "patient_details" and self.db_userid is None:
+            self.db_userid, self.created_patient = await save_patient({"patient_details": value}, self.userId)
+        elif name == "report_metadata":
+            self.report_metadata = value
+        await self._flush()
+
+    async def add_category(self, name, value):
+        self.used = True
+        self.pending[name] = value
+        await self._flush()
+
+    async def _flush(self):
+        if self.db_userid is None or self.report_metadata is None or not self.pending:
+            return
+        documents = build_report_documents(
+            {"test_categories": self.pending, "report_metadata": self.report_metadata},
+            self.userId, self.db_userid
+        )
+        self.pending = {}
+        if documents:
+            # Ids up front, so a rollback after a partly failed insert finds them all
+            for document in documents:
+                document.setdefault("_id", ObjectId())
+            self.inserted_ids.extend(document["_id"] for document in documents)
+            with STAGE_SECONDS.time("insert_report_data"):
+                await reference_text.store(documents)
+                await report_data.insert_many(documents)
+            await write_series(documents)
+            await reports_changed(documents)
+
+    async def finish(self, res_json):
+        # Whatever the stream did not let us write yet (missing sections)
+        if self.db_userid is None:
+            self.db_userid, self.created_patient = await save_patient(res_json, self.userId)
+        if self.report_metadata is None:
+            self.report_metadata = res_json.get('report_metadata', {})
+        await self._flush()
+        log.info("Streamed reports into the database", extra={"reports": len(self.inserted_ids)})
+
+    async def rollback_quietly(self):
+        # For error paths that re-raise: a rollback failure must not mask the original error
         try:
-            res_json = json.loads(json_content.strip())
-            print("✅ Final JSON parsed successfully")
-            print(f"JSON keys: {res_json.keys() if isinstance(res_json, dict) else 'Not a dict'}")
-        except json.JSONDecodeError as e:
-            print(f"❌ Failed to parse final JSON: {e}")
-            print(f"Problematic content: {repr(json_content)}")
-            return {"error": f"Invalid JSON in parsed content: {str(e)}"}
-
-        # Validate required structure
-        if not isinstance(res_json, dict):
-            return {"error": "Expected JSON object from parsed content"}
-        
-        if 'test_categories' not in res_json:
-            return {"error": "Missing 'test_categories' in parsed JSON", "available_keys": list(res_json.keys())}
-
-        # Insert user data
-        print("💾 Inserting user data...")
-        res_from_db = await insert_user_data(res_json)
-
-        # Prepare reports data
-        reports_to_insert = []
-        for key, value in res_json['test_categories'].items():
-            if not isinstance(value, dict):
-                print(f"⚠️ Warning: test_category '{key}' is not a dict: {type(value)}")
-                continue
-                
-            value["auth_userid"] = userId
-            value["db_userid"] = res_from_db
-            value["report_metadata"] = res_json.get('report_metadata', {})
-            reports_to_insert.append(value)
-
-        print(f"📊 Prepared {len(reports_to_insert)} reports for insertion")
-
-        # Uncomment when ready to insert reports
-        if reports_to_insert:
-            result = await insert_report_data(reports_to_insert)
-            print(f"Reports insertion result: {result}")
-
-        # Prepare response
-        response = {
-            "title": title, 
-            "notes": notes, 
-            "reports_data": res_json, 
-            "raw": parsed_blocks
-        }
-        cleaned_response = convert_object_ids(response)
-        
-        return {
-            "response": cleaned_response,
-            "user": res_from_db
-        }
+            await asyncio.shield(self.rollback())
+        except BaseException as e:
+            log.warning("Rollback of streamed reports failed", extra={"error": str(e)})
 
+    async def rollback(self):
+        # A failed stream must not leave half a report behind
+        if self.inserted_ids:
+            await report_data.delete_many({"_id": {"$in": self.inserted_ids}})
+            await delete_series(self.inserted_ids)
+            await response_cache.invalidate(self.userId)
+        # Only a patient this upload created; an existing one has other reports
+        if self.db_userid is not None and self.created_patient:
+            await users.delete_one({"_id": ObjectId(self.db_userid)})
+        self.inserted_ids = []
+        self.db_userid = None
+        self.created_patient = False
+
+
+# Read at scrape time, nothing to update on the hot path
+registry.register(Gauge("healthtrack_jobs_queued", "Upload jobs waiting for a worker.",
+                        lambda: job_queue.queued))
+registry.register(Gauge("healthtrack_jobs_running", "Upload jobs being processed.",
+                        lambda: job_queue.running))
+registry.register(Gauge("healthtrack_extractions_pending", "PDF extractions running or queued in the pool.",
+                        lambda: extraction_pool.pending))
+
+
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return {**extraction_cache.stats, "responses": response_cache.summary(), "reference_text": reference_text.stats()}
+
+
+async def persist_results(res_json, userId, persister):
+    """Write the user and one report per test category; returns the db_userid."""
+    await report_stage("persisting")
+
+    if persister.used:
+        # Categories were already written while the LLM answer streamed in
+        try:
+            await persister.finish(res_json)
+        except BaseException:
+            await persister.rollback_quietly()
+            raise
+        return persister.db_userid
+
+    # Patient and reports go in with the writes of other uploads finishing now
+    res_from_db, report_ids = await report_writer.write(
+        res_json.get('patient_details'), userId,
+        lambda db_userid: build_report_documents(res_json, userId, db_userid)
+    )
+    log.info("Saved reports", extra={"reports": len(report_ids)})
+
+    return res_from_db
+
+
+async def run_pipeline_with_retry(file_path, digest, persister=None):
+    while True:
+        try:
+            return await run_extraction_pipeline(file_path, digest, persister)
+        except ExtractionQueueFull as e:
+            # The job is already accepted, so wait for a free extractor instead of failing
+            await asyncio.sleep(e.retry_after)
+
+
+async def run_upload_job(job):
+    """Job handler: everything /extract/ used to do inside the request."""
+    persister = StreamingPersister(job["userId"])
+    pipeline_result = await run_pipeline_with_retry(job["file_path"], job["digest"], persister)
+
+    if "error" in pipeline_result:
+        return pipeline_result
+
+    res_json = pipeline_result["res_json"]
+    res_from_db = await persist_results(res_json, job["userId"], persister)
+
+    # Prepare response
+    response = {
+        "title": job["title"],
+        "notes": job["notes"],
+        "reports_data": res_json,
+        "raw": pipeline_result["raw"]
+    }
+    # Job results are stored as plain JSON (ObjectIds become strings)
+    cleaned_response = to_jsonable(response)
+
+    return {
+        "response": cleaned_response,
+        "user": res_from_db
+    }
+
+
+async def run_batch_job(job):
+    """
+    Job handler for /extract/batch/. Files go through the pipeline
+    concurrently (at most BATCH_CONCURRENCY at a time); every successful
+    file's user and reports are then written with one insert_many each.
+    A failed file is reported in its own entry and does not stop the batch.
+    """
+    started = time.perf_counter()
+    entries = job["files"]
+    results = [{"filename": entry["filename"], "status": "pending", "error": None, "reports": 0, "user": None}
+               for entry in entries]
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    processed = 0
+
+    await report_stage("extracting", processed=0, total=len(entries))
+
+    async def process_one(index, entry):
+        nonlocal processed
+        silence_stage_reports()
+        async with semaphore:
+            try:
+                pipeline_result = await run_pipeline_with_retry(entry["file_path"], entry["digest"])
+            except Exception as e:
+                pipeline_result = {"error": f"Internal server error: {str(e)}"}
+        if "error" in pipeline_result:
+            results[index].update(status="failed", error=pipeline_result["error"])
+        processed += 1
+        return pipeline_result
+
+    pipeline_results = await asyncio.gather(*(process_one(i, entry) for i, entry in enumerate(entries)))
+    await report_stage("persisting", processed=processed, total=len(entries))
+
+    succeeded = [i for i, result in enumerate(pipeline_results) if "error" not in result]
+    if succeeded:
+        # A few round-trips for all patients...
+        patients = [pipeline_results[i]["res_json"].get("patient_details", {}) for i in succeeded]
+        user_ids = {}
+        try:
+            with STAGE_SECONDS.time("upsert_patient"):
+                user_ids = dict(zip(succeeded, await upsert_patients(patients, [job["userId"]] * len(patients))))
+        except PyMongoError as e:
+            log.warning("Failed to save patient details", extra={"error": str(e)})
+            for index in succeeded:
+                results[index].update(status="failed", error="Failed to save patient details")
+
+        # ...and one for every report of every file
+        documents, owners = [], []
+        for index, db_userid in user_ids.items():
+            file_documents = build_report_documents(
+                pipeline_results[index]["res_json"], job["userId"], str(db_userid)
+            )
+            documents.extend(file_documents)
+            owners.extend([index] * len(file_documents))
+            results[index].update(status="done", user=str(db_userid), reports=len(file_documents))
+
+        if documents:
+            try:
+                await reference_text.store(documents)
+            except PyMongoError as e:
+                # Without their shared text the reports would come back incomplete
+                log.warning("Failed to save reference text", extra={"error": str(e)})
+                for index in set(owners):
+                    results[index].update(status="failed", error="Failed to save reports")
+                documents = []
+
+        if documents:
+            failed_positions = set()
+            try:
+                with STAGE_SECONDS.time("insert_report_data"):
+                    await report_data.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    failed_positions.add(error["index"])
+                    index = owners[error["index"]]
+                    results[index].update(status="failed", error="Failed to save reports")
+            await write_series([document for position, document in enumerate(documents)
+                                if position not in failed_positions])
+            await reports_changed(documents)
+
+    elapsed = time.perf_counter() - started
+    done = sum(1 for result in results if result["status"] == "done")
+    return {
+        "files": results,
+        "succeeded": done,
+        "failed": len(results) - done,
+        "elapsed_seconds": round(elapsed, 2),
+        "files_per_minute": round(len(results) / elapsed * 60, 2) if elapsed else None
+    }
+
+
+async def run_job(job):
+    if job.get("kind") == "batch":
+        return await run_batch_job(job)
+    return await run_upload_job(job)
+
+
+def job_status(job):
+    return {
+        "job_id": job["_id"],
+        "status": job["status"],
+        "version": job.get("version", 0),
+        "filename": job.get("filename"),
+        "error": job.get("error"),
+        "processed": job.get("processed"),
+        "total": job.get("total"),
+        "result": job.get("result"),
+        "created_at": job.get("created_at"),
+        "updated_at": job.get("updated_at")
+    }
+
+
+# POST route with request body
+@app.post("/extract/")
+async def process_pdf(
+    userId: str = Form(...),
+    title: str = Form(...),
+    notes: str = Form(...),
+    file: UploadFile = File(...)
+):
+    """
+    Accepts the upload and returns a job id straight away. Processing happens
+    in the background; follow it with GET /jobs/{job_id} or the SSE stream at
+    /jobs/{job_id}/events.
+    """
+    # Validate file type
+    if not file.filename.endswith(".pdf"):
+        return {"error": "Only PDF files are allowed"}
+
+    file_path = None
+    try:
+        file_path, digest = save_upload(file.file)
+
+        job = await job_queue.submit(
+            userId=userId, title=title, notes=notes, filename=file.filename,
+            file_path=file_path, digest=digest
+        )
+    except UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": f"File too large, the limit is {e.limit} bytes"})
+    except JobQueueFull as e:
+        remove_uploads([file_path])
+        return JSONResponse(
+            status_code=503,
+            content={"error": "Too many uploads in progress, please retry shortly"},
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
-        print(f"🚨 Unexpected error in process_pdf: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Unexpected error in process_pdf")
+        remove_uploads([file_path])
         return {"error": f"Internal server error: {str(e)}"}
 
-    finally:
-        # Clean up uploaded file
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                print(f"🗑️ Cleaned up temporary file: {file_path}")
-        except Exception as e:
-            print(f"⚠️ Failed to clean up file {file_path}: {e}")
+    return JSONResponse(status_code=202, content=job_status(job))
 
 
-@app.get("/report-detail/{id}")
-async def get_report_detail_and_values(
-    id: str,
-    auth_userid: str = Query(...),
-    # db_userid: str = Query(...)
+@app.post("/extract/batch/")
+async def process_pdf_batch(
+    userId: str = Form(...),
+    title: str = Form(...),
+    notes: str = Form(...),
+    files: List[UploadFile] = File(...)
 ):
+    """
+    Back-fill endpoint: any number of PDFs, or zip archives of PDFs, in one
+    request. Returns a job id; the job result lists the outcome per file and
+    the batch throughput.
+    """
+    saved = []
+    try:
+        for upload in files:
+            name = upload.filename or ""
+            if name.lower().endswith(".pdf"):
+                file_path, digest = save_upload(upload.file)
+                saved.append({"filename": name, "file_path": file_path, "digest": digest})
+            elif name.lower().endswith(".zip"):
+                with zipfile.ZipFile(upload.file) as archive:
+                    for member in archive.infolist():
+                        if member.is_dir() or not member.filename.lower().endswith(".pdf"):
+                            continue
+                        with archive.open(member) as member_file:
+                            file_path, digest = save_upload(member_file)
+                        saved.append({"filename": f"{name}/{member.filename}", "file_path": file_path,
+                                      "digest": digest})
+            else:
+                remove_uploads([entry["file_path"] for entry in saved])
+                return {"error": f"Only PDF or zip files are allowed: {name}"}
+
+            if len(saved) > BATCH_MAX_FILES:
+                remove_uploads([entry["file_path"] for entry in saved])
+                return JSONResponse(status_code=413,
+                                    content={"error": f"At most {BATCH_MAX_FILES} PDFs per batch"})
+
+        if not saved:
+            return {"error": "No PDF files found in the upload"}
+
+        job = await job_queue.submit(kind="batch", userId=userId, title=title, notes=notes, files=saved)
+    except JobQueueFull as e:
+        remove_uploads([entry["file_path"] for entry in saved])
+        return JSONResponse(
+            status_code=503,
+            content={"error": "Too many uploads in progress, please retry shortly"},
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except zipfile.BadZipFile as e:
+        remove_uploads([entry["file_path"] for entry in saved])
+        return {"error": f"Invalid zip archive: {str(e)}"}
+    except UploadTooLarge as e:
+        remove_uploads([entry["file_path"] for entry in saved])
+        return JSONResponse(status_code=413,
+                            content={"error": f"File too large, the limit is {e.limit} bytes per PDF"})
+
+    return JSONResponse(status_code=202, content=job_status(job))
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=60),
+    version: int = Query(-1)
+):
+    """
+    Job status. With `wait`, long-polls: returns as soon as the job has moved
+    past `version` (or finished), or after `wait` seconds.
+    """
+    if wait:
+        job = await job_queue.wait_for_change(job_id, version, wait)
+    else:
+        job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Server-sent events: one message per stage change, closed when the job finishes."""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        current = job
+        while True:
+            yield f"data: {json.dumps(job_status(current), default=str)}\n\n"
+            if current["status"] in JOB_FINISHED:
+                return
+            version = current.get("version", 0)
+            while current is not None and current.get("version", 0) == version \
+                    and current["status"] not in JOB_FINISHED:
+                current = await job_queue.wait_for_change(job_id, version, 15)
+                if current is not None and current.get("version", 0) == version:
+                    yield ": keep-alive\n\n"
+            if current is None:
+                return
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+async def get_report_detail(id, auth_userid):
     # Step 1: Get the report by ID (only used for 'data' in the response)
     try:
         object_id = ObjectId(id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid report ID")
 
-    report = await report_data.find_one({"_id": object_id})
+    with MONGO_QUERY_SECONDS.time("report_by_id"):
+        report = await report_data.find_one({"_id": object_id})
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
+    await reference_text.attach([report])
 
     report["_id"] = str(report["_id"])  # for JSON serialization
 
@@ -251,39 +915,47 @@ async def get_report_detail_and_values(
             "parameter_values": {}
         }
 
-    # Step 3: Fetch historical values for those tags using auth_userid and db_userid
-    pipeline = [
-        {
-            "$match": {
-                "auth_userid": auth_userid,
-                # "db_userid": db_userid
-            }
-        },
-        { "$unwind": "$tests" },
-        {
-            "$match": {
-                "tests.parameter_tag": { "$in": tag_list }
-            }
-        },
-        {
-            "$project": {
-                "_id": 0,
-                "parameter_tag": "$tests.parameter_tag",
-                "value": "$tests.value",
-                "report_date": "$report_metadata.report_date"
-            }
-        }
-    ]
-
-    cursor = report_data.aggregate(pipeline)
-    result_map = defaultdict(list)
-
-    async for doc in cursor:
-        tag = doc.pop("parameter_tag")
-        result_map[tag].append(doc)
+    # Step 3: Fetch historical values for those tags from the per-parameter series.
+    # A report stored before the catalog (not remapped yet) has the LLM's tags,
+    # while backfilled series have catalog tags: both count, under the report's tag
+    catalog_tags = {}
+    for test in tests:
+        if test.get("parameter_tag"):
+            canonical = parameter_catalog.canonical_tag(test["parameter_tag"], test.get("parameter_name"),
+                                                        canonical_unit(test.get("unit"))[0])
+            if canonical and canonical != test["parameter_tag"]:
+                catalog_tags.setdefault(canonical, test["parameter_tag"])
+    result_map = await get_parameter_series(auth_userid, tag_list, catalog_tags)
 
     return {
         "message": "Report found and parameter values fetched successfully.",
         "data": report,
         "parameter_values": result_map
-    }
\ No newline at end of file
+    }
+
+
+@app.get("/report-detail/{id}")
+async def get_report_detail_and_values(
+    id: str,
+    auth_userid: str = Query(...),
+    # db_userid: str = Query(...)
+    if_none_match: Optional[str] = Header(None)
+):
+    # parameter_values span all of the user's reports, so any new report
+    # for auth_userid invalidates this too
+    return await cached_json("report_detail", auth_userid, id, if_none_match,
+                             lambda: get_report_detail(id, auth_userid))
+
+
+@app.get("/trends/{auth_userid}")
+async def get_parameter_trends(
+    auth_userid: str,
+    tags: Optional[List[str]] = Query(None),
+    bucket: Optional[str] = Query(None, pattern="^(" + "|".join(TREND_BUCKETS) + ")$")
+):
+    # Statistics per parameter_tag over every numeric value the user has;
+    # ?tags= narrows it down (synonyms accepted), ?bucket= downsamples the returned points
+    if tags:
+        tags = [parameter_catalog.canonical_tag(tag) or tag for tag in tags]
+    points = await get_trend_points(auth_userid, tags)
+    return {"trends": compute_trends(points, bucket)}
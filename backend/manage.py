@@ -0,0 +1,313 @@
+"""
+Maintenance commands, run from the backend directory:
+
+    python manage.py backfill-report-dates
+    python manage.py normalize-test-values
+    python manage.py backfill-parameter-series
+    python manage.py ensure-indexes
+    python manage.py check-indexes [--skip-unavailable]
+    python manage.py compact-patients [--dry-run]
+    python manage.py remap-parameter-tags [--dry-run]
+    python manage.py share-test-text [--dry-run]
+
+check-indexes is the CI gate for index regressions: run ensure-indexes and
+then check-indexes against a scratch mongod, and the job fails (exit status
+1) when a production query shape would be a COLLSCAN. With
+--skip-unavailable it passes with a note when no mongod can be reached.
+"""
+from pymongo import UpdateOne, UpdateMany
+from pymongo.errors import ConnectionFailure
+from db import client, report_data, parameter_series, users
+from patients import patient_match_key, filled_fields
+from normalize import normalize_report_date, normalize_tests, normalize_test
+from indexes import ensure_indexes, explain_query_shapes
+from series import series_points
+from reference_text import ReferenceText
+from collections import Counter
+import argparse
+import bson
+import sys
+
+BATCH_SIZE = 1000
+
+
+async def backfill_report_dates(args):
+    # Reports stored before report_date existed are invisible to the summary
+    # listing; ones stored before partial dates were rejected may carry a
+    # date completed from their ingest day. Only changed values are written
+    cursor = report_data.find({}, {"report_date": 1, "report_metadata.report_date": 1})
+    updated = 0
+    batch = []
+    async for doc in cursor:
+        report_date = normalize_report_date((doc.get("report_metadata") or {}).get("report_date"))
+        if doc.get("report_date") == report_date:
+            continue
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"report_date": report_date}}))
+        if len(batch) >= BATCH_SIZE:
+            await report_data.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await report_data.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    print(f"Backfilled report_date on {updated} reports")
+
+
+async def normalize_test_values(args):
+    # Reports stored before ingest-time normalization only have the raw strings
+    cursor = report_data.find(
+        {"tests": {"$elemMatch": {"value_num": {"$exists": False}}}},
+        {"tests": 1}
+    )
+    updated = 0
+    batch = []
+    async for doc in cursor:
+        normalize_tests(doc)
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"tests": doc["tests"]}}))
+        if len(batch) >= BATCH_SIZE:
+            await report_data.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await report_data.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    print(f"Normalized test values on {updated} reports")
+
+
+async def backfill_parameter_series(args):
+    # Rebuild every report's trend points; safe to re-run, each batch
+    # replaces whatever points its reports already had
+    cursor = report_data.find({}, {
+        "auth_userid": 1, "report_date": 1, "report_metadata.report_date": 1,
+        "tests.parameter_tag": 1, "tests.value": 1, "tests.unit": 1,
+        "tests.reference_range": 1, "tests.status": 1
+    })
+    reports = 0
+    points = 0
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= BATCH_SIZE:
+            points += await rewrite_series(batch)
+            reports += len(batch)
+            batch = []
+    if batch:
+        points += await rewrite_series(batch)
+        reports += len(batch)
+    print(f"Wrote {points} parameter series points for {reports} reports")
+
+
+async def rewrite_series(batch):
+    # Replace whatever trend points the batch's reports already had
+    await parameter_series.delete_many({"report_id": {"$in": [doc["_id"] for doc in batch]}})
+    batch_points = series_points(batch)
+    if batch_points:
+        await parameter_series.insert_many(batch_points, ordered=False)
+    return len(batch_points)
+
+
+async def remap_parameter_tags(args):
+    """
+    Map the tests of stored reports to the current parameter catalog:
+    parameter_tag from the LLM's tag (parameter_tag_raw, or parameter_tag
+    for reports stored before the catalog) and values in the catalog unit.
+    Reports that change get their trend points rebuilt. Safe to re-run,
+    e.g. after adding synonyms to the catalog.
+    """
+    cursor = report_data.find({}, {
+        "auth_userid": 1, "report_date": 1, "report_metadata.report_date": 1, "tests": 1
+    })
+    remapped = Counter()
+    reports = 0
+    points = 0
+    batch = []
+    changed = []
+
+    async def write(batch, changed):
+        await report_data.bulk_write(batch, ordered=False)
+        return await rewrite_series(changed)
+
+    async for doc in cursor:
+        before = [(test.get("parameter_tag"), test.get("unit_canonical"), test.get("value_num"))
+                  for test in doc.get("tests") or [] if isinstance(test, dict)]
+        for test in doc.get("tests") or []:
+            if isinstance(test, dict):
+                tag = test.get("parameter_tag")
+                normalize_test(test)
+                if tag != test.get("parameter_tag"):
+                    remapped[(tag, test.get("parameter_tag"))] += 1
+        after = [(test.get("parameter_tag"), test.get("unit_canonical"), test.get("value_num"))
+                 for test in doc.get("tests") or [] if isinstance(test, dict)]
+        if before == after:
+            continue
+        reports += 1
+        if args.dry_run:
+            continue
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"tests": doc["tests"]}}))
+        changed.append(doc)
+        if len(batch) >= BATCH_SIZE:
+            points += await write(batch, changed)
+            batch, changed = [], []
+    if batch:
+        points += await write(batch, changed)
+
+    for (tag, canonical), count in remapped.most_common(20):
+        print(f"{tag} -> {canonical}: {count}")
+    if args.dry_run:
+        print(f"{sum(remapped.values())} tests would be remapped, {reports} reports would change")
+        return
+    print(f"Remapped {sum(remapped.values())} tests on {reports} reports, "
+          f"wrote {points} parameter series points")
+
+
+async def build_indexes(args):
+    await ensure_indexes()
+    print("Indexes are in place")
+
+
+async def check_indexes(args):
+    # Exit status 1 if any production query shape would scan a whole collection
+    try:
+        shapes = await explain_query_shapes()
+    except ConnectionFailure as e:
+        if not args.skip_unavailable:
+            raise
+        print(f"Skipped, no MongoDB server available: {e}")
+        return 0
+    failed = False
+    for name, stages in shapes:
+        scan = "COLLSCAN" in stages
+        failed = failed or scan
+        print(f"{'❌' if scan else '✅'} {name}: {' <- '.join(stages)}")
+    return 1 if failed else 0
+
+
+async def compact_patients(args):
+    """
+    Merge the users records of each patient (one per upload before identity
+    resolution) into one and point their reports' db_userid at it. Keys are
+    recomputed, so records keyed under an older normalization join the
+    patient's current record. The record that already has the current key
+    is kept, else the oldest, and it takes the latest non-empty value of
+    every field. Safe to re-run after an interruption: duplicates are only
+    deleted once no report points at them.
+    """
+    if not args.dry_run:
+        # db_userid index for the report rewrites, match_key index for the upserts
+        await ensure_indexes()
+
+    # Legacy records do not say which account uploaded them; their reports do
+    owners = {}
+    async for row in report_data.aggregate([{"$group": {"_id": "$db_userid", "auth_userid": {"$first": "$auth_userid"}}}],
+                                           allowDiskUse=True):
+        owners[row["_id"]] = row["auth_userid"]
+
+    patients = {}  # match key -> {"ids": [...], "keyed": _id already holding the key, "fields": {...}}
+    orphans = 0
+    async for user in users.find({}).sort("_id", 1):
+        auth_userid = user.get("auth_userid") or owners.get(str(user["_id"]))
+        key = patient_match_key(user, auth_userid) if auth_userid else user.get("match_key")
+        if key is None:
+            # No reports, or nothing to identify the patient by: left alone
+            orphans += 1
+            continue
+        patient = patients.setdefault(key, {"ids": [], "keyed": None, "fields": {}, "auth_userid": auth_userid})
+        patient["ids"].append(user["_id"])
+        if user.get("match_key") == key:
+            patient["keyed"] = user["_id"]
+        patient["fields"].update(filled_fields({name: value for name, value in user.items()
+                                                if name not in ("match_key", "auth_userid", "created_at")}))
+
+    keep_updates = []
+    repoints = []
+    duplicates = []
+    for key, patient in patients.items():
+        keep = patient["keyed"] or patient["ids"][0]
+        keep_updates.append(UpdateOne({"_id": keep}, {"$set": {
+            **patient["fields"], "match_key": key, "auth_userid": patient["auth_userid"]}}))
+        for duplicate in patient["ids"]:
+            if duplicate != keep:
+                duplicates.append(duplicate)
+                repoints.append(UpdateMany({"db_userid": str(duplicate)}, {"$set": {"db_userid": str(keep)}}))
+
+    print(f"{len(patients)} patients, {len(duplicates)} duplicate records, {orphans} records left alone")
+    if args.dry_run:
+        return
+
+    for start in range(0, len(keep_updates), BATCH_SIZE):
+        await users.bulk_write(keep_updates[start:start + BATCH_SIZE], ordered=False)
+    repointed = 0
+    for start in range(0, len(repoints), BATCH_SIZE):
+        result = await report_data.bulk_write(repoints[start:start + BATCH_SIZE], ordered=False)
+        repointed += result.modified_count
+    for start in range(0, len(duplicates), BATCH_SIZE):
+        await users.delete_many({"_id": {"$in": duplicates[start:start + BATCH_SIZE]}})
+    print(f"Merged {len(duplicates)} duplicate patient records, {repointed} reports repointed")
+
+
+async def share_test_text(args):
+    """
+    Move the static text of stored reports into test_reference, as
+    REPORT_TEXT_STORAGE=shared does for new uploads. Reports already
+    converted are skipped, so it can be re-run after an interruption.
+    """
+    store = ReferenceText(storage="shared")
+    cursor = report_data.find(
+        {"tests": {"$elemMatch": {"text_ref": {"$exists": False}}}},
+        {"tests": 1, "report_metadata.laboratory_name": 1, "report_metadata.hospital_name": 1}
+    )
+    updated = 0
+    saved = 0
+    batch = []
+    references = {}
+
+    async def write(batch, references):
+        # References first: a report must never point at text that is not there
+        await store.save(references)
+        await report_data.bulk_write(batch, ordered=False)
+
+    async for doc in cursor:
+        before_bytes = len(bson.encode(doc))
+        split = store.split(doc)
+        if not split:
+            continue
+        saved += before_bytes - len(bson.encode(doc))
+        updated += 1
+        if args.dry_run:
+            continue
+        references.update(split)
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"tests": doc["tests"]}}))
+        if len(batch) >= BATCH_SIZE:
+            await write(batch, references)
+            batch, references = [], {}
+    if batch:
+        await write(batch, references)
+    verb = "Would move" if args.dry_run else "Moved"
+    print(f"{verb} the static test text of {updated} reports to test_reference "
+          f"({saved / 1024 / 1024:.1f} MiB less in report_data)")
+
+
+COMMANDS = {
+    "backfill-report-dates": backfill_report_dates,
+    "normalize-test-values": normalize_test_values,
+    "backfill-parameter-series": backfill_parameter_series,
+    "ensure-indexes": build_indexes,
+    "check-indexes": check_indexes,
+    "compact-patients": compact_patients,
+    "remap-parameter-tags": remap_parameter_tags,
+    "share-test-text": share_test_text,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HealthTrack maintenance commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("--dry-run", action="store_true", help="compact-patients, remap-parameter-tags, share-test-text: only count what would change")
+    parser.add_argument("--skip-unavailable", action="store_true", help="check-indexes: pass when no MongoDB server can be reached")
+    args = parser.parse_args()
+    # db.py pings at import, which ties the client to that event loop
+    sys.exit(client.get_io_loop().run_until_complete(COMMANDS[args.command](args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+In-process metrics in the Prometheus text format, served at /metrics.
+
+Everything is recorded on the event loop thread, so observations are plain
+list/float updates without locks: a bisect and three additions per sample.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+import time
+
+# Seconds; covers Mongo round-trips up to multi-minute LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts (+Inf last), sum, count]
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == "+Inf" else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def inc(self, amount=1, *label_values):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+
+class Gauge:
+    """A value set by the code, or read from `function` at scrape time."""
+
+    def __init__(self, name, help, function=None):
+        self.name = name
+        self.help = help
+        self.function = function
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def render(self):
+        value = self.function() if self.function is not None else self.value
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {_number(value)}"]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "healthtrack_stage_duration_seconds", "Time spent in each upload pipeline stage.", ["stage"]))
+MONGO_QUERY_SECONDS = registry.register(Histogram(
+    "healthtrack_mongo_query_duration_seconds", "Mongo query time of the read endpoints.", ["query"]))
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "healthtrack_http_request_duration_seconds", "HTTP request latency by route.", ["method", "route", "status"]))
+HTTP_IN_FLIGHT = registry.register(Gauge(
+    "healthtrack_http_requests_in_flight", "HTTP requests being handled right now."))
+LLM_TOKENS = registry.register(Counter(
+    "healthtrack_llm_tokens_total", "Tokens reported by the LLM API.", ["type"]))
+LLM_REQUESTS = registry.register(Counter(
+    "healthtrack_llm_requests_total", "LLM API calls by outcome.", ["outcome"]))
+
+
+def record_llm_usage(usage):
+    # OpenAI-style usage block: prompt_tokens / completion_tokens / total_tokens
+    if not isinstance(usage, dict):
+        return
+    for kind in ("prompt", "completion"):
+        tokens = usage.get(f"{kind}_tokens")
+        if isinstance(tokens, int):
+            LLM_TOKENS.inc(tokens, kind)
+
+
+async def timed_cursor(cursor, query):
+    """
+    Pass a Mongo cursor through, recording only the time spent waiting on
+    Mongo (not on whoever consumes the documents) once it is exhausted.
+    """
+    elapsed = 0.0
+    iterator = cursor.__aiter__()
+    while True:
+        start = time.perf_counter()
+        try:
+            document = await iterator.__anext__()
+        except StopAsyncIteration:
+            break
+        finally:
+            elapsed += time.perf_counter() - start
+        yield document
+    MONGO_QUERY_SECONDS.observe(elapsed, query)
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting in-flight requests and timing each one by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # The router leaves the matched route in the scope; the template
+            # keeps ids out of the label values
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"],
+                                         getattr(route, "path", "unmatched"), str(status))
@@ -0,0 +1,158 @@
+from datetime import date, datetime
+from dateutil import parser as date_parser
+from parameter_catalog import parameter_catalog
+import re
+
+ISO_DATE = re.compile(r"^\s*(\d{4})-(\d{2})-(\d{2})")
+
+
+# Two defaults that differ in every part: a date that parses the same with
+# both was complete, anything else was filled in from the default
+PARTIAL_DATE_DEFAULTS = (datetime(1901, 1, 1), datetime(1902, 2, 2))
+MIN_YEAR = 1900
+
+
+def _plausible(parsed):
+    return MIN_YEAR <= parsed.year <= date.today().year + 1
+
+
+def normalize_report_date(value):
+    """
+    LLM-extracted dates come in whatever format the lab printed
+    ("06-Jun-2025", "06/06/2025 04:45 PM", ...). Returns an ISO "YYYY-MM-DD"
+    string, which sorts chronologically, or "" when it cannot be parsed.
+    Indian lab reports are day-first. Partial dates ("1959", "15/08", "66
+    Years") give "" rather than a date completed from today.
+    """
+    if not value or not isinstance(value, str):
+        return ""
+    # Already ISO: dayfirst parsing would swap month and day
+    match = ISO_DATE.match(value)
+    if match:
+        try:
+            parsed = date(*map(int, match.groups()))
+        except ValueError:
+            return ""
+        return parsed.isoformat() if _plausible(parsed) else ""
+    try:
+        first, second = (date_parser.parse(value, dayfirst=True, fuzzy=True, default=default).date()
+                         for default in PARTIAL_DATE_DEFAULTS)
+    except (ValueError, OverflowError):
+        return ""
+    if first != second or not _plausible(first):
+        return ""
+    return first.isoformat()
+
+
+# Leading comparator, the number, and whatever follows (often the unit again)
+NUMERIC_VALUE = re.compile(r"^\s*(<=|>=|≤|≥|<|>|=)?\s*([-+]?(?:\d+(?:\.\d+)?|\.\d+))\s*(.*)$")
+COMPARATORS = {"≤": "<=", "≥": ">=", "=": None}
+
+# Spelling variants the LLM copies from the printout -> (canonical unit, factor
+# to multiply the value by). Keys are lowercased with spaces removed.
+UNIT_ALIASES = {
+    "g/dl": ("g/dL", 1), "gm/dl": ("g/dL", 1), "gms/dl": ("g/dL", 1),
+    "mg/dl": ("mg/dL", 1), "mg%": ("mg/dL", 1),
+    "µg/dl": ("µg/dL", 1), "ug/dl": ("µg/dL", 1), "mcg/dl": ("µg/dL", 1),
+    "ng/ml": ("ng/mL", 1), "pg/ml": ("pg/mL", 1), "ng/dl": ("ng/dL", 1),
+    "mmol/l": ("mmol/L", 1), "meq/l": ("mEq/L", 1), "µmol/l": ("µmol/L", 1), "umol/l": ("µmol/L", 1),
+    "g/l": ("g/L", 1), "gm/l": ("g/L", 1), "mg/l": ("mg/L", 1), "µg/l": ("µg/L", 1), "ug/l": ("µg/L", 1),
+    "nmol/l": ("nmol/L", 1), "pmol/l": ("pmol/L", 1), "miu/l": ("mIU/L", 1),
+    "ml/min/1.73m2": ("mL/min/1.73m²", 1), "ml/min/1.73m²": ("mL/min/1.73m²", 1),
+    "miu/ml": ("mIU/mL", 1), "µiu/ml": ("µIU/mL", 1), "uiu/ml": ("µIU/mL", 1), "microiu/ml": ("µIU/mL", 1),
+    "u/l": ("U/L", 1), "iu/l": ("U/L", 1), "u/ml": ("U/mL", 1),
+    "fl": ("fL", 1), "pg": ("pg", 1), "%": ("%", 1), "mm/hr": ("mm/hr", 1), "mm/1sthr": ("mm/hr", 1),
+    "/cumm": ("/µL", 1), "cells/cumm": ("/µL", 1), "/µl": ("/µL", 1), "/ul": ("/µL", 1),
+    "cells/µl": ("/µL", 1), "cells/ul": ("/µL", 1), "/mm3": ("/µL", 1),
+    "10^3/µl": ("10^3/µL", 1), "10^3/ul": ("10^3/µL", 1), "x10^3/µl": ("10^3/µL", 1), "x10^3/ul": ("10^3/µL", 1),
+    "10³/µl": ("10^3/µL", 1), "thou/mm3": ("10^3/µL", 1), "thou/cumm": ("10^3/µL", 1),
+    "lakhs/cumm": ("10^3/µL", 100), "lakh/cumm": ("10^3/µL", 100),
+    "10^6/µl": ("10^6/µL", 1), "10^6/ul": ("10^6/µL", 1), "x10^6/µl": ("10^6/µL", 1), "x10^6/ul": ("10^6/µL", 1),
+    "10⁶/µl": ("10^6/µL", 1), "mill/mm3": ("10^6/µL", 1), "mill/cumm": ("10^6/µL", 1),
+    "million/cumm": ("10^6/µL", 1),
+}
+
+
+def parse_number(value):
+    """A plain number from an int, float or numeric string, else None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = NUMERIC_VALUE.match(value.replace(",", ""))
+        if match and not match.group(1) and not match.group(3):
+            return float(match.group(2))
+    return None
+
+
+def canonical_unit(unit):
+    """(canonical unit, value factor); unknown units are passed through stripped."""
+    if not unit or not isinstance(unit, str):
+        return "", 1
+    return UNIT_ALIASES.get(unit.replace(" ", "").lower(), (unit.strip(), 1))
+
+
+def normalize_test_value(value, unit):
+    """
+    Split a raw test value ("13.5", "<0.5", "1,20,000", "Positive") into
+    the number, its comparator ("<", "<=", ">", ">=" or None) and the
+    canonical unit. value_num is None for qualitative results.
+    """
+    unit_canonical, factor = canonical_unit(unit)
+    result = {"value_num": None, "comparator": None, "unit_canonical": unit_canonical}
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        result["value_num"] = float(value) * factor
+        return result
+    if not isinstance(value, str):
+        return result
+
+    # Digit grouping may be Indian ("1,20,000"), so just drop the commas
+    match = NUMERIC_VALUE.match(value.replace(",", ""))
+    if not match:
+        return result
+    comparator, number, rest = match.groups()
+    # "2-4" (a range) or "12.5 (repeat 13.1)" are not a single measurement;
+    # anything trailing must be the unit again
+    if rest and canonical_unit(rest)[0] != unit_canonical and rest.strip() not in (unit or ""):
+        return result
+
+    result["value_num"] = float(number) * factor
+    result["comparator"] = COMPARATORS.get(comparator, comparator)
+    return result
+
+
+def normalize_test(test):
+    """
+    Map the test to its catalog parameter_tag (the LLM's tag is kept in
+    parameter_tag_raw) and add value_num, comparator and unit_canonical,
+    converted to the catalog unit where the catalog knows how. unit_factor
+    is what the printed value was multiplied by, for the reference range.
+    """
+    if "parameter_tag_raw" not in test:
+        test["parameter_tag_raw"] = test.get("parameter_tag")
+    tag = parameter_catalog.canonical_tag(test["parameter_tag_raw"], test.get("parameter_name"),
+                                          canonical_unit(test.get("unit"))[0])
+    if tag:
+        test["parameter_tag"] = tag
+
+    test.update(normalize_test_value(test.get("value"), test.get("unit")))
+    factor = canonical_unit(test.get("unit"))[1]
+    entry = parameter_catalog.entry(tag)
+    if entry is not None and test["unit_canonical"] in entry["conversions"]:
+        conversion = entry["conversions"][test["unit_canonical"]]
+        factor *= conversion
+        test["unit_canonical"] = entry["unit"]
+        if test["value_num"] is not None:
+            test["value_num"] *= conversion
+    test["unit_factor"] = factor
+    return test
+
+
+def normalize_tests(document):
+    """normalize_test every test of a report, in place."""
+    for test in document.get("tests") or []:
+        if isinstance(test, dict):
+            normalize_test(test)
+    return document
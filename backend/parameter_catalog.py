@@ -0,0 +1,240 @@
+"""
+Canonical parameter tags.
+
+The LLM invents parameter_tag per upload, so one parameter shows up as
+"HB", "HGB" and "HEMOGLOBIN". The catalog lists each parameter once with
+its synonyms, its unit and factors to convert other units into it. It is
+compiled at import into two dicts, so resolving a test is a hash lookup:
+
+    exact   tag_key(tag or synonym or name)   "HGB", "HAEMOGLOBIN"
+    tokens  token_key(...) of the same        "BLOOD_GLUCOSE_FASTING" ~ "FASTING_GLUCOSE"
+
+Extra or overriding entries can be loaded from PARAMETER_CATALOG_FILE, a
+JSON list in the same shape as CATALOG.
+"""
+from dotenv import load_dotenv
+import json
+import os
+import re
+
+load_dotenv()  # Load from .env file
+
+PARAMETER_CATALOG_FILE = os.getenv("PARAMETER_CATALOG_FILE", "")
+
+# tag, synonyms (tags or printed names), canonical unit (as normalize.canonical_unit
+# spells it), and {other canonical unit: factor to multiply values by}
+CATALOG = [
+    # Hematology
+    {"tag": "HEMOGLOBIN", "synonyms": ["HB", "HGB", "HAEMOGLOBIN", "HEMOGLOBIN_HB", "HB_HEMOGLOBIN"],
+     "unit": "g/dL", "conversions": {"g/L": 0.1, "mmol/L": 1.611}},
+    {"tag": "RBC_COUNT", "synonyms": ["RBC", "RED_BLOOD_CELL_COUNT", "TOTAL_RBC_COUNT", "ERYTHROCYTE_COUNT", "RED_CELL_COUNT"],
+     "unit": "10^6/µL", "conversions": {"/µL": 0.000001}},
+    {"tag": "WBC_COUNT", "synonyms": ["WBC", "TLC", "TOTAL_LEUKOCYTE_COUNT", "TOTAL_LEUCOCYTE_COUNT", "TOTAL_WBC_COUNT",
+                                      "WHITE_BLOOD_CELL_COUNT", "LEUKOCYTE_COUNT"],
+     "unit": "10^3/µL", "conversions": {"/µL": 0.001}},
+    {"tag": "PLATELET_COUNT", "synonyms": ["PLT", "PLATELETS", "PLATELET", "THROMBOCYTE_COUNT"],
+     "unit": "10^3/µL", "conversions": {"/µL": 0.001}},
+    {"tag": "HEMATOCRIT", "synonyms": ["HCT", "PCV", "PACKED_CELL_VOLUME", "HAEMATOCRIT"], "unit": "%"},
+    {"tag": "MCV", "synonyms": ["MEAN_CORPUSCULAR_VOLUME", "MEAN_CELL_VOLUME"], "unit": "fL"},
+    {"tag": "MCH", "synonyms": ["MEAN_CORPUSCULAR_HEMOGLOBIN", "MEAN_CELL_HEMOGLOBIN"], "unit": "pg"},
+    {"tag": "MCHC", "synonyms": ["MEAN_CORPUSCULAR_HEMOGLOBIN_CONCENTRATION", "MEAN_CELL_HEMOGLOBIN_CONCENTRATION"],
+     "unit": "g/dL", "conversions": {"g/L": 0.1}},
+    {"tag": "RDW_CV", "synonyms": ["RDW", "RED_CELL_DISTRIBUTION_WIDTH", "RDW_CV_PERCENT"], "unit": "%"},
+    {"tag": "MPV", "synonyms": ["MEAN_PLATELET_VOLUME"], "unit": "fL"},
+    {"tag": "NEUTROPHILS", "synonyms": ["NEUTROPHIL", "NEUTROPHIL_PERCENT", "POLYMORPHS", "NEUTROPHILS_PERCENT"], "unit": "%"},
+    {"tag": "LYMPHOCYTES", "synonyms": ["LYMPHOCYTE", "LYMPHOCYTE_PERCENT", "LYMPHOCYTES_PERCENT"], "unit": "%"},
+    {"tag": "MONOCYTES", "synonyms": ["MONOCYTE", "MONOCYTE_PERCENT", "MONOCYTES_PERCENT"], "unit": "%"},
+    {"tag": "EOSINOPHILS", "synonyms": ["EOSINOPHIL", "EOSINOPHIL_PERCENT", "EOSINOPHILS_PERCENT"], "unit": "%"},
+    {"tag": "BASOPHILS", "synonyms": ["BASOPHIL", "BASOPHIL_PERCENT", "BASOPHILS_PERCENT"], "unit": "%"},
+    {"tag": "ABSOLUTE_NEUTROPHIL_COUNT", "synonyms": ["ANC", "ABSOLUTE_NEUTROPHILS"],
+     "unit": "10^3/µL", "conversions": {"/µL": 0.001}},
+    {"tag": "ABSOLUTE_LYMPHOCYTE_COUNT", "synonyms": ["ALC", "ABSOLUTE_LYMPHOCYTES"],
+     "unit": "10^3/µL", "conversions": {"/µL": 0.001}},
+    {"tag": "ABSOLUTE_EOSINOPHIL_COUNT", "synonyms": ["AEC", "ABSOLUTE_EOSINOPHILS"],
+     "unit": "10^3/µL", "conversions": {"/µL": 0.001}},
+    {"tag": "ESR", "synonyms": ["ERYTHROCYTE_SEDIMENTATION_RATE", "SED_RATE"], "unit": "mm/hr"},
+
+    # Glucose
+    {"tag": "GLUCOSE_FASTING", "synonyms": ["FBS", "FASTING_BLOOD_SUGAR", "FASTING_GLUCOSE", "FASTING_PLASMA_GLUCOSE",
+                                            "FPG", "BLOOD_SUGAR_FASTING"],
+     "unit": "mg/dL", "conversions": {"mmol/L": 18.016}},
+    {"tag": "GLUCOSE_POSTPRANDIAL", "synonyms": ["PPBS", "GLUCOSE_PP", "POST_PRANDIAL_BLOOD_SUGAR", "POSTPRANDIAL_GLUCOSE",
+                                                 "BLOOD_SUGAR_PP", "PP_GLUCOSE"],
+     "unit": "mg/dL", "conversions": {"mmol/L": 18.016}},
+    {"tag": "GLUCOSE_RANDOM", "synonyms": ["RBS", "RANDOM_BLOOD_SUGAR", "RANDOM_GLUCOSE", "BLOOD_SUGAR_RANDOM"],
+     "unit": "mg/dL", "conversions": {"mmol/L": 18.016}},
+    {"tag": "HBA1C", "synonyms": ["GLYCATED_HEMOGLOBIN", "GLYCOSYLATED_HEMOGLOBIN", "HB_A1C", "HEMOGLOBIN_A1C", "A1C"],
+     "unit": "%"},
+    {"tag": "ESTIMATED_AVERAGE_GLUCOSE", "synonyms": ["EAG", "MEAN_BLOOD_GLUCOSE", "AVERAGE_BLOOD_GLUCOSE"],
+     "unit": "mg/dL", "conversions": {"mmol/L": 18.016}},
+
+    # Kidney
+    {"tag": "UREA", "synonyms": ["BLOOD_UREA", "SERUM_UREA"], "unit": "mg/dL", "conversions": {"mmol/L": 6.006}},
+    {"tag": "BUN", "synonyms": ["BLOOD_UREA_NITROGEN", "UREA_NITROGEN"], "unit": "mg/dL", "conversions": {"mmol/L": 2.801}},
+    {"tag": "CREATININE", "synonyms": ["SERUM_CREATININE", "S_CREATININE", "CREAT"],
+     "unit": "mg/dL", "conversions": {"µmol/L": 1 / 88.42}},
+    {"tag": "URIC_ACID", "synonyms": ["SERUM_URIC_ACID", "URATE"], "unit": "mg/dL", "conversions": {"µmol/L": 1 / 59.48}},
+    {"tag": "EGFR", "synonyms": ["ESTIMATED_GFR", "GFR", "ESTIMATED_GLOMERULAR_FILTRATION_RATE"], "unit": "mL/min/1.73m²"},
+    {"tag": "SODIUM", "synonyms": ["NA", "SERUM_SODIUM", "NA_PLUS"], "unit": "mEq/L", "conversions": {"mmol/L": 1}},
+    {"tag": "POTASSIUM", "synonyms": ["K", "SERUM_POTASSIUM", "K_PLUS"], "unit": "mEq/L", "conversions": {"mmol/L": 1}},
+    {"tag": "CHLORIDE", "synonyms": ["CL", "SERUM_CHLORIDE"], "unit": "mEq/L", "conversions": {"mmol/L": 1}},
+    {"tag": "CALCIUM", "synonyms": ["CA", "SERUM_CALCIUM", "TOTAL_CALCIUM"], "unit": "mg/dL", "conversions": {"mmol/L": 4.008}},
+
+    # Lipids
+    {"tag": "TOTAL_CHOLESTEROL", "synonyms": ["CHOLESTEROL", "CHOLESTEROL_TOTAL", "SERUM_CHOLESTEROL"],
+     "unit": "mg/dL", "conversions": {"mmol/L": 38.67}},
+    {"tag": "TRIGLYCERIDES", "synonyms": ["TG", "TRIGLYCERIDE", "SERUM_TRIGLYCERIDES"],
+     "unit": "mg/dL", "conversions": {"mmol/L": 88.57}},
+    {"tag": "HDL_CHOLESTEROL", "synonyms": ["HDL", "HDL_C", "CHOLESTEROL_HDL", "HIGH_DENSITY_LIPOPROTEIN"],
+     "unit": "mg/dL", "conversions": {"mmol/L": 38.67}},
+    {"tag": "LDL_CHOLESTEROL", "synonyms": ["LDL", "LDL_C", "CHOLESTEROL_LDL", "LOW_DENSITY_LIPOPROTEIN", "LDL_DIRECT"],
+     "unit": "mg/dL", "conversions": {"mmol/L": 38.67}},
+    {"tag": "VLDL_CHOLESTEROL", "synonyms": ["VLDL", "VLDL_C", "CHOLESTEROL_VLDL"],
+     "unit": "mg/dL", "conversions": {"mmol/L": 38.67}},
+    {"tag": "NON_HDL_CHOLESTEROL", "synonyms": ["NON_HDL", "NON_HDL_C"], "unit": "mg/dL", "conversions": {"mmol/L": 38.67}},
+    {"tag": "CHOLESTEROL_HDL_RATIO", "synonyms": ["TC_HDL_RATIO", "TOTAL_CHOLESTEROL_HDL_RATIO"], "unit": ""},
+    {"tag": "LDL_HDL_RATIO", "synonyms": ["LDL_HDL"], "unit": ""},
+
+    # Liver
+    {"tag": "BILIRUBIN_TOTAL", "synonyms": ["TOTAL_BILIRUBIN", "T_BIL", "TBIL", "SERUM_BILIRUBIN_TOTAL"],
+     "unit": "mg/dL", "conversions": {"µmol/L": 1 / 17.1}},
+    {"tag": "BILIRUBIN_DIRECT", "synonyms": ["DIRECT_BILIRUBIN", "CONJUGATED_BILIRUBIN", "D_BIL", "DBIL"],
+     "unit": "mg/dL", "conversions": {"µmol/L": 1 / 17.1}},
+    {"tag": "BILIRUBIN_INDIRECT", "synonyms": ["INDIRECT_BILIRUBIN", "UNCONJUGATED_BILIRUBIN"],
+     "unit": "mg/dL", "conversions": {"µmol/L": 1 / 17.1}},
+    {"tag": "AST", "synonyms": ["SGOT", "ASPARTATE_AMINOTRANSFERASE", "AST_SGOT", "SGOT_AST", "ASPARTATE_TRANSAMINASE"],
+     "unit": "U/L"},
+    {"tag": "ALT", "synonyms": ["SGPT", "ALANINE_AMINOTRANSFERASE", "ALT_SGPT", "SGPT_ALT", "ALANINE_TRANSAMINASE"],
+     "unit": "U/L"},
+    {"tag": "ALKALINE_PHOSPHATASE", "synonyms": ["ALP", "ALK_PHOS", "SERUM_ALKALINE_PHOSPHATASE"], "unit": "U/L"},
+    {"tag": "GGT", "synonyms": ["GAMMA_GT", "GGTP", "GAMMA_GLUTAMYL_TRANSFERASE", "GAMMA_GLUTAMYL_TRANSPEPTIDASE"],
+     "unit": "U/L"},
+    {"tag": "TOTAL_PROTEIN", "synonyms": ["PROTEIN_TOTAL", "TOTAL_PROTEINS", "SERUM_TOTAL_PROTEIN"],
+     "unit": "g/dL", "conversions": {"g/L": 0.1}},
+    {"tag": "ALBUMIN", "synonyms": ["SERUM_ALBUMIN", "ALB"], "unit": "g/dL", "conversions": {"g/L": 0.1}},
+    {"tag": "GLOBULIN", "synonyms": ["SERUM_GLOBULIN", "GLOB"], "unit": "g/dL", "conversions": {"g/L": 0.1}},
+    {"tag": "AG_RATIO", "synonyms": ["A_G_RATIO", "ALBUMIN_GLOBULIN_RATIO"], "unit": ""},
+
+    # Thyroid
+    {"tag": "TSH", "synonyms": ["THYROID_STIMULATING_HORMONE", "TSH_ULTRASENSITIVE", "S_TSH"],
+     "unit": "µIU/mL", "conversions": {"mIU/L": 1}},
+    {"tag": "T3_TOTAL", "synonyms": ["T3", "TOTAL_T3", "TRIIODOTHYRONINE", "TOTAL_TRIIODOTHYRONINE"], "unit": "ng/dL"},
+    {"tag": "T4_TOTAL", "synonyms": ["T4", "TOTAL_T4", "THYROXINE", "TOTAL_THYROXINE"], "unit": "µg/dL"},
+    {"tag": "FREE_T3", "synonyms": ["FT3", "FREE_TRIIODOTHYRONINE"], "unit": "pg/mL"},
+    {"tag": "FREE_T4", "synonyms": ["FT4", "FREE_THYROXINE"], "unit": "ng/dL"},
+
+    # Vitamins, iron, inflammation
+    {"tag": "VITAMIN_D", "synonyms": ["VITAMIN_D_25_OH", "25_OH_VITAMIN_D", "25_HYDROXY_VITAMIN_D", "VIT_D",
+                                      "VITAMIN_D_TOTAL", "VITAMIN_D3"],
+     "unit": "ng/mL", "conversions": {"nmol/L": 0.4006}},
+    {"tag": "VITAMIN_B12", "synonyms": ["B12", "VIT_B12", "COBALAMIN", "CYANOCOBALAMIN"],
+     "unit": "pg/mL", "conversions": {"pmol/L": 1.355}},
+    {"tag": "IRON", "synonyms": ["SERUM_IRON", "FE"], "unit": "µg/dL", "conversions": {"µmol/L": 5.585}},
+    {"tag": "TIBC", "synonyms": ["TOTAL_IRON_BINDING_CAPACITY"], "unit": "µg/dL", "conversions": {"µmol/L": 5.585}},
+    {"tag": "TRANSFERRIN_SATURATION", "synonyms": ["TSAT", "IRON_SATURATION"], "unit": "%"},
+    {"tag": "FERRITIN", "synonyms": ["SERUM_FERRITIN"], "unit": "ng/mL", "conversions": {"µg/L": 1}},
+    {"tag": "CRP", "synonyms": ["C_REACTIVE_PROTEIN", "CRP_QUANTITATIVE"], "unit": "mg/L", "conversions": {"mg/dL": 10}},
+    {"tag": "HS_CRP", "synonyms": ["HSCRP", "HIGH_SENSITIVITY_CRP", "HIGH_SENSITIVITY_C_REACTIVE_PROTEIN"],
+     "unit": "mg/L", "conversions": {"mg/dL": 10}},
+]
+
+NON_ALNUM = re.compile(r"[^0-9A-Z]+")
+# Words that do not change which parameter is meant. Not COUNT: a neutrophil
+# count is not the neutrophil percentage
+NOISE_TOKENS = {"SERUM", "PLASMA", "BLOOD", "WHOLE", "LEVEL", "LEVELS", "TEST", "S", "VALUE"}
+
+
+def tag_key(text):
+    # "Hb (Haemoglobin)" -> "HB_HAEMOGLOBIN"
+    if not text or not isinstance(text, str):
+        return ""
+    return NON_ALNUM.sub("_", text.upper()).strip("_")
+
+
+def _token(token):
+    # Plural and singular spellings meet: NEUTROPHILS -> NEUTROPHIL
+    return token[:-1] if len(token) > 4 and token.endswith("S") and not token.endswith("SS") else token
+
+
+def words(text):
+    # The words of a tag or name that can tell parameters apart
+    return {_token(token) for token in tag_key(text).split("_") if token and token not in NOISE_TOKENS}
+
+
+def token_key(text):
+    """
+    Order and noise words ignored: "BLOOD_GLUCOSE_FASTING" -> "FASTING_GLUCOSE".
+    Every other word is kept, so a match never drops one that tells
+    parameters apart (URINE, ABSOLUTE, FREE). "" when fewer than two words
+    are left: "SERUM_PROTEIN" is not necessarily total protein, so single
+    words only match exactly.
+    """
+    tokens = words(text)
+    return "_".join(sorted(tokens)) if len(tokens) > 1 else ""
+
+
+class ParameterCatalog:
+    def __init__(self, entries):
+        self.entries = {}
+        self._exact = {}
+        self._tokens = {}
+        # Every word of every catalog tag and synonym
+        self._words = set()
+        ambiguous = set()
+        for entry in entries:
+            tag = tag_key(entry["tag"])
+            self.entries[tag] = {"tag": tag, "unit": entry.get("unit", ""),
+                                 "conversions": dict(entry.get("conversions") or {})}
+            for name in [entry["tag"], *entry.get("synonyms", [])]:
+                self._exact[tag_key(name)] = tag
+                self._words |= words(name)
+                key = token_key(name)
+                if not key:
+                    continue
+                if self._tokens.get(key, tag) != tag:
+                    ambiguous.add(key)
+                self._tokens[key] = tag
+        # A token key two parameters share is left to the exact index
+        for key in ambiguous:
+            del self._tokens[key]
+
+    def fits_unit(self, tag, unit):
+        # A result in a unit the parameter is never reported in is some other parameter
+        entry = self.entries.get(tag)
+        return (not unit or entry is None or not entry["unit"]
+                or unit == entry["unit"] or unit in entry["conversions"])
+
+    def canonical_tag(self, tag, name=None, unit=None):
+        """
+        The catalog tag for an LLM tag, if the test's canonical unit fits it.
+        The printed parameter name is only tried when the tag has no word
+        the catalog knows or says nothing the name does not: "Creatinine"
+        must not turn URINE_CREATININE into serum CREATININE. Unknown
+        parameters keep their own tag in UPPER_SNAKE_CASE; None if there is
+        nothing to go on.
+        """
+        texts = [tag]
+        tag_words = words(tag)
+        if not tag_words & self._words or tag_words <= words(name):
+            texts.append(name)
+        candidates = [self._exact.get(tag_key(text)) for text in texts]
+        candidates += [self._tokens.get(token_key(text)) for text in texts]
+        for found in candidates:
+            if found and self.fits_unit(found, unit):
+                return found
+        return tag_key(tag) or None
+
+    def entry(self, tag):
+        return self.entries.get(tag)
+
+
+def load_catalog(path=PARAMETER_CATALOG_FILE):
+    entries = list(CATALOG)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            # Later entries win, so the file can override built-in ones
+            entries.extend(json.load(f))
+    return ParameterCatalog(entries)
+
+
+parameter_catalog = load_catalog()
@@ -78,11 +78,32 @@
 #     return blocks
 from markdown_it import MarkdownIt
 from markdown_it.token import Token
-from typing import List, Dict, Union, Any
+from typing import List, Dict, Union, Any, Optional
 import json
 
 MarkdownBlock = Dict[str, Any]
 
+
+def find_json_fence(md: str) -> Optional[str]:
+    """
+    The content of the first ```json (or bare ```) fenced block, if it holds
+    a JSON object, found with plain string searches instead of parsing the
+    whole answer as markdown. None if there is no such closed block.
+    """
+    start = md.find("```")
+    while start > 0 and md[start - 1] != "\n":
+        start = md.find("```", start + 3)
+    if start == -1:
+        return None
+    line_end = md.find("\n", start)
+    if line_end == -1 or md[start + 3:line_end].strip().lower() not in ("", "json"):
+        return None
+    end = md.find("\n```", line_end)
+    if end == -1:
+        return None
+    content = md[line_end + 1:end]
+    return content if content.lstrip().startswith("{") else None
+
 def parse_markdown(md: str) -> List[MarkdownBlock]:
     """
     Parse markdown content into structured JSON blocks.
@@ -0,0 +1,150 @@
+"""
+Patient identity: one users document per patient of an account, instead of
+one per upload.
+
+Name, lab patient id and date of birth are normalized into a match key,
+scoped to the uploading account (auth_userid) so two accounts never share a
+patient. users.match_key has a unique (partial) index; uploads upsert on
+it and reuse the existing _id as the reports' db_userid.
+"""
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from db import users
+from normalize import normalize_report_date
+import hashlib
+import re
+
+# Titles labs print in front of the name
+NAME_TITLES = {"mr", "mrs", "ms", "miss", "master", "dr", "baby", "smt", "shri", "sri", "kum", "mx"}
+NON_ALNUM = re.compile(r"[^0-9a-z]+")
+DUPLICATE_KEY = 11000
+
+
+def normalize_name(name):
+    # "MR. DORAB  PATEL" and "Patel, Dorab" -> "dorab patel"
+    if not name or not isinstance(name, str):
+        return ""
+    words = [word for word in NON_ALNUM.sub(" ", name.casefold()).split() if word not in NAME_TITLES]
+    return " ".join(sorted(words))
+
+
+def normalize_patient_id(patient_id):
+    if patient_id is None:
+        return ""
+    return NON_ALNUM.sub("", str(patient_id).casefold())
+
+
+def patient_match_key(patient_details, auth_userid):
+    """
+    sha256 of the normalized identity, or None when the report carries no
+    name, id or date of birth at all (such patients are never merged).
+    """
+    patient_details = patient_details or {}
+    parts = (
+        normalize_name(patient_details.get("patient_name")),
+        normalize_patient_id(patient_details.get("patient_id")),
+        normalize_report_date(patient_details.get("date_of_birth")),
+    )
+    if not any(parts):
+        return None
+    return hashlib.sha256("|".join((auth_userid or "", *parts)).encode()).hexdigest()
+
+
+def filled_fields(patient_details):
+    # Blank fields of a later report must not wipe what an earlier one had
+    return {key: value for key, value in (patient_details or {}).items()
+            if key != "_id" and value not in (None, "", [], {})}
+
+
+def _new_patient(patient_details, auth_userid, match_key):
+    document = {key: value for key, value in (patient_details or {}).items() if key != "_id"}
+    document.update(auth_userid=auth_userid, created_at=datetime.now(timezone.utc).isoformat())
+    if match_key is not None:
+        document["match_key"] = match_key
+    return document
+
+
+async def upsert_patient(patient_details, auth_userid):
+    """
+    The patient's users _id (as a string) and whether this call created it.
+    An existing patient costs one round-trip, and its record takes over the
+    fields this report filled in.
+    """
+    match_key = patient_match_key(patient_details, auth_userid)
+    if match_key is None:
+        inserted = await users.insert_one(_new_patient(patient_details, auth_userid, None))
+        return str(inserted.inserted_id), True
+
+    fields = filled_fields(patient_details)
+    # Two uploads of a new patient can race; the loser finds the winner's record
+    for _ in range(2):
+        if fields:
+            existing = await users.find_one_and_update({"match_key": match_key}, {"$set": fields},
+                                                       projection={"_id": 1})
+        else:
+            existing = await users.find_one({"match_key": match_key}, {"_id": 1})
+        if existing is not None:
+            return str(existing["_id"]), False
+        try:
+            inserted = await users.insert_one(_new_patient(patient_details, auth_userid, match_key))
+            return str(inserted.inserted_id), True
+        except DuplicateKeyError:
+            continue
+    raise RuntimeError("Could not resolve patient identity")
+
+
+async def upsert_patients(patients, auth_userids, session=None, created=None):
+    """
+    upsert_patient for many uploads at once (the files of a batch, a group
+    commit): the db_userid of each entry of `patients`, uploaded by the
+    account at the same position of `auth_userids`. A few round-trips for
+    the lot, and entries of the same patient share one record. The ids of
+    the records this call inserted are added to the set `created`, if given.
+    """
+    keys = [patient_match_key(details, auth_userid) for details, auth_userid in zip(patients, auth_userids)]
+    ids = {}
+    async for existing in users.find({"match_key": {"$in": [key for key in set(keys) if key]}},
+                                     {"match_key": 1}, session=session):
+        ids[existing["match_key"]] = existing["_id"]
+
+    # Later files win, as they would one upload at a time
+    updates = {}
+    new_documents = {}
+    anonymous = []
+    for details, auth_userid, key in zip(patients, auth_userids, keys):
+        if key is None:
+            anonymous.append(_new_patient(details, auth_userid, None))
+        elif key in ids:
+            updates.setdefault(key, {}).update(filled_fields(details))
+        elif key in new_documents:
+            new_documents[key].update(filled_fields(details))
+        else:
+            new_documents[key] = _new_patient(details, auth_userid, key)
+
+    writes = [UpdateOne({"match_key": key}, {"$set": fields}) for key, fields in updates.items() if fields]
+    if writes:
+        await users.bulk_write(writes, ordered=False, session=session)
+
+    documents = list(new_documents.values()) + anonymous
+    if documents:
+        try:
+            # insert_many fills in each document's _id
+            await users.insert_many(documents, ordered=False, session=session)
+            inserted = [document["_id"] for document in documents]
+        except BulkWriteError as e:
+            if any(error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                raise
+            lost = {error["index"] for error in e.details.get("writeErrors", [])}
+            inserted = [document["_id"] for position, document in enumerate(documents) if position not in lost]
+            # A concurrent upload created some of these patients first
+            async for existing in users.find({"match_key": {"$in": list(new_documents)}}, {"match_key": 1},
+                                             session=session):
+                new_documents[existing["match_key"]]["_id"] = existing["_id"]
+        if created is not None:
+            created.update(str(_id) for _id in inserted)
+    for key, document in new_documents.items():
+        ids[key] = document["_id"]
+
+    anonymous_ids = iter(document["_id"] for document in anonymous)
+    return [str(ids[key]) if key is not None else str(next(anonymous_ids)) for key in keys]
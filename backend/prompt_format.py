@@ -0,0 +1,134 @@
+from collections import Counter
+from dotenv import load_dotenv
+import llmcall
+import json
+import os
+import re
+
+load_dotenv()  # Load from .env file
+
+# json: the original indented JSON dump, compact: the format below
+PROMPT_FORMAT = os.getenv("PROMPT_FORMAT", "compact")
+# Only send pages that look like they carry lab results
+PROMPT_TABLES_ONLY = os.getenv("PROMPT_TABLES_ONLY", "false").lower() == "true"
+# Bump when serialize_compact's output changes, so cached answers to the old input are not reused
+COMPACT_VERSION = "2"
+
+# A reference range such as "4000-10000", "0.5 - 1.2" or "0 to 1"
+RANGE_PATTERN = re.compile(r"\d+(?:\.\d+)?\s*(?:-|to)\s*\d+(?:\.\d+)?")
+WHITESPACE = re.compile(r"\s+")
+
+
+def _clean(text):
+    return WHITESPACE.sub(" ", text).strip() if text else ""
+
+
+def is_lab_page(page):
+    """Heuristic: the page has a table, a results header, or several rows with ranges."""
+    if any(page.get("tables") or []):
+        return True
+    lines = page.get("text_blocks") or []
+    if any("Test Name" in line and "Value" in line for line in lines):
+        return True
+    return sum(1 for line in lines if RANGE_PATTERN.search(line)) >= 2
+
+
+def _page_lines(page):
+    lines = (_clean(line) for line in page.get("text_blocks") or [])
+    return [line for line in lines if line]
+
+
+def running_lines(pages):
+    """
+    Where the running headers and footers are: on each page, the lines read
+    from its top (and from its bottom) for as long as each one sits at that
+    same place on more than half of the pages, and on at least two.
+    Returned as {page index: set of positions in _page_lines(page)}.
+    """
+    pages = [_page_lines(page) for page in pages]
+    counts = Counter()
+    for lines in pages:
+        counts.update({("top", offset, line) for offset, line in enumerate(lines)})
+        counts.update({("bottom", offset, line) for offset, line in enumerate(reversed(lines))})
+    needed = max(2, sum(1 for lines in pages if lines) // 2 + 1)
+
+    running = {}
+    for index, lines in enumerate(pages):
+        for edge, ordered in (("top", lines), ("bottom", lines[::-1])):
+            for offset, line in enumerate(ordered):
+                if counts[(edge, offset, line)] < needed:
+                    break
+                position = offset if edge == "top" else len(lines) - 1 - offset
+                running.setdefault(index, set()).add(position)
+    return running
+
+
+def serialize_compact(doc, tables_only=PROMPT_TABLES_ONLY):
+    """
+    Render {"pages": [{"page_number", "text_blocks", "tables"}]} as plain text:
+
+        [page 1]
+        text line
+        [table]
+        cell | cell | cell
+
+    Empty lines, cells, rows, tables and pages are dropped, as are table rows
+    that repeat a text line on the same page and running headers and footers
+    (see running_lines) after the first page that sends them. Any other
+    repeated line is kept.
+    """
+    out = []
+    pages = doc.get("pages", [])
+    running = running_lines(pages)
+    sent_running = set()
+
+    for index, page in enumerate(pages):
+        if tables_only and not is_lab_page(page):
+            continue
+
+        lines = []
+        page_lines = set()
+        page_running = running.get(index, set())
+        for position, line in enumerate(_page_lines(page)):
+            page_lines.add(line)
+            if position in page_running:
+                if line in sent_running:
+                    continue
+                sent_running.add(line)
+            lines.append(line)
+
+        tables = []
+        for table in page.get("tables") or []:
+            rows = []
+            for row in table or []:
+                cells = [_clean(cell) for cell in row or []]
+                cells = [cell for cell in cells if cell]
+                if not cells or " ".join(cells) in page_lines:
+                    continue
+                rows.append(" | ".join(cells))
+            if rows:
+                tables.append(rows)
+
+        if not lines and not tables:
+            continue
+
+        out.append(f"[page {page.get('page_number')}]")
+        out.extend(lines)
+        for rows in tables:
+            out.append("[table]")
+            out.extend(rows)
+
+    return "\n".join(out)
+
+
+def format_prompt(doc):
+    if PROMPT_FORMAT == "compact":
+        return serialize_compact(doc)
+    return json.dumps(doc, indent=2)
+
+
+def prompt_cache_version():
+    # Part of the LLM cache key: a different input or output format means a different answer
+    prompt_format = f"{PROMPT_FORMAT}.{COMPACT_VERSION}" if PROMPT_FORMAT == "compact" else PROMPT_FORMAT
+    return (f"{llmcall.PROMPT_VERSION}:{prompt_format}{':tables' if PROMPT_TABLES_ONLY else ''}"
+            f":{llmcall.LLM_RESPONSE_FORMAT}")
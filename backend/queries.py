@@ -0,0 +1,82 @@
+"""
+Query shapes the API runs against report_data. Kept in one place so the
+endpoints and `manage.py check-indexes` explain exactly the same queries.
+"""
+
+
+def reports_by_user_filter(auth_userid):
+    return {"auth_userid": auth_userid}
+
+
+def report_summary_pipeline(auth_userid, limit, after=None):
+    # `after` is the (report_date, _id) of the last item on the previous page.
+    # Reports without a report_date (stored before it existed, until
+    # backfill-report-dates runs) sort as null, after every dated one, and
+    # page on _id alone once the dated ones are done
+    match = {"auth_userid": auth_userid}
+    if after:
+        report_date, report_id = after
+        if report_date is None:
+            match["report_date"] = None
+            match["_id"] = {"$lt": report_id}
+        else:
+            match["$or"] = [
+                {"report_date": {"$lt": report_date}},
+                {"report_date": report_date, "_id": {"$lt": report_id}},
+                {"report_date": None}
+            ]
+
+    return [
+        {"$match": match},
+        {"$sort": {"report_date": -1, "_id": -1}},
+        {"$limit": limit + 1},
+        {
+            "$project": {
+                "report_name": 1,
+                "report_metadata.report_date": 1,
+                "report_date": 1,
+                "test_count": {"$size": {"$ifNull": ["$tests", []]}}
+            }
+        }
+    ]
+
+
+def parameter_history_pipeline(auth_userid, tag_list):
+    # Trend values straight from report_data. /report-detail reads the
+    # parameter_series collection instead; this is the pre-fan-out path
+    return [
+        {
+            "$match": {
+                "auth_userid": auth_userid,
+                # Only reports containing one of the tags, so the multikey
+                # (auth_userid, tests.parameter_tag) index bounds the scan
+                "tests.parameter_tag": {"$in": tag_list}
+            }
+        },
+        {"$unwind": "$tests"},
+        {
+            "$match": {
+                "tests.parameter_tag": {"$in": tag_list}
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "parameter_tag": "$tests.parameter_tag",
+                "value": "$tests.value",
+                "report_date": "$report_metadata.report_date"
+            }
+        }
+    ]
+
+
+def parameter_series_filter(auth_userid, tag_list):
+    return {"auth_userid": auth_userid, "parameter_tag": {"$in": tag_list}}
+
+
+def parameter_trend_filter(auth_userid, tag_list=None):
+    # Numeric, dated points only: the rest cannot go on a chart
+    query = {"auth_userid": auth_userid, "report_date": {"$gt": ""}, "value_num": {"$ne": None}}
+    if tag_list:
+        query["parameter_tag"] = {"$in": tag_list}
+    return query
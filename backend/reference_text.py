@@ -0,0 +1,181 @@
+"""
+Static test text kept once instead of in every report.
+
+full_form, method, clinical_significance and reference_range.range_text
+are long LLM-written strings that come out the same for a parameter every
+time a lab's report is extracted. With REPORT_TEXT_STORAGE=shared they are
+stored once per (parameter_tag, lab, text) in the test_reference
+collection, and each test keeps only its measurement plus text_ref, the id
+of its reference document. Ids are content hashes, so reference documents
+never change and the in-process cache never goes stale.
+
+Readers rejoin the text whatever the mode, so reports stored either way
+can be mixed.
+"""
+from collections import OrderedDict
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from bson import ObjectId
+from db import test_reference
+import hashlib
+import json
+import os
+
+load_dotenv()  # Load from .env file
+
+# inline: every test carries its text (as before); shared: text in test_reference
+REPORT_TEXT_STORAGE = os.getenv("REPORT_TEXT_STORAGE", "inline")
+# Reference documents kept in memory for the read endpoints
+REFERENCE_TEXT_CACHE_SIZE = int(os.getenv("REFERENCE_TEXT_CACHE_SIZE", "20000"))
+
+TEXT_FIELDS = ("full_form", "method", "clinical_significance")
+RANGE_TEXT = "range_text"
+READ_BATCH = 100
+
+
+def lab_name(report_metadata):
+    report_metadata = report_metadata or {}
+    name = report_metadata.get("laboratory_name") or report_metadata.get("hospital_name") or ""
+    return " ".join(name.casefold().split()) if isinstance(name, str) else ""
+
+
+def reference_id(reference):
+    raw = json.dumps(reference, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+class ReferenceText:
+    def __init__(self, storage=REPORT_TEXT_STORAGE, cache_size=REFERENCE_TEXT_CACHE_SIZE):
+        self.shared = storage == "shared"
+        self.cache_size = cache_size
+        # id -> reference document, least recently used first
+        self._cache = OrderedDict()
+
+    def _remember(self, reference):
+        self._cache[reference["_id"]] = reference
+        self._cache.move_to_end(reference["_id"])
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def storage_copy(self, document):
+        """
+        The report document to store for a test category. In shared mode a
+        copy whose tests store() may strip, so the upload's own answer keeps
+        its text; the _id is set on both so they stay the same report.
+        """
+        if not self.shared:
+            return document
+        document["_id"] = document.get("_id") or ObjectId()
+        return {**document, "tests": [dict(test) if isinstance(test, dict) else test
+                                      for test in document.get("tests") or []]}
+
+    def split(self, document):
+        """
+        Take the static text out of a report's tests, in place, leaving a
+        text_ref on each. Returns the reference documents, by id.
+        """
+        references = {}
+        lab = lab_name(document.get("report_metadata"))
+        for test in document.get("tests") or []:
+            if not isinstance(test, dict) or "text_ref" in test:
+                continue
+            text = {field: test[field] for field in TEXT_FIELDS if field in test}
+            reference_range = test.get("reference_range")
+            if isinstance(reference_range, dict) and RANGE_TEXT in reference_range:
+                text[RANGE_TEXT] = reference_range[RANGE_TEXT]
+            # Empty fields go along too, so rejoining gives back the same test
+            if not any(text.values()):
+                continue
+            for field in TEXT_FIELDS:
+                test.pop(field, None)
+            if RANGE_TEXT in text:
+                test["reference_range"] = {key: value for key, value in reference_range.items() if key != RANGE_TEXT}
+            reference = {"parameter_tag": test.get("parameter_tag_raw") or test.get("parameter_tag"),
+                         "lab": lab, **text}
+            reference["_id"] = reference_id(reference)
+            test["text_ref"] = reference["_id"]
+            references[reference["_id"]] = reference
+        return references
+
+    async def store(self, documents, session=None):
+        """
+        Shared mode: strip the given report documents (storage copies) and
+        make sure their reference documents exist, before the reports are
+        inserted. Ones this process has already seen are not written again.
+        Returns the reference documents written; see save().
+        """
+        if not self.shared:
+            return []
+        references = {}
+        for document in documents:
+            references.update(self.split(document))
+        return await self.save(references, session=session)
+
+    async def save(self, references, session=None):
+        """
+        Write the references (id -> reference document, as split() returns
+        them) not seen before, and return those. Within a session they are
+        only taken as seen once the caller's transaction has committed (it
+        calls remember()): an aborted transaction takes them back out.
+        """
+        missing = [reference for reference_id, reference in references.items() if reference_id not in self._cache]
+        if not missing:
+            return []
+        # Content-addressed, so a concurrent upload inserting the same one is harmless
+        await test_reference.bulk_write(
+            [UpdateOne({"_id": reference["_id"]}, {"$setOnInsert": reference}, upsert=True) for reference in missing],
+            ordered=False, session=session)
+        if session is None:
+            self.remember(missing)
+        return missing
+
+    def remember(self, references):
+        for reference in references:
+            self._remember(reference)
+
+    async def attach(self, documents):
+        """Put the text back into the tests of the given reports, in place."""
+        tests = [test for document in documents for test in document.get("tests") or []
+                 if isinstance(test, dict) and test.get("text_ref")]
+        if not tests:
+            return documents
+        references = {}
+        for reference_id in {test["text_ref"] for test in tests}:
+            if reference_id in self._cache:
+                self._cache.move_to_end(reference_id)
+                references[reference_id] = self._cache[reference_id]
+        wanted = [reference_id for test in tests if (reference_id := test["text_ref"]) not in references]
+        if wanted:
+            async for reference in test_reference.find({"_id": {"$in": list(set(wanted))}}):
+                references[reference["_id"]] = reference
+                self._remember(reference)
+        for test in tests:
+            reference = references.get(test["text_ref"])
+            if reference is None:
+                continue
+            del test["text_ref"]
+            for field in TEXT_FIELDS:
+                if field in reference:
+                    test[field] = reference[field]
+            if RANGE_TEXT in reference:
+                test["reference_range"] = {**(test.get("reference_range") or {}), RANGE_TEXT: reference[RANGE_TEXT]}
+        return documents
+
+    async def attach_stream(self, cursor):
+        # attach() for a streamed listing, a read batch at a time
+        batch = []
+        async for document in cursor:
+            batch.append(document)
+            if len(batch) >= READ_BATCH:
+                for document in await self.attach(batch):
+                    yield document
+                batch = []
+        for document in await self.attach(batch):
+            yield document
+
+    def stats(self):
+        return {"storage": "shared" if self.shared else "inline", "cached": len(self._cache),
+                "cache_size": self.cache_size}
+
+
+reference_text = ReferenceText()
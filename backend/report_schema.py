@@ -0,0 +1,176 @@
+"""
+Typed form of the report JSON described in llmcall.SYSTEM_PROMPT.
+
+The LLM answer is validated straight from its JSON text into these models
+(one parse, in pydantic-core) and handed on as plain dicts. Fields the
+prompt asks for get their empty defaults when the model leaves them out;
+anything extra it adds is kept. JSON mode does not make the model follow
+the schema, so an answer that fails validation is validated again with the
+Lenient models, which drop (and log) each malformed test or category
+rather than failing the whole upload. Only such answers pay for validating
+entry by entry.
+"""
+import json
+from typing import Dict, List, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+from logs import get_logger
+
+# Values and limits come back as numbers or as printed ("<0.5", "Negative")
+Scalar = Optional[Union[float, str]]
+
+log = get_logger("report_schema")
+
+
+def _keep_valid(model, items, what):
+    # Validate entries one by one, dropping the ones that do not fit
+    kept = {} if isinstance(items, dict) else []
+    for key, item in (items.items() if isinstance(items, dict) else enumerate(items)):
+        try:
+            value = model.model_validate(item)
+        except ValidationError as e:
+            log.warning("Dropping invalid part of LLM answer",
+                        extra={"part": what, "key": key, "error": describe_errors(e)})
+            continue
+        if isinstance(kept, dict):
+            kept[key] = value
+        else:
+            kept.append(value)
+    return kept
+
+
+class SchemaModel(BaseModel):
+    # Numbers where text is expected (an age, a phone number) are kept as text
+    model_config = ConfigDict(extra="allow", coerce_numbers_to_str=True)
+
+
+class ReferenceRange(SchemaModel):
+    lower_limit: Scalar = None
+    upper_limit: Scalar = None
+    range_text: Optional[str] = ""
+
+
+class TestResult(SchemaModel):
+    parameter_name: Optional[str] = ""
+    parameter_tag: Optional[str] = ""
+    value: Scalar = ""
+    unit: Optional[str] = ""
+    reference_range: Optional[ReferenceRange] = Field(default_factory=ReferenceRange)
+    status: Optional[str] = ""
+    full_form: Optional[str] = ""
+    method: Optional[str] = ""
+    notes: Optional[str] = ""
+    clinical_significance: Optional[str] = ""
+
+    @field_validator("reference_range", mode="before")
+    @classmethod
+    def range_as_text(cls, value):
+        # "13-17" instead of the object: keep it as the printed range
+        if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+            return {"range_text": str(value)}
+        return value if isinstance(value, dict) else None
+
+
+class CategoryPatient(SchemaModel):
+    patient_name: Optional[str] = ""
+    patient_id: Optional[str] = ""
+
+
+class TestCategory(SchemaModel):
+    report_name: Optional[str] = ""
+    patient_details: Optional[CategoryPatient] = None
+    tests: List[TestResult] = Field(default_factory=list)
+
+
+class LenientTestCategory(TestCategory):
+    @field_validator("tests", mode="before")
+    @classmethod
+    def drop_invalid_tests(cls, tests):
+        return _keep_valid(TestResult, tests, "test") if isinstance(tests, list) else tests
+
+
+class PatientDetails(SchemaModel):
+    patient_name: Optional[str] = ""
+    patient_id: Optional[str] = ""
+    age: Optional[str] = ""
+    gender: Optional[str] = ""
+    date_of_birth: Optional[str] = ""
+    contact_number: Optional[str] = ""
+    address: Optional[str] = ""
+    registration_date: Optional[str] = ""
+    sampling_date: Optional[str] = ""
+    reporting_date: Optional[str] = ""
+
+
+class ReportMetadata(SchemaModel):
+    report_name: Optional[str] = ""
+    report_id: Optional[str] = ""
+    report_date: Optional[str] = ""
+    doctor_name: Optional[str] = ""
+    hospital_name: Optional[str] = ""
+    department: Optional[str] = ""
+    laboratory_name: Optional[str] = ""
+    equipment_used: Union[List[str], str, None] = Field(default_factory=list)
+
+
+class Report(SchemaModel):
+    patient_details: PatientDetails = Field(default_factory=PatientDetails)
+    report_metadata: ReportMetadata = Field(default_factory=ReportMetadata)
+    test_categories: Dict[str, TestCategory]
+
+
+class LenientReport(Report):
+    test_categories: Dict[str, LenientTestCategory]
+
+    @field_validator("test_categories", mode="before")
+    @classmethod
+    def drop_invalid_categories(cls, categories):
+        if not isinstance(categories, dict):
+            return categories
+        kept = _keep_valid(LenientTestCategory, categories, "test category")
+        # Some bad tests are dropped; an answer with tests but none usable is a wrong answer
+        sent = any(isinstance(category, dict) and category.get("tests") for category in categories.values())
+        if sent and not any(category.tests for category in kept.values()):
+            raise ValueError("no test category with a valid test")
+        return kept
+
+
+def report_json_schema():
+    """JSON schema for the response_format of the LLM request."""
+    return Report.model_json_schema()
+
+
+def parse_report(text):
+    """Report JSON text -> plain dict. Raises ValidationError, also for text that is not JSON."""
+    try:
+        return Report.model_validate_json(text).model_dump()
+    except ValidationError as e:
+        try:
+            data = json.loads(text)
+        except ValueError:
+            raise e
+        return LenientReport.model_validate(data).model_dump()
+
+
+SECTION_MODELS = {"patient_details": PatientDetails, "report_metadata": ReportMetadata}
+
+
+def parse_section(name, value):
+    """One top-level section of a streamed answer -> plain dict. Raises ValidationError."""
+    model = SECTION_MODELS.get(name)
+    return model.model_validate(value).model_dump() if model is not None else value
+
+
+def parse_category(value):
+    """One streamed test category -> plain dict. Raises ValidationError."""
+    try:
+        return TestCategory.model_validate(value).model_dump()
+    except ValidationError:
+        return LenientTestCategory.model_validate(value).model_dump()
+
+
+def describe_errors(error: ValidationError, limit=3):
+    # "test_categories.Hematology.tests.0: Input should be a valid dictionary; ..."
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'report'}: {detail['msg']}"
+        for detail in error.errors()[:limit]
+    )
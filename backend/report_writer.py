@@ -0,0 +1,204 @@
+from dotenv import load_dotenv
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+from db import client, report_data, users
+from patients import upsert_patients
+from reference_text import reference_text
+from metrics import registry, Histogram, STAGE_SECONDS
+from logs import get_logger
+import asyncio
+import os
+
+load_dotenv()  # Load from .env file
+
+# How long the first upload of a group waits for others to join it (ms).
+# 0 writes every upload on its own, as before group commit
+REPORT_WRITE_WINDOW_MS = float(os.getenv("REPORT_WRITE_WINDOW_MS", "5"))
+# A group this large is written straight away
+REPORT_WRITE_MAX_BATCH = int(os.getenv("REPORT_WRITE_MAX_BATCH", "50"))
+# Write each group in a transaction: auto (when Mongo is a replica set or
+# mongos), on, off
+REPORT_WRITE_TRANSACTIONS = os.getenv("REPORT_WRITE_TRANSACTIONS", "auto")
+
+log = get_logger("report_writer")
+
+WRITE_BATCH_SIZE = registry.register(Histogram(
+    "healthtrack_report_write_batch_uploads", "Uploads persisted per group commit.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)))
+
+
+class PendingWrite:
+    def __init__(self, patient_details, auth_userid, build_documents):
+        self.patient_details = patient_details
+        self.auth_userid = auth_userid
+        self.build_documents = build_documents
+        self.future = asyncio.get_running_loop().create_future()
+        self.db_userid = None
+        self.documents = []
+
+
+class ReportWriter:
+    """
+    Group commit for upload results. Concurrent uploads hand their patient
+    and report documents to write(); whatever arrives within the window
+    (or up to max_batch uploads) is persisted together: one patient
+    resolution for the group and one unordered insert_many for all of its
+    reports, instead of two round-trips per upload. Each caller gets its own
+    db_userid and report ids back.
+
+    On a replica set the group is one transaction, so an upload's patient
+    and reports are stored together or not at all; if it fails, the uploads
+    are retried one by one so a bad upload cannot take the others down.
+    Without transactions (a standalone mongod) this is best effort: the
+    reports of an upload that failed, and the patient records the group
+    created only for such uploads, are removed again, but fields a failed
+    upload filled in on an existing patient stay. Whatever cannot be
+    removed is logged.
+    """
+
+    def __init__(self, window_ms=REPORT_WRITE_WINDOW_MS, max_batch=REPORT_WRITE_MAX_BATCH,
+                 transactions=REPORT_WRITE_TRANSACTIONS):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.transactions = transactions
+        self.after_write = None
+        self._pending = []
+        self._timer = None
+        self._flushes = set()
+
+    def start(self, after_write):
+        # after_write(documents): derived data and cache invalidation, once per group
+        self.after_write = after_write
+
+    async def stop(self):
+        self._flush_now()
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def write(self, patient_details, auth_userid, build_documents):
+        """
+        Persist one upload. build_documents(db_userid) returns its report
+        documents. Returns (db_userid, inserted report ids).
+        """
+        pending = PendingWrite(patient_details, auth_userid, build_documents)
+        if self.window <= 0:
+            await self._flush([pending])
+        else:
+            self._pending.append(pending)
+            if len(self._pending) >= self.max_batch:
+                self._flush_now()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._flush_now)
+        return await pending.future
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _use_transactions(self):
+        if self.transactions == "auto":
+            hello = await client.admin.command("hello")
+            self.transactions = "on" if hello.get("setName") or hello.get("msg") == "isdbgrid" else "off"
+        return self.transactions == "on"
+
+    async def _flush(self, batch):
+        # Callers cancelled while waiting (shutdown) are not written
+        batch = [pending for pending in batch if not pending.future.done()]
+        if not batch:
+            return
+        WRITE_BATCH_SIZE.observe(len(batch))
+        transactional = False
+        try:
+            transactional = await self._use_transactions()
+            with STAGE_SECONDS.time("write_reports"):
+                if transactional:
+                    async with await client.start_session() as session:
+                        async with session.start_transaction():
+                            references = await self._write(batch, session)
+                    # Committed: the shared text is there for later uploads to rely on
+                    reference_text.remember(references)
+                else:
+                    await self._write(batch)
+        except Exception as e:
+            if transactional and len(batch) > 1:
+                # Nothing of the group was kept, so each upload can be tried again alone
+                log.warning("Group commit failed, writing its uploads one by one",
+                            extra={"uploads": len(batch), "error": str(e)})
+                for pending in batch:
+                    await self._flush([pending])
+                return
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+
+        written = [pending for pending in batch if not pending.future.done()]
+        if self.after_write is not None:
+            try:
+                await self.after_write([document for pending in written for document in pending.documents])
+            except Exception as e:
+                log.warning("Post-write hook failed", extra={"error": str(e)})
+        for pending in written:
+            if not pending.future.done():
+                pending.future.set_result((pending.db_userid, [document["_id"] for document in pending.documents]))
+
+    async def _write(self, batch, session=None):
+        # Returns the shared reference text written, see ReferenceText.save
+        created = set() if session is None else None
+        db_userids = await upsert_patients([pending.patient_details for pending in batch],
+                                           [pending.auth_userid for pending in batch],
+                                           session=session, created=created)
+        documents, owners = [], []
+        for position, (pending, db_userid) in enumerate(zip(batch, db_userids)):
+            pending.db_userid = db_userid
+            pending.documents = pending.build_documents(db_userid)
+            documents.extend(pending.documents)
+            owners.extend([position] * len(pending.documents))
+        if not documents:
+            return []
+
+        try:
+            references = await reference_text.store(documents, session=session)
+            # insert_many fills in every document's _id
+            await report_data.insert_many(documents, ordered=False, session=session)
+        except Exception as e:
+            if session is not None:
+                raise
+            # No transaction: take back what the failed uploads wrote. Only
+            # the uploads that lost a report fail on a BulkWriteError, every
+            # upload on anything else
+            if isinstance(e, BulkWriteError):
+                failed = {owners[error["index"]] for error in e.details.get("writeErrors", [])}
+            else:
+                failed = set(range(len(batch)))
+            await self._take_back(batch, documents, owners, failed, created)
+            if not isinstance(e, BulkWriteError):
+                raise
+            for position in failed:
+                batch[position].future.set_exception(e)
+            return []
+        return references
+
+    async def _take_back(self, batch, documents, owners, failed, created):
+        leftovers = [document["_id"] for document, owner in zip(documents, owners)
+                     if owner in failed and "_id" in document]
+        kept = {pending.db_userid for position, pending in enumerate(batch) if position not in failed}
+        patients = {batch[position].db_userid for position in failed} & created - kept
+        try:
+            if leftovers:
+                await report_data.delete_many({"_id": {"$in": leftovers}})
+            for db_userid in patients:
+                # Another upload may have found the new record in the meantime
+                if await report_data.find_one({"db_userid": db_userid}, {"_id": 1}) is None:
+                    await users.delete_one({"_id": ObjectId(db_userid)})
+        except Exception as e:
+            log.error("Failed to remove the writes of failed uploads", extra={
+                "report_ids": [str(_id) for _id in leftovers], "db_userids": sorted(patients), "error": str(e)})
+
+
+report_writer = ReportWriter()
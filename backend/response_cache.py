@@ -0,0 +1,138 @@
+from collections import OrderedDict
+from dotenv import load_dotenv
+from cache import MemoryBackend, DiskBackend, MongoBackend, sha256_bytes
+import os
+import time
+import uuid
+
+load_dotenv()  # Load from .env file
+
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Larger bodies (e.g. a long full listing) are served but not cached
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(4 * 1024 * 1024)))
+# Second tier shared by every API process: none | disk | mongo
+RESPONSE_CACHE_SHARED = os.getenv("RESPONSE_CACHE_SHARED", "none")
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", os.path.join("cache", "responses"))
+# How long a process reuses a generation token read from the shared tier, i.e.
+# how late it may see another process's invalidation
+RESPONSE_CACHE_GENERATION_SECONDS = float(os.getenv("RESPONSE_CACHE_GENERATION_SECONDS", "2"))
+
+
+class ResponseCache:
+    """
+    Serialized read responses (/reports, /report-detail) per auth_userid.
+
+    Keys embed the user's generation token, and invalidate() replaces the
+    token, so one write drops every cached page of that user and nobody
+    else's. Tokens are random, so a generation that was evicted or expired
+    can never match old entries again. With a shared tier the token lives
+    there, which makes an invalidation in one process visible to all; each
+    process reads it with a plain lookup and reuses it for
+    generation_seconds. Local tokens are kept for at most max_generations
+    users: forgetting one only orphans that user's entries.
+
+    Entries are (etag, body bytes); hits are returned as stored.
+    """
+
+    def __init__(self, memory, shared=None, ttl=RESPONSE_CACHE_TTL_SECONDS,
+                 max_entry_bytes=RESPONSE_CACHE_MAX_ENTRY_BYTES,
+                 generation_seconds=RESPONSE_CACHE_GENERATION_SECONDS,
+                 max_generations=RESPONSE_CACHE_MAX_ENTRIES):
+        self.memory = memory
+        self.shared = shared
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+        self.generation_seconds = generation_seconds
+        self.max_generations = max_generations
+        # auth_userid -> (reuse until, token), least recently used first
+        self._generations = OrderedDict()
+        self.stats = {}
+
+    def _count(self, kind, outcome):
+        counts = self.stats.setdefault(kind, {"memory_hits": 0, "shared_hits": 0, "misses": 0, "not_modified": 0})
+        counts[outcome] += 1
+
+    def record_not_modified(self, kind):
+        self._count(kind, "not_modified")
+
+    def summary(self):
+        summary = {}
+        for kind, counts in self.stats.items():
+            lookups = counts["memory_hits"] + counts["shared_hits"] + counts["misses"]
+            hits = counts["memory_hits"] + counts["shared_hits"]
+            summary[kind] = {**counts, "hit_ratio": round(hits / lookups, 4) if lookups else None}
+        return summary
+
+    def _keep_generation(self, auth_userid, token):
+        # Without a shared tier the local token is the only one and never goes stale
+        until = time.monotonic() + self.generation_seconds if self.shared is not None else float("inf")
+        self._generations[auth_userid] = (until, token)
+        self._generations.move_to_end(auth_userid)
+        while len(self._generations) > self.max_generations:
+            self._generations.popitem(last=False)
+
+    async def _generation(self, auth_userid):
+        kept = self._generations.get(auth_userid)
+        if kept is not None and kept[0] > time.monotonic():
+            self._generations.move_to_end(auth_userid)
+            return kept[1]
+        token = await self.shared.peek(f"gen:{auth_userid}") if self.shared is not None else None
+        if token is None:
+            # Never fall back to a fixed default: if the token was evicted,
+            # entries written under it must not become visible again
+            token = uuid.uuid4().hex
+            if self.shared is not None:
+                await self.shared.set(f"gen:{auth_userid}", token, self.ttl)
+        self._keep_generation(auth_userid, token)
+        return token
+
+    async def get(self, kind, auth_userid, key):
+        """Returns (full cache key, (etag, body) or None)."""
+        cache_key = f"{kind}:{auth_userid}:{await self._generation(auth_userid)}:{key}"
+        payload = await self.memory.get(cache_key)
+        if payload is not None:
+            self._count(kind, "memory_hits")
+        elif self.shared is not None:
+            payload = await self.shared.get(cache_key)
+            if payload is not None:
+                self._count(kind, "shared_hits")
+                await self.memory.set(cache_key, payload, self.ttl)
+        if payload is None:
+            self._count(kind, "misses")
+            return cache_key, None
+        etag, body = payload.split("\n", 1)
+        return cache_key, (etag, body.encode())
+
+    async def set(self, cache_key, body):
+        etag = f'"{sha256_bytes(body)[:32]}"'
+        if len(body) > self.max_entry_bytes:
+            return etag
+        # Compact JSON never contains a raw newline, so it can separate the two
+        payload = f"{etag}\n{body.decode()}"
+        await self.memory.set(cache_key, payload, self.ttl)
+        if self.shared is not None:
+            await self.shared.set(cache_key, payload, self.ttl)
+        return etag
+
+    async def invalidate(self, auth_userid):
+        token = uuid.uuid4().hex
+        self._keep_generation(auth_userid, token)
+        if self.shared is not None:
+            await self.shared.set(f"gen:{auth_userid}", token, self.ttl)
+
+
+def make_shared_backend(name=RESPONSE_CACHE_SHARED):
+    if name == "disk":
+        return DiskBackend(RESPONSE_CACHE_DIR, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES)
+    if name == "mongo":
+        from db import db
+        return MongoBackend(db["response_cache"], RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES)
+    return None
+
+
+response_cache = ResponseCache(
+    MemoryBackend(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES),
+    make_shared_backend()
+)
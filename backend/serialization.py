@@ -0,0 +1,50 @@
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse
+import orjson
+
+# str() keys for defaultdicts keyed by tag, numpy values from the trend stats
+DUMPS_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+# Yield to the client once this many encoded bytes have piled up
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def _default(obj):
+    # orjson handles datetimes itself; ObjectId is the only Mongo type we return
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj) -> bytes:
+    return orjson.dumps(obj, default=_default, option=DUMPS_OPTIONS)
+
+
+def to_jsonable(obj):
+    """Plain JSON types only (ObjectIds as strings), converted in C rather than by a recursive walk."""
+    return orjson.loads(dumps(obj))
+
+
+class FastJSONResponse(ORJSONResponse):
+    """JSON response rendered by orjson, with ObjectId support."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+async def stream_json_array(cursor):
+    """
+    Encode an (async) Mongo cursor as a JSON array one document at a time,
+    so the response never holds more than a cursor batch and one output chunk.
+    """
+    buffer = bytearray(b"[")
+    first = True
+    async for document in cursor:
+        if not first:
+            buffer += b","
+        buffer += dumps(document)
+        first = False
+        if len(buffer) >= STREAM_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b"]"
+    yield bytes(buffer)
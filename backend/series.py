@@ -0,0 +1,91 @@
+from collections import defaultdict
+from db import parameter_series
+from metrics import timed_cursor
+from normalize import normalize_test, canonical_unit, parse_number
+from queries import parameter_series_filter, parameter_trend_filter
+from logs import get_logger
+
+log = get_logger("series")
+
+
+def series_points(documents):
+    """
+    One parameter_series document per test in the given (already inserted)
+    report_data documents. report_date is the sortable ISO date, printed_date
+    the date as the lab printed it, which is what the detail page shows.
+    """
+    points = []
+    for document in documents:
+        printed_date = (document.get("report_metadata") or {}).get("report_date")
+        for test in document.get("tests") or []:
+            if not isinstance(test, dict) or not test.get("parameter_tag"):
+                continue
+            if "value_num" not in test:
+                normalize_test(test)
+            # Reference limits are printed in the raw unit, so scale them like the value
+            factor = test.get("unit_factor", canonical_unit(test.get("unit"))[1])
+            reference_range = test.get("reference_range") or {}
+            lower_limit = parse_number(reference_range.get("lower_limit"))
+            upper_limit = parse_number(reference_range.get("upper_limit"))
+            points.append({
+                "auth_userid": document.get("auth_userid"),
+                "parameter_tag": test["parameter_tag"],
+                "report_date": document.get("report_date", ""),
+                "printed_date": printed_date,
+                "value": test.get("value"),
+                "unit": test.get("unit"),
+                "value_num": test["value_num"],
+                "comparator": test["comparator"],
+                "unit_canonical": test["unit_canonical"],
+                "lower_limit": lower_limit * factor if lower_limit is not None else None,
+                "upper_limit": upper_limit * factor if upper_limit is not None else None,
+                "status": test.get("status"),
+                "report_id": document["_id"]
+            })
+    return points
+
+
+async def write_series(documents):
+    # The reports are already saved, so a failure here only loses trend
+    # points; `python manage.py backfill-parameter-series` restores them
+    points = series_points(documents)
+    if not points:
+        return
+    try:
+        await parameter_series.insert_many(points, ordered=False)
+    except Exception as e:
+        log.warning("Failed to write parameter series", extra={"points": len(points), "error": str(e)})
+
+
+async def delete_series(report_ids):
+    if report_ids:
+        await parameter_series.delete_many({"report_id": {"$in": list(report_ids)}})
+
+
+async def get_parameter_series(auth_userid, tag_list, keys=None):
+    """
+    {parameter_tag: [{"value", "report_date"}, ...]}, oldest first. `keys`
+    maps further series tags to the tag their points are listed under.
+    """
+    keys = {**(keys or {}), **{tag: tag for tag in tag_list}}
+    cursor = parameter_series.find(
+        parameter_series_filter(auth_userid, list(keys)),
+        {"_id": 0, "parameter_tag": 1, "value": 1, "printed_date": 1}
+    ).sort("report_date", 1)
+
+    result_map = defaultdict(list)
+    async for point in timed_cursor(cursor, "parameter_series"):
+        result_map[keys.get(point["parameter_tag"], point["parameter_tag"])].append({
+            "value": point.get("value"),
+            "report_date": point.get("printed_date")
+        })
+    return result_map
+
+
+async def get_trend_points(auth_userid, tag_list=None):
+    cursor = parameter_series.find(
+        parameter_trend_filter(auth_userid, tag_list),
+        {"_id": 0, "parameter_tag": 1, "report_date": 1, "value_num": 1, "comparator": 1,
+         "unit_canonical": 1, "lower_limit": 1, "upper_limit": 1}
+    )
+    return [point async for point in timed_cursor(cursor, "trend_points")]
@@ -0,0 +1,118 @@
+import json
+
+
+class ReportStreamParser:
+    """
+    Incremental parser for the report JSON as it streams out of the LLM.
+
+    Feed it text deltas; it returns events as soon as they are complete:
+
+        ("section", "patient_details", {...})   a finished top-level value
+        ("category", "Hematology", {...})       a finished test_categories entry
+
+    Anything before the first "{" (for example a ```json fence) and after the
+    closing "}" is ignored. Once the top-level object is closed, result()
+    returns the whole parsed document.
+    """
+
+    def __init__(self):
+        self.done = False
+        self._started = False
+        self._chunks = []        # the top-level object, as received
+        self._stack = []         # open containers: "{" or "["
+        self._keys = []          # current key at each open object
+        self._expect_key = False
+        self._in_string = False
+        self._is_key = False
+        self._escape = False
+        self._key_chars = []
+        self._capture = None     # (depth, kind, name, chunk index, offset) of the value being collected
+
+    def feed(self, text):
+        events = []
+        if self.done:
+            return events
+        if not self._started:
+            start = text.find("{")
+            if start < 0:
+                return events
+            text = text[start:]
+            self._started = True
+
+        self._chunks.append(text)
+        for offset, char in enumerate(text):
+            self._step(char, offset, events)
+            if self.done:
+                # Drop whatever follows the closing brace (e.g. the ``` fence)
+                self._chunks[-1] = text[:offset + 1]
+                break
+        return events
+
+    def _slice(self, chunk_index, start, end):
+        # Text from (chunk_index, start) up to `end` in the current chunk
+        if chunk_index == len(self._chunks) - 1:
+            return self._chunks[-1][start:end]
+        pieces = [self._chunks[chunk_index][start:]]
+        pieces.extend(self._chunks[chunk_index + 1:-1])
+        pieces.append(self._chunks[-1][:end])
+        return "".join(pieces)
+
+    def _step(self, char, offset, events):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._is_key:
+                    self._keys[-1] = json.loads('"' + "".join(self._key_chars) + '"')
+                    self._is_key = False
+                    self._expect_key = False
+                return
+            if self._is_key:
+                self._key_chars.append(char)
+            return
+
+        if char == '"':
+            self._in_string = True
+            self._is_key = self._expect_key
+            self._key_chars = []
+        elif char in "{[":
+            depth = len(self._stack)
+            if self._capture is None and self._is_section_value(depth):
+                kind = "category" if depth == 2 else "section"
+                self._capture = (depth, kind, self._keys[-1], len(self._chunks) - 1, offset)
+            self._stack.append(char)
+            if char == "{":
+                self._keys.append(None)
+                self._expect_key = True
+        elif char in "}]":
+            self._stack.pop()
+            if char == "}":
+                self._keys.pop()
+            self._expect_key = False
+            depth = len(self._stack)
+            if self._capture is not None and depth == self._capture[0]:
+                _, kind, name, chunk_index, start = self._capture
+                self._capture = None
+                events.append((kind, name, json.loads(self._slice(chunk_index, start, offset + 1))))
+            if depth == 0:
+                self.done = True
+        elif char == ",":
+            self._expect_key = bool(self._stack) and self._stack[-1] == "{"
+
+    def _is_section_value(self, depth):
+        # Top-level values (other than test_categories itself) and the values
+        # directly inside test_categories are emitted as they complete
+        if depth == 1 and self._stack[0] == "{":
+            return self._keys[0] != "test_categories"
+        if depth == 2 and self._stack == ["{", "{"]:
+            return self._keys[0] == "test_categories"
+        return False
+
+    def text(self):
+        return "".join(self._chunks)
+
+    def result(self):
+        return json.loads(self.text())
@@ -0,0 +1,140 @@
+import numpy as np
+
+BUCKETS = ("week", "month", "quarter", "year")
+
+
+def _comparable_points(points):
+    # A tag's history can switch units between labs; only points in the
+    # tag's latest unit (or with no unit at all) can be put on one axis
+    latest_unit = {}
+    for point in sorted(points, key=lambda point: point["report_date"]):
+        if point.get("unit_canonical"):
+            latest_unit[point["parameter_tag"]] = point["unit_canonical"]
+    return [
+        point for point in points
+        if point.get("unit_canonical") in ("", None, latest_unit.get(point["parameter_tag"]))
+    ]
+
+
+def _limits(points, key):
+    return np.array([np.nan if point.get(key) is None else point[key] for point in points], dtype=float)
+
+
+def _bucket_keys(dates, bucket):
+    if bucket == "week":
+        # datetime64 weeks start on Thursday (1970-01-01); shift to Monday
+        return (dates + 3).astype("datetime64[W]").astype(np.int64)
+    months = dates.astype("datetime64[M]").astype(np.int64)
+    if bucket == "quarter":
+        return months // 3
+    if bucket == "year":
+        return dates.astype("datetime64[Y]").astype(np.int64)
+    return months
+
+
+def _bucket_start(key, bucket):
+    if bucket == "week":
+        return np.datetime64(int(key), "W").astype("datetime64[D]") - 3
+    if bucket == "quarter":
+        return np.datetime64(int(key) * 3, "M").astype("datetime64[D]")
+    if bucket == "year":
+        return np.datetime64(int(key), "Y").astype("datetime64[D]")
+    return np.datetime64(int(key), "M").astype("datetime64[D]")
+
+
+def _number(value):
+    return None if np.isnan(value) else round(float(value), 6)
+
+
+def compute_trends(points, bucket=None):
+    """
+    Per-parameter_tag statistics over numeric parameter_series points
+    (value_num set, ISO report_date), all tags in one vectorized pass:
+    min, max, mean, slope (per day, least squares), last vs previous delta
+    and how many values fell below / above the printed reference limits.
+
+    `points` in the response are the raw values, or with `bucket` one mean
+    per week / month / quarter / year. The statistics always use every value.
+    """
+    points = _comparable_points(points)
+    if not points:
+        return {}
+
+    tag_names, codes = np.unique([point["parameter_tag"] for point in points], return_inverse=True)
+    dates = np.array([point["report_date"] for point in points], dtype="datetime64[D]")
+    values = np.array([point["value_num"] for point in points], dtype=float)
+    lower = _limits(points, "lower_limit")
+    upper = _limits(points, "upper_limit")
+
+    # Group by tag, oldest first within each group
+    order = np.lexsort((dates, codes))
+    codes, dates, values, lower, upper = codes[order], dates[order], values[order], lower[order], upper[order]
+    points = [points[i] for i in order]
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    counts = np.diff(np.r_[starts, len(values)])
+    ends = starts + counts - 1
+    group = np.repeat(np.arange(len(starts)), counts)
+
+    sums = np.add.reduceat(values, starts)
+    means = sums / counts
+    mins = np.minimum.reduceat(values, starts)
+    maxs = np.maximum.reduceat(values, starts)
+
+    # Least-squares slope from grouped sums; days counted from each tag's first report
+    x = (dates - dates[starts][group]).astype(float)
+    sum_x = np.add.reduceat(x, starts)
+    sum_xx = np.add.reduceat(x * x, starts)
+    sum_xy = np.add.reduceat(x * values, starts)
+    denominator = counts * sum_xx - sum_x ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slopes = np.where(denominator > 0, (counts * sum_xy - sum_x * sums) / denominator, np.nan)
+
+    last = values[ends]
+    previous = np.where(counts > 1, values[np.maximum(ends - 1, 0)], np.nan)
+
+    # NaN limits compare False, so missing limits never count as out of range
+    with np.errstate(invalid="ignore"):
+        below = np.add.reduceat((values < lower).astype(np.int64), starts)
+        above = np.add.reduceat((values > upper).astype(np.int64), starts)
+
+    if bucket:
+        keys = _bucket_keys(dates, bucket)
+        bucket_starts = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]) | (keys[1:] != keys[:-1])])
+        bucket_counts = np.diff(np.r_[bucket_starts, len(values)])
+        bucket_means = np.add.reduceat(values, bucket_starts) / bucket_counts
+        bucket_groups = group[bucket_starts]
+
+    trends = {}
+    for g, start in enumerate(starts):
+        tag = str(tag_names[codes[start]])
+        if bucket:
+            first, stop = np.searchsorted(bucket_groups, [g, g + 1])
+            series = [
+                {"date": str(_bucket_start(keys[bucket_starts[i]], bucket)), "value": _number(bucket_means[i]),
+                 "count": int(bucket_counts[i])}
+                for i in range(first, stop)
+            ]
+        else:
+            series = [
+                {"date": str(dates[i]), "value": _number(values[i]), "comparator": points[i].get("comparator")}
+                for i in range(start, ends[g] + 1)
+            ]
+
+        units = [point.get("unit_canonical") for point in points[start:ends[g] + 1] if point.get("unit_canonical")]
+        trends[tag] = {
+            "unit": units[-1] if units else "",
+            "count": int(counts[g]),
+            "first_date": str(dates[start]),
+            "last_date": str(dates[ends[g]]),
+            "min": _number(mins[g]),
+            "max": _number(maxs[g]),
+            "mean": _number(means[g]),
+            "slope_per_day": _number(slopes[g]),
+            "last": _number(last[g]),
+            "previous": _number(previous[g]),
+            "delta": _number(last[g] - previous[g]),
+            "out_of_range": {"below": int(below[g]), "above": int(above[g]), "total": int(below[g] + above[g])},
+            "points": series
+        }
+    return trends
@@ -0,0 +1,180 @@
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.formparsers import MultiPartParser
+from metrics import STAGE_SECONDS
+from logs import get_logger
+import hashlib
+import os
+import uuid
+
+load_dotenv()  # Load from .env file
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Largest accepted PDF (also per zip member), enforced while it streams in
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+# Whole /extract/batch/ request body
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(512 * 1024 * 1024)))
+# Uploads up to this size go from the request to the extractor in memory;
+# larger ones spill to a uniquely named file under UPLOAD_DIR. 0 = always disk
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(8 * 1024 * 1024)))
+# Cap on memory held by uploads waiting for their job; past it they spill too
+UPLOAD_MEMORY_BUDGET = int(os.getenv("UPLOAD_MEMORY_BUDGET", str(256 * 1024 * 1024)))
+# Room for the multipart framing and the other form fields of /extract/
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+MEMORY_PREFIX = "memory:"
+
+log = get_logger("uploads")
+
+# Let Starlette keep multipart parts of that size in memory too (default 1 MB)
+MultiPartParser.spool_max_size = max(MultiPartParser.spool_max_size, UPLOAD_SPOOL_BYTES)
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# memory:<id> -> PDF bytes, until the job that owns them finishes
+_buffers = {}
+_buffered_bytes = 0
+
+
+class UploadTooLarge(Exception):
+    """Raised as soon as an upload grows past its size limit."""
+
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds {limit} bytes")
+        self.limit = limit
+
+
+def save_upload(fileobj, max_bytes=UPLOAD_MAX_BYTES):
+    """
+    Read an upload in chunks, hashing it for the cache key and enforcing
+    max_bytes as it goes. Returns (ref, digest), where ref is "memory:<id>"
+    for an upload kept in memory, or a unique path under UPLOAD_DIR once
+    it outgrew UPLOAD_SPOOL_BYTES. Neither depends on the client's
+    filename, and a job may outlive the request that created it.
+
+    Uploads held in memory are written out by spill_upload() when the
+    process shuts down, so their unfinished jobs resume after a graceful
+    restart; after a crash those jobs fail on resume instead.
+    """
+    global _buffered_bytes
+    with STAGE_SECONDS.time("save_upload"):
+        hasher = hashlib.sha256()
+        buffer = bytearray()
+        size = 0
+        path = None
+        spill = None
+        try:
+            while chunk := fileobj.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                hasher.update(chunk)
+                if spill is None and (size > UPLOAD_SPOOL_BYTES or _buffered_bytes + size > UPLOAD_MEMORY_BUDGET):
+                    path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}.pdf")
+                    spill = open(path, "wb")
+                    spill.write(buffer)
+                    buffer = None
+                if spill is None:
+                    buffer += chunk
+                else:
+                    spill.write(chunk)
+        except BaseException:
+            if spill is not None:
+                spill.close()
+                os.remove(path)
+            raise
+
+        if spill is not None:
+            spill.close()
+            return path, hasher.hexdigest()
+
+        ref = f"{MEMORY_PREFIX}{uuid.uuid4().hex}"
+        _buffers[ref] = bytes(buffer)
+        _buffered_bytes += size
+        return ref, hasher.hexdigest()
+
+
+def upload_source(ref):
+    """What the extractor opens: the bytes of a memory upload, else the path. None if lost."""
+    if ref.startswith(MEMORY_PREFIX):
+        return _buffers.get(ref)
+    return ref if os.path.exists(ref) else None
+
+
+def upload_exists(ref):
+    return upload_source(ref) is not None
+
+
+def spill_upload(ref):
+    """
+    Write a memory upload to a unique path under UPLOAD_DIR and return that
+    path, freeing the memory. Any other ref, or a lost one, is returned as is.
+    """
+    global _buffered_bytes
+    data = _buffers.get(ref) if ref and ref.startswith(MEMORY_PREFIX) else None
+    if data is None:
+        return ref
+    path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}.pdf")
+    with open(path, "wb") as f:
+        f.write(data)
+    del _buffers[ref]
+    _buffered_bytes -= len(data)
+    return path
+
+
+def remove_uploads(refs):
+    global _buffered_bytes
+    for ref in refs:
+        if not ref:
+            continue
+        if ref.startswith(MEMORY_PREFIX):
+            data = _buffers.pop(ref, None)
+            if data is not None:
+                _buffered_bytes -= len(data)
+            continue
+        try:
+            if os.path.exists(ref):
+                os.remove(ref)
+        except OSError as e:
+            log.warning("Failed to clean up upload", extra={"path": ref, "error": str(e)})
+
+
+class UploadSizeLimit:
+    """
+    ASGI middleware capping the request body of the upload endpoints. A
+    declared Content-Length over the limit is refused before anything is
+    read; otherwise the body is counted as it arrives and the request is
+    aborted with 413 the moment it passes the limit.
+    """
+
+    def __init__(self, app, limits):
+        self.app = app
+        self.limits = limits  # path -> max body bytes
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            response = JSONResponse(status_code=413, content={"error": f"Upload too large, the limit is {limit} bytes"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # HTTPException, so FastAPI's form parsing passes it through as is
+                    raise HTTPException(status_code=413, detail=f"Upload too large, the limit is {limit} bytes")
+            return message
+
+        await self.app(scope, limited_receive, send)